@@ -1,13 +1,40 @@
-import json
 from channels.generic.websocket import AsyncWebsocketConsumer
 from django.contrib.auth import get_user_model
 from rest_framework_simplejwt.tokens import UntypedToken
 from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 from urllib.parse import parse_qs
+from realtime.frames import PreEncodedFrameMixin
+from realtime.groups import BOOKINGS_ADMIN_GROUP, court_group, user_group
+from realtime.multiplex import Topic
 
 User = get_user_model()
 
-class BookingConsumer(AsyncWebsocketConsumer):
+# Límite de pistas a las que se puede suscribir una conexión
+MAX_COURT_SUBSCRIPTIONS = 20
+
+
+def parse_court_ids(values):
+    """
+    IDs de pista válidos y sin repetir de una lista de valores (ej. ['1,2', '3']).
+    """
+    raw_ids = ','.join(str(value) for value in values).split(',')
+    court_ids = [int(value) for value in raw_ids if value.strip().isdigit()]
+    return list(dict.fromkeys(court_ids))[:MAX_COURT_SUBSCRIPTIONS]
+
+
+def booking_groups(user, court_ids):
+    """
+    Grupos de reservas de un usuario: staff todas, cliente las suyas, más la
+    disponibilidad de las pistas pedidas.
+    """
+    if user.is_staff:
+        groups = [BOOKINGS_ADMIN_GROUP]
+    else:
+        groups = [user_group('bookings', user.id)]
+    return groups + [court_group(court_id) for court_id in court_ids]
+
+
+class BookingConsumer(PreEncodedFrameMixin, AsyncWebsocketConsumer):
     async def connect(self):
         # El usuario ya viene autenticado por el JWTAuthMiddleware
         user = self.scope.get('user')
@@ -16,40 +43,62 @@ class BookingConsumer(AsyncWebsocketConsumer):
             await self.close()
             return
 
-        self.room_group_name = 'bookings'
-        
-        # Unirse al grupo de reservas
-        await self.channel_layer.group_add(
-            self.room_group_name,
-            self.channel_name
-        )
+        # Disponibilidad de las pistas pedidas con ?courts=1,2
+        self.group_names = booking_groups(user, self._requested_courts())
+
+        for group_name in self.group_names:
+            await self.channel_layer.group_add(
+                group_name,
+                self.channel_name
+            )
 
         # Si usamos el subprotocolo para el token, debemos aceptarlo
         accepted_subprotocol = self.scope.get('accepted_subprotocol')
         await self.accept(subprotocol=accepted_subprotocol)
 
+    def _requested_courts(self):
+        query = parse_qs(self.scope.get('query_string', b'').decode())
+        return parse_court_ids(query.get('courts', []))
+
     async def disconnect(self, close_code):
-        if hasattr(self, 'room_group_name'):
+        for group_name in getattr(self, 'group_names', []):
             await self.channel_layer.group_discard(
-                self.room_group_name,
+                group_name,
                 self.channel_name
             )
       #  print(f"🔌 Booking WebSocket disconnected: {self.channel_name}")
 
     async def booking_created(self, event):
-        await self.send(text_data=json.dumps({
-            'type': 'booking_created',
-            'booking': event['booking']
-        }))
+        await self.send_frame(event, ('booking',))
+
+    async def booking_bulk_created(self, event):
+        await self.send_frame(event, ('bookings',))
 
     async def booking_updated(self, event):
-        await self.send(text_data=json.dumps({
-            'type': 'booking_updated',
-            'booking': event['booking']
-        }))
+        await self.send_frame(event, ('booking',))
 
     async def booking_cancelled(self, event):
-        await self.send(text_data=json.dumps({
-            'type': 'booking_cancelled',
-            'booking_id': event['booking_id']
-        }))
+        await self.send_frame(event, ('booking_id',))
+
+    async def court_availability_changed(self, event):
+        await self.send_frame(event, ('court_id', 'slots'))
+
+
+class BookingTopic(Topic):
+    """
+    Tema 'bookings' del socket multiplexado. Parámetro opcional: courts (lista de IDs).
+    """
+    name = 'bookings'
+    events = {
+        'booking_created': ('booking',),
+        'booking_bulk_created': ('bookings',),
+        'booking_updated': ('booking',),
+        'booking_cancelled': ('booking_id',),
+        'court_availability_changed': ('court_id', 'slots'),
+    }
+
+    async def get_groups(self):
+        courts = self.params.get('courts') or []
+        if not isinstance(courts, list):
+            courts = [courts]
+        return booking_groups(self.user, parse_court_ids(courts))
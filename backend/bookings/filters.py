@@ -0,0 +1,13 @@
+import django_filters
+from .models import Booking
+
+class BookingFilter(django_filters.FilterSet):
+    status = django_filters.CharFilter(field_name='status', lookup_expr='exact')
+    court = django_filters.NumberFilter(field_name='court_id')
+    # Rango sobre la hora de inicio de la reserva: [date_from, date_to)
+    date_from = django_filters.IsoDateTimeFilter(field_name='start_time', lookup_expr='gte')
+    date_to = django_filters.IsoDateTimeFilter(field_name='start_time', lookup_expr='lt')
+
+    class Meta:
+        model = Booking
+        fields = ['status', 'court', 'date_from', 'date_to']
@@ -0,0 +1,233 @@
+from contextlib import contextmanager
+
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.db.models import Q
+
+from courts.models import Court
+
+from ..models import Booking
+
+# Nombre de la restricción de exclusión creada en la migración 0005 (solo PostgreSQL)
+OVERLAP_CONSTRAINT_NAME = 'booking_no_overlap'
+
+# SQLSTATE de PostgreSQL para exclusion_violation
+EXCLUSION_VIOLATION = '23P01'
+
+# Errores con los que el motor rechaza una escritura que compite por el mismo candado:
+# SQLite ('database is locked' / 'database table is locked' con caché compartida) y
+# MySQL (1205 lock wait timeout, 1213 deadlock)
+LOCK_CONTENTION_MESSAGES = ('database is locked', 'database table is locked')
+LOCK_CONTENTION_CODES = (1205, 1213)
+
+# Estados que ocupan la cancha (los mismos que filtra la restricción de exclusión)
+ACTIVE_BOOKING_STATUSES = ('pending', 'confirmed')
+
+
+def database_enforces_overlap() -> bool:
+    """
+    Indica si la base de datos impone por sí misma que las reservas no se solapen.
+
+    Returns:
+        bool: True en PostgreSQL (restricción de exclusión sobre tstzrange).
+    """
+    return connection.vendor == 'postgresql'
+
+
+@contextmanager
+def court_booking_guard(court_id: int):
+    """
+    Abre una transacción para crear o reactivar reservas de una cancha.
+
+    En PostgreSQL la restricción de exclusión rechaza los solapamientos, así que no se
+    toma ningún candado y las escrituras de canchas distintas (o de horarios distintos)
+    avanzan en paralelo. En el resto de motores se bloquea la fila de la cancha con
+    SELECT ... FOR UPDATE: las escrituras de la misma cancha se serializan entre todos
+    los procesos y el candado dura hasta el commit de la transacción más exterior,
+    aunque el guard se use dentro de otra (ej. al crear un partido con su reserva).
+    SQLite ignora FOR UPDATE pero admite un único escritor: de dos escrituras
+    simultáneas, la segunda falla con 'database is locked' en lugar de insertar un
+    solapamiento. Ese error (y el timeout o deadlock del candado en MySQL) se informa
+    como BookingOverlapError para que la API responda con un conflicto y no con un 500.
+
+    Args:
+        court_id (int): El ID de la cancha.
+
+    Raises:
+        BookingOverlapError: Si otra escritura concurrente retiene el candado.
+    """
+    try:
+        with transaction.atomic():
+            if not database_enforces_overlap():
+                list(Court.objects.select_for_update().filter(pk=court_id).values_list('pk', flat=True))
+            yield
+    except OperationalError as e:
+        if is_lock_contention(e):
+            raise BookingOverlapError() from e
+        raise
+
+
+def is_lock_contention(error: OperationalError) -> bool:
+    """
+    Determina si un OperationalError se debe a que otra transacción retiene el candado.
+
+    Args:
+        error (OperationalError): El error lanzado por la base de datos.
+
+    Returns:
+        bool: True si la escritura compitió con otra concurrente.
+    """
+    if error.args and error.args[0] in LOCK_CONTENTION_CODES:
+        return True
+    return any(message in str(error) for message in LOCK_CONTENTION_MESSAGES)
+
+
+def is_overlap_violation(error: IntegrityError) -> bool:
+    """
+    Determina si un IntegrityError proviene de la restricción de no solapamiento.
+
+    Args:
+        error (IntegrityError): El error lanzado por la base de datos.
+
+    Returns:
+        bool: True si la causa es la restricción de exclusión de reservas.
+    """
+    cause = error.__cause__
+    if getattr(cause, 'pgcode', None) == EXCLUSION_VIOLATION:
+        return True
+    return OVERLAP_CONSTRAINT_NAME in str(error)
+
+
+class BookingOverlapError(Exception):
+    """
+    La reserva se solapa con otra reserva activa de la misma cancha.
+    """
+    pass
+
+
+def find_overlapping_bookings(court_id: int, start_time, end_time, exclude_pk=None):
+    """
+    Construye la consulta de reservas activas de una cancha que se solapan con [start_time, end_time).
+
+    Args:
+        court_id (int): El ID de la cancha.
+        start_time (datetime): Inicio del intervalo.
+        end_time (datetime): Fin del intervalo.
+        exclude_pk (int, optional): ID de una reserva a ignorar (la que se está editando).
+
+    Returns:
+        QuerySet: Reservas que se solapan con el intervalo.
+    """
+    overlapping = Booking.objects.filter(
+        court_id=court_id,
+        start_time__lt=end_time,
+        end_time__gt=start_time,
+        status__in=ACTIVE_BOOKING_STATUSES
+    )
+    if exclude_pk is not None:
+        overlapping = overlapping.exclude(pk=exclude_pk)
+    return overlapping
+
+
+def save_without_overlap(booking: Booking) -> Booking:
+    """
+    Guarda una reserva garantizando que no se solape con otra activa de la misma cancha.
+
+    En PostgreSQL la garantía la da la restricción de exclusión y un conflicto se detecta
+    al insertar. En otros motores se vuelve a comprobar el solapamiento con la fila de la
+    cancha bloqueada, ya que la validación previa del serializer no lo retiene.
+
+    Args:
+        booking (Booking): La reserva a crear o actualizar.
+
+    Returns:
+        Booking: La reserva guardada.
+
+    Raises:
+        BookingOverlapError: Si la reserva se solapa con otra activa o si otra escritura
+            concurrente de la cancha retiene el candado.
+    """
+    try:
+        with court_booking_guard(booking.court_id):
+            if (
+                not database_enforces_overlap()
+                and booking.status.lower() in ACTIVE_BOOKING_STATUSES
+                and find_overlapping_bookings(
+                    booking.court_id, booking.start_time, booking.end_time, exclude_pk=booking.pk
+                ).exists()
+            ):
+                raise BookingOverlapError()
+            booking.save()
+    except IntegrityError as e:
+        if is_overlap_violation(e):
+            raise BookingOverlapError() from e
+        raise
+    return booking
+
+
+def find_bulk_conflicts(court_id: int, intervals):
+    """
+    Busca en una sola consulta las reservas activas que chocan con cada intervalo de un lote.
+
+    Args:
+        court_id (int): El ID de la cancha.
+        intervals (list): Pares (start_time, end_time) de las ocurrencias a crear.
+
+    Returns:
+        dict: Índice del intervalo -> lista de IDs de reservas activas que se solapan con él.
+            Solo incluye los intervalos con conflicto.
+    """
+    if not intervals:
+        return {}
+
+    overlaps = Q()
+    for start_time, end_time in intervals:
+        overlaps |= Q(start_time__lt=end_time, end_time__gt=start_time)
+
+    existing = Booking.objects.filter(
+        overlaps,
+        court_id=court_id,
+        status__in=ACTIVE_BOOKING_STATUSES
+    ).values_list('id', 'start_time', 'end_time')
+
+    conflicts = {}
+    for booking_id, booking_start, booking_end in existing:
+        for index, (start_time, end_time) in enumerate(intervals):
+            if booking_start < end_time and booking_end > start_time:
+                conflicts.setdefault(index, []).append(booking_id)
+    return conflicts
+
+
+def bulk_create_without_overlap(bookings, skip_conflicts: bool = False):
+    """
+    Inserta un lote de reservas de una misma cancha con bulk_create en una sola transacción.
+
+    Todo el lote se valida contra las reservas existentes con una única consulta dentro
+    de la transacción (con la fila de la cancha bloqueada fuera de PostgreSQL). Las reservas del
+    lote no deben solaparse entre sí.
+
+    Args:
+        bookings (list): Instancias de Booking sin guardar, todas de la misma cancha.
+        skip_conflicts (bool): Si es True se insertan las reservas sin conflicto y se
+            omiten las demás; si es False no se inserta nada cuando hay algún conflicto.
+
+    Returns:
+        tuple: (reservas creadas, dict índice -> IDs de reservas en conflicto).
+
+    Raises:
+        BookingOverlapError: Si PostgreSQL rechaza el lote por una reserva concurrente.
+    """
+    if not bookings:
+        return [], {}
+
+    court_id = bookings[0].court_id
+    try:
+        with court_booking_guard(court_id):
+            conflicts = find_bulk_conflicts(court_id, [(b.start_time, b.end_time) for b in bookings])
+            if conflicts and not skip_conflicts:
+                return [], conflicts
+            to_create = [b for index, b in enumerate(bookings) if index not in conflicts]
+            return Booking.objects.bulk_create(to_create), conflicts
+    except IntegrityError as e:
+        if is_overlap_violation(e):
+            raise BookingOverlapError() from e
+        raise
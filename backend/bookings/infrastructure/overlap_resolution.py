@@ -0,0 +1,78 @@
+"""
+Resolución de reservas activas que ya se solapan en la base de datos.
+
+La usa el comando cancel_overlapping_bookings, que hay que ejecutar antes de la
+migración 0005 si existen reservas activas solapadas (la migración falla en ese caso
+y no modifica reservas).
+"""
+
+from bisect import bisect_left
+from typing import Dict, Iterable, Tuple
+
+from django.db.models import Exists, OuterRef
+from django.db.models.functions import Lower
+
+# Estados que ocupan la cancha, comparados en minúsculas como en la restricción de exclusión
+ACTIVE_STATUSES = ('pending', 'confirmed')
+
+# Estado que reciben las reservas descartadas
+CANCELLED_STATUS = 'cancelled'
+
+
+def find_overlap_losers(bookings: Iterable[Tuple]) -> Dict[int, int]:
+    """
+    Elige qué reservas cancelar para que ninguna se solape con otra de su misma cancha.
+
+    Gana la reserva más antigua (menor ID): se recorren en orden de ID y se descarta
+    cada una que choque con alguna ya conservada de su cancha.
+
+    Args:
+        bookings (iterable): Tuplas (id, court_id, start_time, end_time) de reservas activas.
+
+    Returns:
+        dict: ID de cada reserva descartada -> ID de una reserva conservada con la que choca.
+    """
+    # court_id -> (inicios, fines, ids) de las conservadas, ordenadas por inicio y sin solaparse
+    kept = {}
+    losers = {}
+    for booking_id, court_id, start_time, end_time in sorted(bookings, key=lambda booking: booking[0]):
+        starts, ends, ids = kept.setdefault(court_id, ([], [], []))
+        index = bisect_left(starts, end_time)
+        # Como las conservadas no se solapan, solo la última que empieza antes de end_time
+        # puede cruzarse con [start_time, end_time)
+        if index and ends[index - 1] > start_time:
+            losers[booking_id] = ids[index - 1]
+            continue
+        starts.insert(index, start_time)
+        ends.insert(index, end_time)
+        ids.insert(index, booking_id)
+    return losers
+
+
+def cancel_overlapping_bookings(booking_model, dry_run: bool = False) -> Dict[int, int]:
+    """
+    Cancela las reservas activas que se solapan con otra más antigua de su cancha.
+
+    Solo se cargan las reservas que participan en algún solapamiento.
+
+    Args:
+        booking_model: El modelo Booking.
+        dry_run (bool): Si es True solo se calcula qué reservas se cancelarían.
+
+    Returns:
+        dict: ID de cada reserva cancelada -> ID de la reserva conservada con la que chocaba.
+    """
+    active = booking_model.objects.annotate(status_lower=Lower('status')).filter(
+        status_lower__in=ACTIVE_STATUSES
+    )
+    overlapping = active.filter(
+        court_id=OuterRef('court_id'),
+        start_time__lt=OuterRef('end_time'),
+        end_time__gt=OuterRef('start_time'),
+    ).exclude(pk=OuterRef('pk'))
+
+    rows = active.filter(Exists(overlapping)).values_list('id', 'court_id', 'start_time', 'end_time')
+    losers = find_overlap_losers(rows)
+    if losers and not dry_run:
+        booking_model.objects.filter(pk__in=list(losers)).update(status=CANCELLED_STATUS)
+    return losers
@@ -0,0 +1,194 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from bookings.models import Booking
+from courts.models import Court
+from users.models import User
+
+BENCH_PREFIX = 'bench-'
+
+
+class Command(BaseCommand):
+    help = (
+        'Siembra reservas de prueba y compara los planes de ejecución y tiempos de las '
+        'consultas críticas de reservas sin y con los índices de Booking. Borra y recrea '
+        'los índices de la tabla real: solo debe ejecutarse contra una base de datos de pruebas.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=1_000_000, help='Número de reservas a sembrar.')
+        parser.add_argument('--courts', type=int, default=50, help='Número de canchas de prueba.')
+        parser.add_argument('--users', type=int, default=200, help='Número de usuarios de prueba.')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Tamaño de lote para bulk_create.')
+        parser.add_argument('--repeat', type=int, default=20, help='Repeticiones por consulta para medir tiempos.')
+        parser.add_argument('--skip-seed', action='store_true', help='Reutilizar los datos sembrados previamente.')
+        parser.add_argument('--cleanup', action='store_true', help='Eliminar los datos de prueba y salir.')
+        parser.add_argument(
+            '--scratch-db', action='store_true',
+            help='Confirma que la base de datos configurada es desechable (requerido salvo con --cleanup).'
+        )
+
+    def handle(self, *args, **options):
+        if options['cleanup']:
+            self._cleanup()
+            return
+
+        if not options['scratch_db']:
+            # Mientras se mide "sin índices" la tabla real de reservas se queda sin ellos
+            raise CommandError(
+                f"La base de datos '{connection.settings_dict['NAME']}' ({connection.vendor}) perdería "
+                'temporalmente los índices de Booking y recibiría las reservas sembradas. Ejecuta el '
+                'comando contra una base de datos de pruebas y confírmalo con --scratch-db.'
+            )
+
+        if not options['skip_seed']:
+            self._seed(options['count'], options['courts'], options['users'], options['batch_size'])
+
+        court = Court.objects.filter(name__startswith=BENCH_PREFIX).order_by('id').first()
+        user = User.objects.filter(username__startswith=BENCH_PREFIX).order_by('id').first()
+        if not court or not user:
+            self.stderr.write(self.style.ERROR('No hay datos de prueba. Ejecuta el comando sin --skip-seed.'))
+            return
+
+        queries = self._queries(court, user)
+
+        self.stdout.write(self.style.MIGRATE_HEADING('\n=== SIN índices de Booking ==='))
+        self._drop_indexes()
+        try:
+            before = self._run(queries, options['repeat'])
+        finally:
+            self._create_indexes()
+
+        self.stdout.write(self.style.MIGRATE_HEADING('\n=== CON índices de Booking ==='))
+        after = self._run(queries, options['repeat'])
+
+        self.stdout.write(self.style.MIGRATE_HEADING('\n=== Resumen (mediana en ms) ==='))
+        for name in queries:
+            speedup = before[name] / after[name] if after[name] else float('inf')
+            self.stdout.write(f'{name:<28} antes={before[name]:>10.3f}  después={after[name]:>10.3f}  x{speedup:.1f}')
+
+    def _seed(self, count, court_count, user_count, batch_size):
+        self.stdout.write(f'Sembrando {count} reservas en {court_count} canchas para {user_count} usuarios...')
+        courts = [
+            Court.objects.get_or_create(name=f'{BENCH_PREFIX}court-{i}', defaults={'price': 50000})[0]
+            for i in range(court_count)
+        ]
+        users = [
+            User.objects.get_or_create(username=f'{BENCH_PREFIX}user-{i}')[0]
+            for i in range(user_count)
+        ]
+
+        # Permitir fijar created_at para repartir las reservas en el tiempo
+        created_at_field = Booking._meta.get_field('created_at')
+        created_at_field.auto_now_add = False
+        try:
+            now = timezone.now()
+            rng = random.Random(42)
+            per_court = max(count // court_count, 1)
+            statuses = ['pending', 'confirmed', 'confirmed', 'cancelled']
+            batch = []
+            created = 0
+            start_clock = time.perf_counter()
+            for court in courts:
+                # Reservas consecutivas de 1-2 horas hacia atrás en el tiempo, sin solaparse
+                slot_start = now.replace(minute=0, second=0, microsecond=0) + timedelta(days=30)
+                for _ in range(per_court):
+                    if created >= count:
+                        break
+                    duration = timedelta(hours=rng.choice([1, 2]))
+                    slot_start -= duration + timedelta(hours=rng.choice([0, 0, 1]))
+                    batch.append(Booking(
+                        user=rng.choice(users),
+                        court=court,
+                        start_time=slot_start,
+                        end_time=slot_start + duration,
+                        status=rng.choice(statuses),
+                        created_at=slot_start - timedelta(days=rng.randint(0, 14)),
+                    ))
+                    created += 1
+                    if len(batch) >= batch_size:
+                        Booking.objects.bulk_create(batch)
+                        batch = []
+            if batch:
+                Booking.objects.bulk_create(batch)
+        finally:
+            created_at_field.auto_now_add = True
+
+        elapsed = time.perf_counter() - start_clock
+        self.stdout.write(self.style.SUCCESS(f'{created} reservas sembradas en {elapsed:.1f}s.'))
+
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(f'ANALYZE {Booking._meta.db_table}')
+
+    def _queries(self, court, user):
+        now = timezone.now()
+        week_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        return {
+            # BookingSerializer.validate
+            'overlap_check': Booking.objects.filter(
+                court=court,
+                start_time__lt=now + timedelta(hours=2),
+                end_time__gt=now,
+                status__in=['pending', 'confirmed'],
+            ).values('pk')[:1],
+            # DjangoCourtRepository._get_weekly_occupancy_sync
+            'weekly_grid': Booking.objects.filter(
+                court_id=court.id,
+                start_time__lt=week_start + timedelta(days=7),
+                end_time__gt=week_start,
+                status__in=['pending', 'confirmed'],
+            ).values_list('start_time', 'end_time'),
+            # BookingViewSet.list (staff)
+            'admin_list_page': Booking.objects.order_by('-created_at')[:50],
+            # BookingViewSet.list (cliente)
+            'user_list': Booking.objects.filter(user=user).order_by('-created_at'),
+            # BookingStatsView
+            'stats_range_count': Booking.objects.filter(
+                created_at__gte=now - timedelta(days=60),
+                created_at__lt=now - timedelta(days=30),
+            ).values('pk'),
+        }
+
+    def _run(self, queries, repeat):
+        results = {}
+        for name, queryset in queries.items():
+            self.stdout.write(self.style.HTTP_INFO(f'\n-- {name}'))
+            self.stdout.write(queryset.explain())
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                # .all() clona el queryset para no reutilizar su caché de resultados
+                if name == 'stats_range_count':
+                    queryset.all().count()
+                else:
+                    list(queryset.all())
+                timings.append((time.perf_counter() - start) * 1000)
+            results[name] = statistics.median(timings)
+            self.stdout.write(f'mediana: {results[name]:.3f} ms')
+        return results
+
+    def _drop_indexes(self):
+        with connection.schema_editor() as schema_editor:
+            for index in Booking._meta.indexes:
+                schema_editor.remove_index(Booking, index)
+
+    def _create_indexes(self):
+        with connection.schema_editor() as schema_editor:
+            for index in Booking._meta.indexes:
+                schema_editor.add_index(Booking, index)
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(f'ANALYZE {Booking._meta.db_table}')
+
+    def _cleanup(self):
+        deleted, _ = Booking.objects.filter(court__name__startswith=BENCH_PREFIX).delete()
+        Court.objects.filter(name__startswith=BENCH_PREFIX).delete()
+        User.objects.filter(username__startswith=BENCH_PREFIX).delete()
+        self.stdout.write(self.style.SUCCESS(f'Datos de prueba eliminados ({deleted} filas).'))
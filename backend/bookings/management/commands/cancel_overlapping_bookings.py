@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from bookings.infrastructure.overlap_resolution import cancel_overlapping_bookings
+from bookings.models import Booking
+from courts.infrastructure.cache.weekly_availability_cache import weekly_availability_cache
+
+
+class Command(BaseCommand):
+    help = (
+        'Cancela las reservas activas que se solapan con otra más antigua de la misma cancha. '
+        'Hay que ejecutarlo antes de la migración 0005, que falla si quedan solapamientos; '
+        'con --dry-run solo lista los pares para revisarlos antes del despliegue.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Listar los conflictos sin cancelar nada.')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            losers = cancel_overlapping_bookings(Booking, dry_run=options['dry_run'])
+            if losers and not options['dry_run']:
+                for court_id, start_time, end_time in Booking.objects.filter(pk__in=list(losers)).values_list(
+                    'court_id', 'start_time', 'end_time'
+                ):
+                    weekly_availability_cache.invalidate(court_id, start_time, end_time)
+
+        verb = 'se cancelaría' if options['dry_run'] else 'cancelada'
+        for booking_id, kept_id in sorted(losers.items()):
+            self.stdout.write(f'Reserva {booking_id} {verb} (se solapa con la reserva {kept_id}).')
+        self.stdout.write(self.style.SUCCESS(f'{len(losers)} reservas solapadas.'))
@@ -0,0 +1,29 @@
+# Generated by Django 5.2 on 2026-10-18 11:26
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0003_booking_created_at'),
+        ('courts', '0006_remove_court_characteristics'),
+        ('payments', '0002_payment_gateway_data_payment_method_payment_status_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['court', 'start_time', 'end_time', 'status'], name='booking_court_time_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['created_at', 'id'], name='booking_created_at_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='booking_user_created_idx'),
+        ),
+    ]
@@ -0,0 +1,73 @@
+# Restricción de exclusión para impedir reservas solapadas (solo PostgreSQL).
+#
+# En otros motores (ej. SQLite en desarrollo) no se crea nada: la no superposición
+# se garantiza en bookings.infrastructure.overlap_guard con candados por cancha.
+#
+# Las reservas activas que ya se solapan impedirían crear la restricción. La migración
+# no las toca: si existen, falla indicando cómo resolverlas antes de volver a migrar:
+#
+#     python manage.py cancel_overlapping_bookings --dry-run
+#     python manage.py cancel_overlapping_bookings
+
+from django.db import migrations
+
+CONSTRAINT_NAME = 'booking_no_overlap'
+
+ACTIVE_STATUSES_SQL = "lower(status) IN ('pending', 'confirmed')"
+
+
+def add_no_overlap_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    table = apps.get_model('bookings', 'Booking')._meta.db_table
+    with schema_editor.connection.cursor() as cursor:
+        # Las reservas solapadas existentes impedirían crear la restricción
+        cursor.execute(f"""
+            SELECT count(*)
+            FROM {table} a
+            JOIN {table} b
+              ON a.court_id = b.court_id
+             AND a.id < b.id
+             AND a.start_time < b.end_time
+             AND b.start_time < a.end_time
+            WHERE lower(a.status) IN ('pending', 'confirmed')
+              AND lower(b.status) IN ('pending', 'confirmed')
+        """)
+        (conflicts,) = cursor.fetchone()
+    if conflicts:
+        raise RuntimeError(
+            f'No se puede crear {CONSTRAINT_NAME}: hay {conflicts} pares de reservas activas '
+            'solapadas. Revísalos con "python manage.py cancel_overlapping_bookings --dry-run", '
+            'resuélvelos con "python manage.py cancel_overlapping_bookings" y vuelve a migrar.'
+        )
+
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    schema_editor.execute(f"""
+        ALTER TABLE {table}
+        ADD CONSTRAINT {CONSTRAINT_NAME}
+        EXCLUDE USING gist (
+            court_id WITH =,
+            tstzrange(start_time, end_time, '[)') WITH &&
+        )
+        WHERE ({ACTIVE_STATUSES_SQL})
+    """)
+
+
+def remove_no_overlap_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    table = apps.get_model('bookings', 'Booking')._meta.db_table
+    schema_editor.execute(f'ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {CONSTRAINT_NAME}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0004_booking_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_no_overlap_constraint, remove_no_overlap_constraint),
+    ]
@@ -24,6 +24,17 @@ class Booking(models.Model):
     payment = models.ForeignKey('payments.Payment', on_delete=models.SET_NULL, null=True, blank=True, related_name='bookings')
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Verificación de solapamientos y calendario semanal:
+            # court = X AND start_time < fin AND end_time > inicio [AND status ...]
+            models.Index(fields=['court', 'start_time', 'end_time', 'status'], name='booking_court_time_status_idx'),
+            # Listado ordenado por -created_at (admin) y conteos por rango en BookingStatsView
+            models.Index(fields=['created_at', 'id'], name='booking_created_at_id_idx'),
+            # Listado de las reservas de un usuario ordenado por -created_at
+            models.Index(fields=['user', 'created_at', 'id'], name='booking_user_created_idx'),
+        ]
+
     def __str__(self):
         return f"Reserva de {self.court.name} por {self.user.username} ({self.start_time.strftime('%Y-%m-%d %H:%M')})"
 
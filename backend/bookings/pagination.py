@@ -0,0 +1,12 @@
+from cancha.pagination import KeysetPagination
+
+
+class BookingKeysetPagination(KeysetPagination):
+    """
+    Paginación por cursor (keyset) de reservas sobre (created_at, id) en orden descendente.
+    """
+    descending = True
+    page_size_setting = 'BOOKING_PAGE_SIZE'
+    default_page_size = 50
+    max_page_size_setting = 'BOOKING_MAX_PAGE_SIZE'
+    default_max_page_size = 200
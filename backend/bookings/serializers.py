@@ -1,11 +1,17 @@
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
+from rest_framework.settings import api_settings
 from .models import Booking
 from users.models import User
 from courts.models import Court
 from courts.serializers import CourtSerializer
 from users.serializers import UserSerializer
+from django.conf import settings
 from django.utils import timezone
+from datetime import timedelta
+from .infrastructure.overlap_guard import BookingOverlapError, find_overlapping_bookings, save_without_overlap
+
+OVERLAP_ERROR_MESSAGE = "La cancha no está disponible en el rango de tiempo solicitado."
 
 class BookingSerializer(serializers.ModelSerializer):
     user_details = UserSerializer(source='user', read_only=True)
@@ -30,7 +36,21 @@ class BookingSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         # Lógica síncrona directa para evitar problemas ASGI durante el desarrollo
         validated_data.pop('payment_percentage', 100) # El modelo Booking no tiene este campo
-        return Booking.objects.create(**validated_data)
+        try:
+            # La base de datos (o el candado de la cancha) decide ante reservas concurrentes
+            return save_without_overlap(Booking(**validated_data))
+        except BookingOverlapError:
+            raise ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [OVERLAP_ERROR_MESSAGE]})
+
+    def update(self, instance, validated_data):
+        validated_data.pop('payment_percentage', 100) # El modelo Booking no tiene este campo
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        try:
+            # Igual que al crear: la base de datos (o el candado de la cancha) decide
+            return save_without_overlap(instance)
+        except BookingOverlapError:
+            raise ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [OVERLAP_ERROR_MESSAGE]})
 
     def validate(self, data):
         """
@@ -48,25 +68,143 @@ class BookingSerializer(serializers.ModelSerializer):
             return data
 
         instance = self.instance
-        if instance:
-            overlapping_bookings = Booking.objects.filter(
-                court=court,
-                start_time__lt=end_time,
-                end_time__gt=start_time,
-                status__in=['pending', 'confirmed']
-            ).exclude(pk=instance.pk)
-        else:
-            overlapping_bookings = Booking.objects.filter(
-                court=court,
-                start_time__lt=end_time,
-                end_time__gt=start_time,
-                status__in=['pending', 'confirmed']
-            )
+        overlapping_bookings = find_overlapping_bookings(
+            court.pk, start_time, end_time, exclude_pk=instance.pk if instance else None
+        )
 
         if overlapping_bookings.exists():
-            raise ValidationError("La cancha no está disponible en el rango de tiempo solicitado.")
+            raise ValidationError(OVERLAP_ERROR_MESSAGE)
 
         if start_time >= end_time:
              raise ValidationError({'end_time': 'La hora de fin debe ser posterior a la hora de inicio.'})
 
         return data
+
+
+class BookingBulkSerializer(serializers.Serializer):
+    """
+    Valida una reserva recurrente: la misma franja de una cancha repetida cada
+    'interval_days' días (por defecto semanal) durante 'repeat' ocurrencias.
+    """
+    court = serializers.PrimaryKeyRelatedField(queryset=Court.objects.all())
+    start_time = serializers.DateTimeField()
+    end_time = serializers.DateTimeField()
+    repeat = serializers.IntegerField(min_value=1)
+    interval_days = serializers.IntegerField(required=False, default=7, min_value=1)
+    # Si es True se crean las ocurrencias libres y se omiten las que tienen conflicto
+    skip_conflicts = serializers.BooleanField(required=False, default=False)
+
+    def validate_repeat(self, value):
+        max_occurrences = getattr(settings, 'BOOKING_BULK_MAX_OCCURRENCES', 52)
+        if value > max_occurrences:
+            raise ValidationError(f'Se permiten como máximo {max_occurrences} ocurrencias.')
+        return value
+
+    def validate(self, data):
+        start_time = data['start_time']
+        end_time = data['end_time']
+        if start_time >= end_time:
+            raise ValidationError({'end_time': 'La hora de fin debe ser posterior a la hora de inicio.'})
+        if end_time - start_time > timedelta(days=data['interval_days']):
+            raise ValidationError({'interval_days': 'Las ocurrencias no pueden solaparse entre sí.'})
+        return data
+
+    def get_occurrences(self):
+        """
+        Calcula los intervalos de cada ocurrencia conservando la hora local
+        (ej. todos los martes de 19:00 a 21:00).
+
+        Returns:
+            list: Pares (start_time, end_time) ordenados cronológicamente.
+        """
+        start_time = timezone.localtime(self.validated_data['start_time'])
+        duration = self.validated_data['end_time'] - self.validated_data['start_time']
+        step = timedelta(days=self.validated_data['interval_days'])
+        occurrences = []
+        for index in range(self.validated_data['repeat']):
+            occurrence_start = start_time + step * index
+            occurrences.append((occurrence_start, occurrence_start + duration))
+        return occurrences
+
+
+class BookingListSerializer:
+    """
+    Representación plana y de solo lectura de reservas para listados.
+
+    Trabaja sobre filas de QuerySet.values(): no instancia modelos ni campos de DRF por
+    fila y solo consulta las columnas pedidas (?fields=). Las fechas se formatean igual
+    que en BookingSerializer.
+    """
+    # Campo de salida -> columna (o relación) en la consulta .values()
+    FIELD_SOURCES = {
+        'id': 'id',
+        'user_id': 'user_id',
+        'username': 'user__username',
+        'user_first_name': 'user__first_name',
+        'user_last_name': 'user__last_name',
+        'court_id': 'court_id',
+        'court_name': 'court__name',
+        'start_time': 'start_time',
+        'end_time': 'end_time',
+        'status': 'status',
+        'payment_id': 'payment_id',
+        'created_at': 'created_at',
+    }
+    DATETIME_FIELDS = ('start_time', 'end_time', 'created_at')
+    # Columnas que siempre se consultan porque las usa la paginación por cursor
+    KEY_FIELDS = ('id', 'created_at')
+
+    _datetime_field = serializers.DateTimeField()
+
+    def __init__(self, fields=None):
+        """
+        Args:
+            fields (list, optional): Campos de salida solicitados. Por defecto, todos.
+
+        Raises:
+            ValidationError: Si se solicita un campo desconocido.
+        """
+        if fields:
+            unknown = [name for name in fields if name not in self.FIELD_SOURCES]
+            if unknown:
+                raise ValidationError({'fields': f"Campos desconocidos: {', '.join(unknown)}."})
+            self.fields = list(dict.fromkeys(fields))
+        else:
+            self.fields = list(self.FIELD_SOURCES)
+
+    @staticmethod
+    def is_requested(request) -> bool:
+        """
+        Indica si el cliente pidió la representación plana (?compact=true o ?fields=...).
+        """
+        params = request.query_params
+        return params.get('compact', '').lower() in ('1', 'true') or bool(params.get('fields'))
+
+    @classmethod
+    def from_request(cls, request):
+        raw_fields = request.query_params.get('fields', '')
+        return cls([name.strip() for name in raw_fields.split(',') if name.strip()])
+
+    def get_values(self, queryset):
+        """
+        Restringe el QuerySet a las columnas necesarias para los campos solicitados.
+        """
+        names = list(dict.fromkeys([*self.KEY_FIELDS, *self.fields]))
+        return queryset.values(*(self.FIELD_SOURCES[name] for name in names))
+
+    def to_representation(self, rows):
+        """
+        Convierte filas de .values() en diccionarios planos con los campos solicitados.
+        """
+        sources = [(name, self.FIELD_SOURCES[name]) for name in self.fields]
+        datetime_fields = [name for name in self.fields if name in self.DATETIME_FIELDS]
+        to_datetime = self._datetime_field.to_representation
+
+        data = []
+        for row in rows:
+            item = {name: row[source] for name, source in sources}
+            for name in datetime_fields:
+                if item[name] is not None:
+                    item[name] = to_datetime(item[name])
+            data.append(item)
+        return data
@@ -0,0 +1,38 @@
+"""
+Datos de prueba compartidos por las pruebas de reservas, canchas y partidos.
+"""
+from datetime import timedelta
+
+from django.utils import timezone
+
+from courts.models import Court
+from users.models import Role, User
+
+from .models import Booking
+
+
+class BookingTestMixin:
+    """
+    Crea el rol de cliente, usuarios, canchas y reservas con los mismos valores en todas
+    las pruebas. create_fixtures() deja listos self.role, self.user, self.court y self.start.
+    """
+
+    def create_fixtures(self, username='cliente-test', is_staff=False):
+        self.role = Role.objects.create(name='cliente-test')
+        self.user = self.create_user(username, is_staff=is_staff)
+        self.court = self.create_court('Cancha 1')
+        # Próxima hora en punto de mañana, para que las reservas queden en el futuro
+        self.start = timezone.now().replace(minute=0, second=0, microsecond=0) + timedelta(days=1)
+
+    def create_user(self, username=None, **fields):
+        return User.objects.create(username=username or f'cliente-{User.objects.count()}', role=self.role, **fields)
+
+    def create_court(self, name=None):
+        return Court.objects.create(name=name or f'Cancha {Court.objects.count() + 1}', price=50000)
+
+    def create_booking(self, start_time=None, hours=1, user=None, court=None, booking_status='pending'):
+        start_time = start_time or self.start
+        return Booking.objects.create(
+            user=user or self.user, court=court or self.court, status=booking_status,
+            start_time=start_time, end_time=start_time + timedelta(hours=hours),
+        )
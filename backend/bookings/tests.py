@@ -0,0 +1,735 @@
+import base64
+import io
+import json
+import threading
+from datetime import timedelta
+from unittest import mock, skipUnless
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase, APITransactionTestCase
+
+from courts.models import CourtImage
+from payments.models import Payment
+from realtime.dispatcher import notification_dispatcher
+from realtime.groups import BOOKINGS_ADMIN_GROUP, court_group, user_group
+from realtime.models import OutboxEvent
+from .consumers import BookingConsumer
+from .infrastructure.overlap_guard import (
+    OVERLAP_CONSTRAINT_NAME, BookingOverlapError, court_booking_guard, save_without_overlap,
+)
+from .infrastructure.overlap_resolution import find_overlap_losers
+from .models import Booking
+from .serializers import OVERLAP_ERROR_MESSAGE, BookingSerializer
+from .testing import BookingTestMixin
+from .utils.websocket_notifier import BookingWebSocketNotifier
+
+
+class BookingListQueryCountTests(BookingTestMixin, APITestCase):
+    """
+    El listado de reservas debe costar un número fijo de consultas, sin importar cuántas haya.
+    """
+
+    def setUp(self):
+        self.create_fixtures('admin-test', is_staff=True)
+        self.client.force_authenticate(self.user)
+        self.next_start = self.start
+
+    def _create_bookings(self, count):
+        for i in range(count):
+            court = self.create_court()
+            CourtImage.objects.create(court=court, image=f'courts/images/test-{court.id}.jpg')
+            self.create_booking(self.next_start, user=self.create_user(), court=court)
+            self.next_start += timedelta(hours=1)
+
+    def _count_list_queries(self, params=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/bookings/bookings/', params or {})
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response
+
+    def test_list_query_count_does_not_grow_with_bookings(self):
+        self._create_bookings(2)
+        few_queries, response = self._count_list_queries()
+        self.assertEqual(len(response.data), 2)
+
+        self._create_bookings(10)
+        many_queries, response = self._count_list_queries()
+        self.assertEqual(len(response.data), 12)
+
+        self.assertEqual(few_queries, many_queries)
+
+    def test_paginated_list_query_count_does_not_grow_with_bookings(self):
+        self._create_bookings(3)
+        few_queries, _ = self._count_list_queries({'page_size': 50})
+
+        self._create_bookings(10)
+        many_queries, response = self._count_list_queries({'page_size': 50})
+        self.assertEqual(len(response.data['results']), 13)
+
+        self.assertEqual(few_queries, many_queries)
+
+    def test_list_includes_nested_user_role_and_court_images(self):
+        self._create_bookings(1)
+        _, response = self._count_list_queries()
+
+        booking = response.data[0]
+        self.assertEqual(booking['user_details']['role'], 'cliente-test')
+        self.assertEqual(len(booking['court_details']['images']), 1)
+
+
+class BookingKeysetPaginationTests(BookingTestMixin, APITestCase):
+    """
+    Paginación por cursor y filtros del listado de reservas.
+    """
+
+    def setUp(self):
+        self.create_fixtures('admin-test', is_staff=True)
+        self.client.force_authenticate(self.user)
+        self.other_court = self.create_court('Cancha 2')
+        self.created_at = timezone.now().replace(microsecond=0) - timedelta(days=1)
+
+    def _create(self, user=None, court=None, hours=0, booking_status='pending', created_at=None):
+        booking = self.create_booking(
+            self.start + timedelta(hours=hours), user=user, court=court, booking_status=booking_status,
+        )
+        Booking.objects.filter(id=booking.id).update(created_at=created_at or self.created_at)
+        return booking
+
+    def _get(self, params):
+        return self.client.get('/api/bookings/bookings/', params)
+
+    def _ids(self, params):
+        response = self._get(params)
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results'] if 'results' in response.data else response.data
+        return [booking['id'] for booking in results]
+
+    def _all_pages(self, params):
+        ids = []
+        response = self._get(params)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            ids.extend(booking['id'] for booking in response.data['results'])
+            if not response.data['next_cursor']:
+                return ids
+            response = self._get({**params, 'cursor': response.data['next_cursor']})
+
+    def test_pages_cover_every_booking_once_with_created_at_ties(self):
+        # Mismo created_at para todas: el id desempata
+        bookings = [self._create(hours=hours) for hours in range(5)]
+
+        ids = self._all_pages({'page_size': 2})
+
+        self.assertEqual(ids, [booking.id for booking in reversed(bookings)])
+
+    def test_new_bookings_do_not_shift_the_next_page(self):
+        bookings = [self._create(hours=hours, created_at=self.created_at + timedelta(minutes=hours)) for hours in range(4)]
+        first = self._get({'page_size': 2})
+
+        self._create(hours=10, created_at=timezone.now())
+        second = self._get({'page_size': 2, 'cursor': first.data['next_cursor']})
+
+        self.assertEqual([booking['id'] for booking in second.data['results']], [bookings[1].id, bookings[0].id])
+        self.assertIsNone(second.data['next_cursor'])
+        self.assertIsNone(second.data['next'])
+
+    def test_next_link_keeps_the_filters(self):
+        for hours in range(3):
+            self._create(hours=hours)
+
+        response = self._get({'page_size': 1, 'status': 'pending'})
+
+        self.assertIn('status=pending', response.data['next'])
+        self.assertIn(f"cursor={response.data['next_cursor']}", response.data['next'])
+
+    def test_invalid_cursor_is_not_found(self):
+        self._create()
+        not_a_pair = base64.urlsafe_b64encode(b'2024-01-01T00:00:00').decode()
+
+        for cursor in ('no-es-un-cursor', not_a_pair, base64.urlsafe_b64encode(b'ayer|1').decode()):
+            self.assertEqual(self._get({'cursor': cursor}).status_code, 404)
+
+    def test_page_size_is_clamped(self):
+        for hours in range(3):
+            self._create(hours=hours)
+
+        self.assertEqual(len(self._ids({'page_size': 0})), 1)
+        self.assertEqual(len(self._ids({'page_size': 'muchas'})), 3)
+        with self.settings(BOOKING_MAX_PAGE_SIZE=2):
+            self.assertEqual(len(self._ids({'page_size': 100})), 2)
+
+    def test_filters_by_status_court_and_start_range(self):
+        pending = self._create(hours=0)
+        confirmed = self._create(hours=1, booking_status='confirmed')
+        other_court = self._create(court=self.other_court, hours=2)
+        later = self._create(hours=5)
+
+        self.assertEqual(self._ids({'status': 'confirmed'}), [confirmed.id])
+        self.assertEqual(self._ids({'court': self.other_court.id}), [other_court.id])
+        # date_from incluido, date_to excluido
+        range_ids = self._ids({
+            'date_from': pending.start_time.isoformat(), 'date_to': other_court.start_time.isoformat(),
+        })
+        self.assertEqual(sorted(range_ids), [pending.id, confirmed.id])
+        self.assertNotIn(later.id, range_ids)
+
+    def test_filters_apply_to_every_page(self):
+        expected = [self._create(hours=hours, booking_status='confirmed') for hours in range(3)]
+        self._create(hours=5)
+
+        ids = self._all_pages({'page_size': 1, 'status': 'confirmed'})
+
+        self.assertEqual(ids, [booking.id for booking in reversed(expected)])
+
+    def test_invalid_filter_is_a_bad_request(self):
+        response = self._get({'date_from': 'mañana'})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('date_from', response.data)
+
+    def test_clients_only_page_through_their_own_bookings(self):
+        client_user = self.create_user('cliente-test')
+        own = [self._create(user=client_user, hours=hours) for hours in range(3)]
+        self._create(hours=10)
+        self.client.force_authenticate(client_user)
+
+        self.assertEqual(self._all_pages({'page_size': 2}), [booking.id for booking in reversed(own)])
+
+
+class BookingListSerializerEquivalenceTests(BookingTestMixin, APITestCase):
+    """
+    La representación plana (?compact=true / ?fields=) debe dar los mismos datos que
+    BookingSerializer para las mismas reservas y en el mismo orden.
+    """
+
+    def setUp(self):
+        self.create_fixtures('admin-test', is_staff=True)
+        self.client.force_authenticate(self.user)
+        start_time = timezone.now().replace(second=0, microsecond=0) + timedelta(days=1)
+        for number, booking_status in enumerate(['pending', 'confirmed', 'cancelled']):
+            user = self.create_user(first_name=f'Nombre {number}', last_name='Apellido')
+            booking = Booking.objects.create(
+                user=user, court=self.create_court(), status=booking_status,
+                start_time=start_time + timedelta(hours=number),
+                end_time=start_time + timedelta(hours=number + 1, minutes=30),
+            )
+        payment = Payment.objects.create(user=booking.user, booking=booking, amount=50000)
+        Booking.objects.filter(id=booking.id).update(payment=payment)
+
+    def _get(self, params):
+        response = self.client.get('/api/bookings/bookings/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    @staticmethod
+    def _flatten(booking):
+        user, court = booking['user_details'], booking['court_details']
+        return {
+            'id': booking['id'],
+            'user_id': user['id'],
+            'username': user['username'],
+            'user_first_name': user['first_name'],
+            'user_last_name': user['last_name'],
+            'court_id': court['id'],
+            'court_name': court['name'],
+            'start_time': booking['start_time'],
+            'end_time': booking['end_time'],
+            'status': booking['status'],
+            'payment_id': booking['payment'],
+            'created_at': booking['created_at'],
+        }
+
+    def test_compact_matches_full_representation(self):
+        full = [self._flatten(booking) for booking in self._get({})]
+
+        self.assertEqual(self._get({'compact': 'true'}), full)
+        self.assertIsNotNone(full[0]['payment_id'])
+
+    def test_fields_match_full_representation(self):
+        fields = ['id', 'court_name', 'start_time', 'status']
+        full = [
+            {name: booking[name] for name in fields}
+            for booking in map(self._flatten, self._get({}))
+        ]
+
+        self.assertEqual(self._get({'fields': ','.join(fields)}), full)
+
+    def test_paginated_compact_matches_full_representation(self):
+        full = self._get({'page_size': 2})
+        compact = self._get({'page_size': 2, 'compact': 'true'})
+
+        self.assertEqual(compact['results'], [self._flatten(booking) for booking in full['results']])
+        self.assertEqual(compact['next_cursor'], full['next_cursor'])
+
+    def test_unknown_field_is_a_bad_request(self):
+        response = self.client.get('/api/bookings/bookings/', {'fields': 'id,contraseña'})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('fields', response.data)
+
+
+class _RecordingBookingNotifier(BookingWebSocketNotifier):
+    """
+    Guarda los envíos (grupo, tipo) en lugar de escribirlos en el outbox.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.sent = []
+
+    def _publish(self, group, event_type, payload):
+        self.sent.append((group, event_type))
+
+
+class BookingNotifierRoutingTests(BookingTestMixin, TestCase):
+    """
+    Los eventos de reservas deben llegar al dueño y a la pista a partir de la salida real
+    de BookingSerializer.
+    """
+
+    def setUp(self):
+        self.create_fixtures()
+        self.owner = self.user
+        self.booking = self.create_booking()
+        self.booking_data = BookingSerializer(self.booking).data
+        self.notifier = _RecordingBookingNotifier()
+
+    def _groups(self, event_type):
+        return sorted(group for group, sent_type in self.notifier.sent if sent_type == event_type)
+
+    def test_created_event_reaches_admins_owner_and_court(self):
+        self.notifier.notify_booking_created(self.booking_data)
+
+        self.assertEqual(
+            self._groups('booking_created'),
+            sorted([BOOKINGS_ADMIN_GROUP, user_group('bookings', self.owner.id)])
+        )
+        self.assertEqual(self._groups('court_availability_changed'), [court_group(self.court.id)])
+
+    def test_updated_bulk_and_cancelled_events_reach_owner_and_court(self):
+        self.notifier.notify_booking_updated(self.booking_data)
+        self.notifier.notify_bookings_bulk_created([self.booking_data])
+        self.notifier.notify_booking_cancelled(self.booking.id, self.booking_data)
+
+        owner_groups = sorted([BOOKINGS_ADMIN_GROUP, user_group('bookings', self.owner.id)])
+        for event_type in ('booking_updated', 'booking_bulk_created', 'booking_cancelled'):
+            self.assertEqual(self._groups(event_type), owner_groups)
+        self.assertEqual(self._groups('court_availability_changed'), [court_group(self.court.id)] * 3)
+
+
+class CourtAvailabilitySubscriptionTests(BookingTestMixin, APITestCase):
+    """
+    Un cliente suscrito a una pista con ?courts= se entera de las reservas de otros
+    usuarios en ella, como la página de detalle de la cancha.
+    """
+
+    def setUp(self):
+        self.create_fixtures()
+        self.other_user = self.create_user()
+
+    def _booking_events(self, court):
+        # Mensajes que el outbox entrega a la capa de canales al crear la reserva
+        self.client.force_authenticate(self.other_user)
+        with mock.patch.object(notification_dispatcher, 'enqueue') as enqueue:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post('/api/bookings/bookings/', {
+                    'court': court.id,
+                    'start_time': self.start.isoformat(),
+                    'end_time': (self.start + timedelta(hours=1)).isoformat(),
+                }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return [(call.args[0], call.args[1]) for call in enqueue.call_args_list]
+
+    def _received(self, path, events):
+        async def run():
+            communicator = WebsocketCommunicator(BookingConsumer.as_asgi(), path)
+            communicator.scope['user'] = self.user
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+            channel_layer = get_channel_layer()
+            for group, message in events:
+                await channel_layer.group_send(group, message)
+            frames = []
+            while not await communicator.receive_nothing(timeout=0.1):
+                frames.append(json.loads(await communicator.receive_from()))
+            await communicator.disconnect()
+            return frames
+
+        return async_to_sync(run)()
+
+    def test_subscribed_client_receives_other_users_bookings_on_the_court(self):
+        events = self._booking_events(self.court)
+
+        frames = self._received(f'/ws/bookings/?courts={self.court.id}', events)
+
+        self.assertEqual([frame['type'] for frame in frames], ['court_availability_changed'])
+        self.assertEqual(frames[0]['court_id'], self.court.id)
+        self.assertEqual(
+            [slot['booking_id'] for slot in frames[0]['slots']],
+            list(Booking.objects.filter(user=self.other_user).values_list('id', flat=True)),
+        )
+
+    def test_client_without_courts_or_on_another_court_receives_nothing(self):
+        events = self._booking_events(self.court)
+        other_court = self.create_court()
+
+        self.assertEqual(self._received('/ws/bookings/', events), [])
+        self.assertEqual(self._received(f'/ws/bookings/?courts={other_court.id}', events), [])
+
+
+class BookingOverlapGuardTests(BookingTestMixin, TestCase):
+    """
+    Una reserva que se solapa con otra activa de la misma cancha se rechaza al guardar.
+    """
+
+    def setUp(self):
+        self.create_fixtures()
+
+    def _booking(self, offset_minutes=0):
+        start_time = self.start + timedelta(minutes=offset_minutes)
+        return Booking(user=self.user, court=self.court, start_time=start_time, end_time=start_time + timedelta(hours=1))
+
+    def test_conflicting_insert_is_rejected(self):
+        save_without_overlap(self._booking())
+
+        with self.assertRaises(BookingOverlapError):
+            save_without_overlap(self._booking(offset_minutes=30))
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_conflicting_insert_inside_outer_transaction_is_rejected(self):
+        with transaction.atomic():
+            save_without_overlap(self._booking())
+            with self.assertRaises(BookingOverlapError):
+                save_without_overlap(self._booking(offset_minutes=30))
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_guard_locks_the_court_row_without_exclusion_constraint(self):
+        with mock.patch('bookings.infrastructure.overlap_guard.database_enforces_overlap', return_value=False):
+            with CaptureQueriesContext(connection) as queries:
+                with court_booking_guard(self.court.pk):
+                    pass
+
+        court_queries = [query['sql'] for query in queries if 'courts_court' in query['sql']]
+        self.assertEqual(len(court_queries), 1)
+        if connection.features.has_select_for_update:
+            self.assertIn('FOR UPDATE', court_queries[0])
+
+
+@skipUnless(connection.features.has_select_for_update, 'Requiere bloqueo de filas (SELECT ... FOR UPDATE)')
+class BookingOverlapGuardConcurrencyTests(BookingTestMixin, TransactionTestCase):
+    """
+    Sin restricción de exclusión, el bloqueo de la cancha serializa dos escrituras
+    concurrentes aunque la primera siga dentro de una transacción exterior.
+    """
+
+    def test_concurrent_conflicting_insert_waits_and_is_rejected(self):
+        self.create_fixtures()
+
+        def booking(offset_minutes):
+            start_time = self.start + timedelta(minutes=offset_minutes)
+            return Booking(user=self.user, court=self.court, start_time=start_time, end_time=start_time + timedelta(hours=1))
+
+        first_saved = threading.Event()
+        results = {}
+
+        def second_writer():
+            first_saved.wait()
+            try:
+                save_without_overlap(booking(30))
+                results['second'] = 'saved'
+            except BookingOverlapError:
+                results['second'] = 'rejected'
+            finally:
+                connection.close()
+
+        with mock.patch('bookings.infrastructure.overlap_guard.database_enforces_overlap', return_value=False):
+            thread = threading.Thread(target=second_writer)
+            thread.start()
+            with transaction.atomic():
+                save_without_overlap(booking(0))
+                first_saved.set()
+                # El segundo escritor sigue bloqueado mientras no haya commit
+                thread.join(timeout=0.5)
+                self.assertTrue(thread.is_alive())
+            thread.join(timeout=10)
+
+        self.assertEqual(results.get('second'), 'rejected')
+        self.assertEqual(Booking.objects.count(), 1)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'SQLite admite un único escritor a la vez')
+class BookingOverlapGuardSqliteConcurrencyTests(BookingTestMixin, APITransactionTestCase):
+    """
+    En SQLite la escritura que compite con otra transacción abierta falla con
+    'database is locked' y se informa como un conflicto, no como un error interno.
+    """
+
+    def setUp(self):
+        self.create_fixtures()
+
+    def _booking(self, offset_minutes):
+        start_time = self.start + timedelta(minutes=offset_minutes)
+        return Booking(user=self.user, court=self.court, start_time=start_time, end_time=start_time + timedelta(hours=1))
+
+    def test_concurrent_conflicting_insert_is_rejected(self):
+        results = {}
+
+        def second_writer():
+            try:
+                save_without_overlap(self._booking(30))
+                results['second'] = 'saved'
+            except BookingOverlapError:
+                results['second'] = 'rejected'
+            finally:
+                connection.close()
+
+        with transaction.atomic():
+            save_without_overlap(self._booking(0))
+            thread = threading.Thread(target=second_writer)
+            thread.start()
+            thread.join(timeout=30)
+
+        self.assertEqual(results.get('second'), 'rejected')
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_lock_error_on_create_is_a_bad_request(self):
+        self.client.force_authenticate(self.user)
+        locked = OperationalError('database is locked')
+
+        with mock.patch.object(Booking, 'save', side_effect=locked):
+            response = self.client.post('/api/bookings/bookings/', {
+                'court': self.court.id,
+                'start_time': self.start.isoformat(),
+                'end_time': (self.start + timedelta(hours=1)).isoformat(),
+            }, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Booking.objects.exists())
+
+
+class BookingUpdateOverlapTests(BookingTestMixin, APITestCase):
+    """
+    Editar una reserva (PUT) pasa por el mismo guardado sin solapamientos que crearla.
+    """
+
+    def setUp(self):
+        self.create_fixtures()
+        self.client.force_authenticate(self.user)
+        self.booking = self.create_booking()
+        self.other = self.create_booking(self.start + timedelta(hours=2))
+        dispatcher = mock.patch.object(notification_dispatcher, 'enqueue')
+        dispatcher.start()
+        self.addCleanup(dispatcher.stop)
+
+    def _put(self, start_time):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.put(f'/api/bookings/bookings/{self.booking.id}/', {
+                'court': self.court.id,
+                'start_time': start_time.isoformat(),
+                'end_time': (start_time + timedelta(hours=1)).isoformat(),
+            }, format='json')
+
+    def _assert_rejected(self, response):
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['non_field_errors'], [OVERLAP_ERROR_MESSAGE])
+        self.booking.refresh_from_db()
+        self.assertEqual(self.booking.start_time, self.start)
+
+    def test_moves_to_a_free_slot(self):
+        response = self._put(self.start + timedelta(hours=4))
+
+        self.assertEqual(response.status_code, 200)
+        self.booking.refresh_from_db()
+        self.assertEqual(self.booking.start_time, self.start + timedelta(hours=4))
+
+    def test_overlap_missed_by_validation_is_rejected_on_save(self):
+        # Una reserva concurrente aparece entre la validación y el guardado
+        with mock.patch('bookings.serializers.find_overlapping_bookings', return_value=Booking.objects.none()):
+            response = self._put(self.start + timedelta(hours=2, minutes=30))
+
+        self._assert_rejected(response)
+
+    def test_exclusion_constraint_violation_is_a_bad_request(self):
+        overlap = IntegrityError(f'conflicting key value violates exclusion constraint "{OVERLAP_CONSTRAINT_NAME}"')
+
+        with mock.patch.object(Booking, 'save', side_effect=overlap):
+            response = self._put(self.start + timedelta(hours=4))
+
+        self._assert_rejected(response)
+
+
+class CancelOverlappingBookingsTests(BookingTestMixin, TestCase):
+    """
+    cancel_overlapping_bookings (a ejecutar antes de la migración 0005) cancela, en cada
+    solapamiento, la reserva más reciente.
+    """
+
+    def setUp(self):
+        self.create_fixtures()
+
+    def _at(self, hours, duration=1, court=None, booking_status='pending'):
+        return self.create_booking(
+            self.start + timedelta(hours=hours), hours=duration, court=court, booking_status=booking_status,
+        )
+
+    def test_newest_booking_of_each_overlap_is_cancelled(self):
+        first = self._at(0, duration=2)
+        overlaps_first = self._at(1)
+        # Solo chocaba con una reserva que se cancela: se conserva
+        after_cancelled_one = self._at(1.5, booking_status='CONFIRMED')
+        adjacent = self._at(2)
+        other_court = self._at(0, court=self.create_court())
+        already_cancelled = self._at(0, booking_status='cancelled')
+
+        out = io.StringIO()
+        call_command('cancel_overlapping_bookings', stdout=out)
+
+        statuses = dict(Booking.objects.values_list('id', 'status'))
+        self.assertEqual(statuses[overlaps_first.id], 'cancelled')
+        self.assertEqual(statuses[after_cancelled_one.id], 'cancelled')
+        for booking in (first, adjacent, other_court):
+            self.assertEqual(statuses[booking.id], 'pending')
+        self.assertEqual(statuses[already_cancelled.id], 'cancelled')
+        self.assertIn(f'Reserva {overlaps_first.id} cancelada (se solapa con la reserva {first.id})', out.getvalue())
+
+    def test_dry_run_changes_nothing(self):
+        self._at(0)
+        self._at(0.5)
+
+        out = io.StringIO()
+        call_command('cancel_overlapping_bookings', dry_run=True, stdout=out)
+
+        self.assertFalse(Booking.objects.filter(status='cancelled').exists())
+        self.assertIn('1 reservas solapadas', out.getvalue())
+
+    def test_oldest_bookings_of_each_court_are_kept(self):
+        start = self.start
+        hour = timedelta(hours=1)
+        bookings = [
+            (3, 1, start + hour, start + 3 * hour),
+            (1, 1, start, start + 2 * hour),
+            (2, 1, start + 2 * hour, start + 4 * hour),
+            (4, 2, start, start + 4 * hour),
+        ]
+
+        # La 3 choca con la 1 y con la 2, que no se solapan entre sí
+        self.assertEqual(list(find_overlap_losers(bookings)), [3])
+
+
+class BookingBulkCreateTests(BookingTestMixin, APITestCase):
+    """
+    Reserva recurrente: 409 si alguna ocurrencia choca con una reserva activa y el lote
+    se crea completo o no se crea.
+    """
+
+    def setUp(self):
+        self.create_fixtures()
+        self.client.force_authenticate(self.user)
+        # Los avisos WebSocket del outbox no intervienen aquí
+        dispatcher = mock.patch.object(notification_dispatcher, 'enqueue')
+        dispatcher.start()
+        self.addCleanup(dispatcher.stop)
+
+    def _post(self, **data):
+        payload = {
+            'court': self.court.id,
+            'start_time': self.start.isoformat(),
+            'end_time': (self.start + timedelta(hours=2)).isoformat(),
+            'repeat': 4,
+            **data,
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post('/api/bookings/bookings/bulk/', payload, format='json')
+
+    def _existing(self, week, booking_status='pending'):
+        return self.create_booking(self.start + timedelta(weeks=week, hours=1), booking_status=booking_status)
+
+    def test_creates_every_occurrence(self):
+        response = self._post()
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data['created']), 4)
+        self.assertEqual(response.data['conflicts'], [])
+        self.assertEqual(Booking.objects.filter(court=self.court).count(), 4)
+
+    def test_conflict_inside_the_batch_creates_nothing(self):
+        existing = self._existing(week=2)
+
+        response = self._post()
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['created'], [])
+        self.assertEqual(len(response.data['conflicts']), 1)
+        self.assertEqual(response.data['conflicts'][0]['conflicting_booking_ids'], [existing.id])
+        self.assertEqual(list(Booking.objects.values_list('id', flat=True)), [existing.id])
+        self.assertFalse(OutboxEvent.objects.exists())
+
+    def test_cancelled_bookings_do_not_conflict(self):
+        self._existing(week=2, booking_status='cancelled')
+
+        self.assertEqual(self._post().status_code, 201)
+
+    def test_skip_conflicts_creates_the_free_occurrences(self):
+        self._existing(week=0)
+        self._existing(week=3)
+
+        response = self._post(skip_conflicts=True)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data['created']), 2)
+        self.assertEqual(len(response.data['conflicts']), 2)
+        self.assertEqual(Booking.objects.count(), 4)
+
+    def test_skip_conflicts_with_every_occurrence_taken_is_a_conflict(self):
+        for week in range(2):
+            self._existing(week)
+
+        response = self._post(repeat=2, skip_conflicts=True)
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Booking.objects.count(), 2)
+
+    def test_overlapping_occurrences_are_rejected(self):
+        response = self._post(end_time=(self.start + timedelta(days=2)).isoformat(), interval_days=1)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('interval_days', response.data)
+        self.assertFalse(Booking.objects.exists())
+
+    def test_concurrent_insert_rejected_by_the_database_is_a_conflict(self):
+        overlap = IntegrityError(f'conflicting key value violates exclusion constraint "{OVERLAP_CONSTRAINT_NAME}"')
+
+        with mock.patch.object(Booking.objects, 'bulk_create', side_effect=overlap):
+            response = self._post()
+
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Booking.objects.exists())
+        self.assertFalse(OutboxEvent.objects.exists())
+
+    def test_failure_after_insert_rolls_back_the_whole_batch(self):
+        with mock.patch('bookings.views.booking_notifier.notify_bookings_bulk_created', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError), self.assertLogs('django.request', 'ERROR'):
+                self._post()
+
+        self.assertFalse(Booking.objects.exists())
+
+
+class BookingQueryBenchmarkCommandTests(TestCase):
+    """
+    El benchmark borra los índices de Booking: sin --scratch-db no toca la base de datos.
+    """
+
+    def test_refuses_to_run_without_scratch_db(self):
+        with CaptureQueriesContext(connection) as queries:
+            with self.assertRaisesMessage(CommandError, '--scratch-db'):
+                call_command('benchmark_booking_queries', count=10, courts=1, users=1)
+
+        self.assertEqual(len(queries), 0)
+        self.assertFalse(Booking.objects.exists())
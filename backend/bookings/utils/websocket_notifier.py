@@ -1,30 +1,90 @@
 from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
+from realtime.frames import encode_frame
+from realtime.groups import BOOKINGS_ADMIN_GROUP, court_group, user_group
+from realtime.outbox import outbox
 
 class BookingWebSocketNotifier:
+    """
+    Envía los eventos de reservas al grupo más estrecho que los necesita:
+    el detalle completo a los administradores y al dueño de la reserva, y a la
+    pista solo la franja afectada (sin datos personales).
+    """
+
     def __init__(self):
         self.channel_layer = get_channel_layer()
-        self.group_name = 'bookings'
+        self.group_name = BOOKINGS_ADMIN_GROUP
+
+    def _send_to_group(self, event_type, data, group=None):
+        self._send_to_groups(event_type, data, [group or self.group_name])
 
-    def _send_to_group(self, event_type, data):
+    def _send_to_groups(self, event_type, data, groups):
         if not self.channel_layer:
             return
-            
-        async_to_sync(self.channel_layer.group_send)(
-            self.group_name,
-            {
-                'type': event_type,
-                **data
-            }
-        )
+
+        # El frame se codifica una sola vez para todos los grupos y conexiones
+        payload = {'frame': encode_frame(event_type, data)}
+        for group in groups:
+            self._publish(group, event_type, payload)
+
+    def _publish(self, group, event_type, payload):
+        # Se registra en el outbox dentro de la transacción actual y se envía tras el commit
+        outbox.publish(group, event_type, payload)
+
+    @staticmethod
+    def _user_id(booking_data):
+        # BookingSerializer expone el dueño y la pista solo anidados ('user' y 'court' son write_only)
+        return (booking_data.get('user_details') or {}).get('id')
+
+    @staticmethod
+    def _court_id(booking_data):
+        return (booking_data.get('court_details') or {}).get('id')
+
+    def _send_to_owner_and_admins(self, user_id, event_type, data):
+        groups = [self.group_name]
+        if user_id is not None:
+            groups.append(user_group('bookings', user_id))
+        self._send_to_groups(event_type, data, groups)
+
+    def _send_availability(self, court_id, bookings_data):
+        if court_id is None:
+            return
+        self._send_to_group('court_availability_changed', {
+            'court_id': court_id,
+            'slots': [
+                {
+                    'booking_id': booking['id'],
+                    'start_time': booking['start_time'],
+                    'end_time': booking['end_time'],
+                    'status': booking['status'],
+                }
+                for booking in bookings_data
+            ],
+        }, group=court_group(court_id))
 
     def notify_booking_created(self, booking_data):
-        self._send_to_group('booking_created', {'booking': booking_data})
+        self._send_to_owner_and_admins(self._user_id(booking_data), 'booking_created', {'booking': booking_data})
+        self._send_availability(self._court_id(booking_data), [booking_data])
+
+    def notify_bookings_bulk_created(self, bookings_data):
+        if not bookings_data:
+            return
+        # Un único evento para todas las ocurrencias de una reserva recurrente (mismo usuario y pista)
+        first = bookings_data[0]
+        self._send_to_owner_and_admins(self._user_id(first), 'booking_bulk_created', {'bookings': bookings_data})
+        self._send_availability(self._court_id(first), bookings_data)
 
     def notify_booking_updated(self, booking_data):
-        self._send_to_group('booking_updated', {'booking': booking_data})
+        self._send_to_owner_and_admins(self._user_id(booking_data), 'booking_updated', {'booking': booking_data})
+        self._send_availability(self._court_id(booking_data), [booking_data])
 
-    def notify_booking_cancelled(self, booking_id):
-        self._send_to_group('booking_cancelled', {'booking_id': booking_id})
+    def notify_booking_cancelled(self, booking_id, booking_data=None):
+        """
+        booking_data (dict, optional): Reserva serializada antes de eliminarla; sin ella
+        el evento solo llega a los administradores.
+        """
+        booking_data = booking_data or {}
+        self._send_to_owner_and_admins(self._user_id(booking_data), 'booking_cancelled', {'booking_id': booking_id})
+        if booking_data:
+            self._send_availability(self._court_id(booking_data), [{**booking_data, 'status': 'cancelled'}])
 
 booking_notifier = BookingWebSocketNotifier()
@@ -2,14 +2,23 @@ from rest_framework import status, views, viewsets
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.settings import api_settings
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
+from django.db import transaction
 from django.utils import timezone
 from datetime import timedelta
 
 from .models import Booking
-from .serializers import BookingSerializer
+from .serializers import BookingSerializer, BookingBulkSerializer, BookingListSerializer, OVERLAP_ERROR_MESSAGE
+from .filters import BookingFilter
+from .pagination import BookingKeysetPagination
+from .infrastructure.overlap_guard import (
+    BookingOverlapError, bulk_create_without_overlap, court_booking_guard, save_without_overlap
+)
 from .utils.websocket_notifier import booking_notifier
+from courts.infrastructure.cache.weekly_availability_cache import weekly_availability_cache
 
 class BookingStatsView(views.APIView):
     """
@@ -47,10 +56,15 @@ class BookingViewSet(viewsets.ModelViewSet):
     serializer_class = BookingSerializer
     http_method_names = ['get', 'post', 'put', 'patch', 'delete', 'head', 'options']
 
+    def get_queryset(self):
+        # Cargar usuario, rol, cancha e imágenes de la cancha en un número fijo de consultas
+        # (BookingSerializer anida UserSerializer y CourtSerializer)
+        return Booking.objects.select_related('user__role', 'court').prefetch_related('court__images')
+
     def get_permissions(self):
         if self.request.user and self.request.user.is_staff:
             return [IsAdminUser()]
-        if self.action in ['list', 'create', 'retrieve', 'update_booking_status']:
+        if self.action in ['list', 'create', 'retrieve', 'update_booking_status', 'bulk_create']:
             return [IsAuthenticated()]
         return super().get_permissions()
 
@@ -61,18 +75,81 @@ class BookingViewSet(viewsets.ModelViewSet):
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
         try:
-            # Lógica directa síncrona
-            booking = serializer.save(user=request.user)
-            response_serializer = self.get_serializer(booking)
-            
-            # Notificar WebSocket
-            booking_notifier.notify_booking_created(response_serializer.data)
+            # La reserva y su evento del outbox se confirman en la misma transacción
+            with court_booking_guard(serializer.validated_data['court'].pk):
+                booking = serializer.save(user=request.user)
+                weekly_availability_cache.invalidate(booking.court_id, booking.start_time, booking.end_time)
+                response_serializer = self.get_serializer(booking)
+
+                # Notificar WebSocket
+                booking_notifier.notify_booking_created(response_serializer.data)
             
             return Response(response_serializer.data, status=status.HTTP_201_CREATED)
+        except ValidationError as e:
+            # Conflicto detectado al insertar (reserva concurrente en el mismo horario)
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
+        except BookingOverlapError:
+            # Otra escritura concurrente retuvo el candado hasta el commit
+            return Response({"error": OVERLAP_ERROR_MESSAGE}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             print(f"Error creating booking: {e}")
             return Response({"error": "Error interno al crear la reserva."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk_create(self, request):
+        """
+        Crear una reserva recurrente (ej. ligas: todos los martes de 19:00 a 21:00).
+
+        Todas las ocurrencias se validan contra las reservas existentes en una sola consulta
+        y se insertan con bulk_create en una única transacción. Se emite un solo evento WS.
+        Con skip_conflicts=false (por defecto) no se crea nada si alguna ocurrencia choca.
+        """
+        serializer = BookingBulkSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        court = serializer.validated_data['court']
+        occurrences = serializer.get_occurrences()
+        bookings = [
+            Booking(user=request.user, court=court, start_time=start_time, end_time=end_time)
+            for start_time, end_time in occurrences
+        ]
+
+        try:
+            # Las reservas y su evento del outbox se confirman en la misma transacción
+            with court_booking_guard(court.pk):
+                created, conflicts = bulk_create_without_overlap(
+                    bookings, skip_conflicts=serializer.validated_data['skip_conflicts']
+                )
+                if created:
+                    for booking in created:
+                        weekly_availability_cache.invalidate(booking.court_id, booking.start_time, booking.end_time)
+
+                    created_bookings = self.get_queryset().filter(pk__in=[b.pk for b in created]).order_by('start_time')
+                    created_data = self.get_serializer(created_bookings, many=True).data
+
+                    # Notificar WebSocket (un único evento agregado)
+                    booking_notifier.notify_bookings_bulk_created(created_data)
+        except BookingOverlapError:
+            # Otra reserva se insertó concurrentemente en alguna de las franjas
+            return Response({"error": OVERLAP_ERROR_MESSAGE}, status=status.HTTP_409_CONFLICT)
+
+        conflicts_data = [
+            {
+                'start_time': occurrences[index][0],
+                'end_time': occurrences[index][1],
+                'conflicting_booking_ids': booking_ids,
+            }
+            for index, booking_ids in sorted(conflicts.items())
+        ]
+        if not created:
+            return Response(
+                {"error": OVERLAP_ERROR_MESSAGE, "created": [], "conflicts": conflicts_data},
+                status=status.HTTP_409_CONFLICT
+            )
+
+        return Response({"created": created_data, "conflicts": conflicts_data}, status=status.HTTP_201_CREATED)
+
     @action(detail=True, methods=['post'], url_path='update-status')
     def update_booking_status(self, request, pk=None):
         """Actualizar estado de reserva y notificar por WS"""
@@ -82,31 +159,83 @@ class BookingViewSet(viewsets.ModelViewSet):
 
         try:
             if request.user.is_staff:
-                booking = Booking.objects.get(pk=pk)
+                booking = self.get_queryset().get(pk=pk)
             else:
-                booking = Booking.objects.get(pk=pk, user=request.user)
+                booking = self.get_queryset().get(pk=pk, user=request.user)
 
             booking.status = new_status
-            booking.save()
-            
-            serializer = self.get_serializer(booking)
-            
-            # Notificar WebSocket
-            booking_notifier.notify_booking_updated(serializer.data)
+            # El cambio de estado y su evento del outbox se confirman juntos
+            with court_booking_guard(booking.court_id):
+                save_without_overlap(booking)
+                weekly_availability_cache.invalidate(booking.court_id, booking.start_time, booking.end_time)
+
+                serializer = self.get_serializer(booking)
+
+                # Notificar WebSocket
+                booking_notifier.notify_booking_updated(serializer.data)
             
             return Response(serializer.data)
         except Booking.DoesNotExist:
             return Response({"detail": "Reserva no encontrada."}, status=status.HTTP_404_NOT_FOUND)
+        except BookingOverlapError:
+            return Response({"error": OVERLAP_ERROR_MESSAGE}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    def perform_update(self, serializer):
+        """Guardar una edición (PUT/PATCH) e invalidar la semana anterior y la nueva"""
+        instance = serializer.instance
+        previous_slot = (instance.court_id, instance.start_time, instance.end_time)
+        court = serializer.validated_data.get('court', instance.court)
+        try:
+            # Igual que create: BookingSerializer.update guarda con save_without_overlap
+            with court_booking_guard(court.pk):
+                booking = serializer.save()
+                weekly_availability_cache.invalidate(*previous_slot)
+                weekly_availability_cache.invalidate(booking.court_id, booking.start_time, booking.end_time)
+        except BookingOverlapError:
+            # Otra escritura concurrente retuvo el candado hasta el commit
+            raise ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [OVERLAP_ERROR_MESSAGE]})
+
     def list(self, request, *args, **kwargs):
+        """
+        Lista las reservas (todas para staff, las propias para clientes).
+
+        Filtros opcionales: status, court, date_from y date_to (sobre start_time).
+        Si se envía 'cursor' o 'page_size' la respuesta se pagina por cursor sobre
+        (created_at, id); sin ellos se mantiene la lista completa.
+        Con 'compact=true' o 'fields=a,b' se usa la representación plana BookingListSerializer.
+        """
         user = request.user
+        compact = BookingListSerializer.is_requested(request)
+        # La representación plana lee columnas con .values() y no necesita precargar relaciones
+        bookings = Booking.objects.all() if compact else self.get_queryset()
         if not user.is_staff:
-            bookings = Booking.objects.filter(user=user).order_by('-created_at')
-        else:
-            bookings = Booking.objects.all().order_by('-created_at')
+            bookings = bookings.filter(user=user)
+        bookings = bookings.order_by('-created_at')
+
+        booking_filter = BookingFilter(request.query_params, queryset=bookings)
+        if not booking_filter.is_valid():
+            return Response(booking_filter.errors, status=status.HTTP_400_BAD_REQUEST)
+        bookings = booking_filter.qs
+
+        if compact:
+            try:
+                list_serializer = BookingListSerializer.from_request(request)
+            except ValidationError as e:
+                return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
+            bookings = list_serializer.get_values(bookings)
+
+        paginator = BookingKeysetPagination()
+        if paginator.is_requested(request):
+            page = paginator.paginate_queryset(bookings, request, view=self)
+            if compact:
+                return paginator.get_paginated_response(list_serializer.to_representation(page))
+            serializer = self.get_serializer(page, many=True)
+            return paginator.get_paginated_response(serializer.data)
 
+        if compact:
+            return Response(list_serializer.to_representation(bookings))
         serializer = self.get_serializer(bookings, many=True)
         return Response(serializer.data)
 
@@ -114,9 +243,13 @@ class BookingViewSet(viewsets.ModelViewSet):
         """Remover reserva y notificar por WS"""
         instance = self.get_object()
         booking_id = instance.id
-        self.perform_destroy(instance)
-        
-        # Notificar WebSocket
-        booking_notifier.notify_booking_cancelled(booking_id)
+        # Se serializa antes de borrar para enrutar el evento al dueño y a la pista
+        booking_data = self.get_serializer(instance).data
+        with transaction.atomic():
+            self.perform_destroy(instance)
+            weekly_availability_cache.invalidate(instance.court_id, instance.start_time, instance.end_time)
+
+            # Notificar WebSocket
+            booking_notifier.notify_booking_cancelled(booking_id, booking_data)
         
         return Response(status=status.HTTP_204_NO_CONTENT)
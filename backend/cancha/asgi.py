@@ -25,10 +25,13 @@ from matches.routing import websocket_urlpatterns as matches_ws
 from bookings.routing import websocket_urlpatterns as bookings_ws
 from users.routing import websocket_urlpatterns as users_ws
 from chat.routing import websocket_urlpatterns as chat_ws
+from realtime.routing import websocket_urlpatterns as realtime_ws
+from realtime.middleware import DispatcherLoopMiddleware
 
-combined_ws_urlpatterns = matches_ws + bookings_ws + users_ws + chat_ws
+combined_ws_urlpatterns = matches_ws + bookings_ws + users_ws + chat_ws + realtime_ws
 
-application = ProtocolTypeRouter({
+# La cola de notificaciones envía en el loop del servidor (ver realtime.dispatcher)
+application = DispatcherLoopMiddleware(ProtocolTypeRouter({
     # HTTP normal usa Django ASGI
     "http": django_asgi_app,
     
@@ -40,4 +43,4 @@ application = ProtocolTypeRouter({
             )
         )
     ),
-})
+}))
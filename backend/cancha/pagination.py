@@ -0,0 +1,135 @@
+import base64
+from collections import OrderedDict
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginación por cursor (keyset) sobre (created_at, id).
+
+    A diferencia de la paginación por offset, cada página se obtiene con
+    WHERE (created_at, id) < (cursor) ORDER BY created_at DESC, id DESC LIMIT n
+    (o con > y ASC si descending = False), que usa los índices sobre created_at
+    y cuesta lo mismo en la página 1 que en la 1000.
+
+    Las subclases solo fijan la dirección y los settings del tamaño de página;
+    get_position permite empezar la página desde algo distinto del cursor.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Cursor inválido.'
+
+    descending = True
+    page_size_setting = None
+    default_page_size = 50
+    max_page_size_setting = None
+    default_max_page_size = 200
+
+    @property
+    def page_size(self) -> int:
+        return getattr(settings, self.page_size_setting, self.default_page_size)
+
+    @property
+    def max_page_size(self) -> int:
+        return getattr(settings, self.max_page_size_setting, self.default_max_page_size)
+
+    def get_query_params(self) -> tuple:
+        return (self.cursor_query_param, self.page_size_query_param)
+
+    def is_requested(self, request) -> bool:
+        """
+        Indica si el cliente pidió una respuesta paginada (compatibilidad con la lista completa).
+        """
+        params = request.query_params
+        return any(name in params for name in self.get_query_params())
+
+    def get_page_size(self, request) -> int:
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def encode_cursor(self, created_at: datetime, pk: int) -> str:
+        raw = f'{created_at.isoformat()}|{pk}'
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    def decode_cursor(self, cursor: str):
+        try:
+            created_at_str, pk_str = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+            return datetime.fromisoformat(created_at_str), int(pk_str)
+        except (ValueError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_position(self, queryset, request):
+        """
+        (created_at, id) a partir del cual empieza la página, o None desde el principio.
+        Un id None deja fuera todas las filas con ese mismo created_at.
+        """
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            return self.decode_cursor(cursor)
+        return None
+
+    def filter_after(self, queryset, created_at, pk):
+        lookup = 'lt' if self.descending else 'gt'
+        after = Q(**{f'created_at__{lookup}': created_at})
+        if pk is None:
+            return queryset.filter(after)
+        return queryset.filter(after | Q(created_at=created_at, **{f'pk__{lookup}': pk}))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self.is_requested(request):
+            return None
+        self.request = request
+        page_size = self.get_page_size(request)
+
+        position = self.get_position(queryset, request)
+        if position is not None:
+            queryset = self.filter_after(queryset, *position)
+
+        ordering = ('-created_at', '-pk') if self.descending else ('created_at', 'pk')
+        # Se pide una fila de más para saber si existe una página siguiente
+        rows = list(queryset.order_by(*ordering)[:page_size + 1])
+        self.has_next = len(rows) > page_size
+        page = rows[:page_size]
+        self.next_cursor = None
+        if self.has_next:
+            last = page[-1]
+            # Las filas pueden ser instancias del modelo o diccionarios de .values()
+            if isinstance(last, dict):
+                self.next_cursor = self.encode_cursor(last['created_at'], last['id'])
+            else:
+                self.next_cursor = self.encode_cursor(last.created_at, last.pk)
+        return page
+
+    def get_next_link(self):
+        if not self.next_cursor:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('next_cursor', self.next_cursor),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'next_cursor': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
@@ -71,6 +71,7 @@ INSTALLED_APPS = [
     "plans",
     "matches",
     "chat",
+    "realtime",
     "django_filters",  # Añadir django_filters
     "channels",
 ]
@@ -78,13 +79,84 @@ INSTALLED_APPS = [
 # ASGI Configuration
 ASGI_APPLICATION = "cancha.asgi.application"
 
-# Channels Configuration (Development: InMemory)
+# Channels Configuration
+# Capa de canales. InMemoryChannelLayer solo alcanza a los clientes del mismo proceso;
+# con varios workers de Daphne usar CHANNEL_LAYER_BACKEND='realtime.channel_layers.PostgresChannelLayer'
+# (LISTEN/NOTIFY sobre la base de datos PostgreSQL, sin Redis).
 CHANNEL_LAYERS = {
     "default": {
-        "BACKEND": "channels.layers.InMemoryChannelLayer",
+        "BACKEND": os.getenv("CHANNEL_LAYER_BACKEND", "channels.layers.InMemoryChannelLayer"),
     },
 }
 
+# Cola de salida de notificaciones WebSocket (realtime.dispatcher)
+NOTIFICATION_QUEUE_MAX_SIZE = int(os.getenv("NOTIFICATION_QUEUE_MAX_SIZE", 1000))
+NOTIFICATION_QUEUE_BATCH_SIZE = int(os.getenv("NOTIFICATION_QUEUE_BATCH_SIZE", 100))
+# Intentos por evento y segundos entre reintentos si falla el group_send de un grupo
+NOTIFICATION_MAX_ATTEMPTS = int(os.getenv("NOTIFICATION_MAX_ATTEMPTS", 3))
+NOTIFICATION_RETRY_DELAY = float(os.getenv("NOTIFICATION_RETRY_DELAY", 0.5))
+
+# Outbox de eventos WebSocket (realtime.outbox): horas que se conservan los eventos
+# publicados (también es la ventana de deduplicación por Idempotency-Key) y segundos
+# mínimos entre purgas automáticas.
+OUTBOX_RETENTION_HOURS = float(os.getenv("OUTBOX_RETENTION_HOURS", 24))
+OUTBOX_PURGE_INTERVAL = int(os.getenv("OUTBOX_PURGE_INTERVAL", 300))
+
+# Los frames WebSocket se codifican una vez por evento (realtime.frames). Si orjson está
+# instalado se usa como codificador rápido; WEBSOCKET_FAST_JSON=False fuerza json estándar.
+WEBSOCKET_FAST_JSON = os.getenv("WEBSOCKET_FAST_JSON", "True").lower() == "true"
+
+# Ventana (ms) en la que los cambios de participantes de un partido se agregan en un
+# solo delta match_state. Es la latencia máxima añadida; 0 envía cada cambio por separado.
+MATCH_EVENT_COALESCE_WINDOW_MS = int(os.getenv("MATCH_EVENT_COALESCE_WINDOW_MS", 200))
+
+# Caché en memoria de token -> usuario para los handshakes WebSocket (users.middleware).
+# Una entrada dura como mucho WS_AUTH_CACHE_TTL segundos o hasta que expira el token.
+WS_AUTH_CACHE_TTL = int(os.getenv("WS_AUTH_CACHE_TTL", 60))
+WS_AUTH_CACHE_MAX_ENTRIES = int(os.getenv("WS_AUTH_CACHE_MAX_ENTRIES", 10000))
+
+# Los mensajes de chat se difunden al instante y se guardan en bloque (chat.write_buffer)
+# cada CHAT_WRITE_BUFFER_FLUSH_MS o al juntarse CHAT_WRITE_BUFFER_MAX_MESSAGES.
+# El estado de cada sala (inicio, creador, participantes; chat.room_state) se cachea
+# CHAT_ROOM_STATE_CACHE_TTL segundos como mucho; una pertenencia no cacheada se
+# confirma en la base de datos y las bajas se avisan a todas las conexiones de la sala.
+CHAT_WRITE_BUFFER_FLUSH_MS = int(os.getenv("CHAT_WRITE_BUFFER_FLUSH_MS", 500))
+CHAT_WRITE_BUFFER_MAX_MESSAGES = int(os.getenv("CHAT_WRITE_BUFFER_MAX_MESSAGES", 50))
+CHAT_ROOM_STATE_CACHE_TTL = int(os.getenv("CHAT_ROOM_STATE_CACHE_TTL", 30))
+
+# Cada sala difunde como mucho un cambio de 'escribiendo...' por intervalo (chat.typing).
+CHAT_TYPING_INTERVAL_MS = int(os.getenv("CHAT_TYPING_INTERVAL_MS", 1000))
+
+# Paginación por cursor del historial de chat (?page_size= / ?cursor= / ?since_id=)
+CHAT_PAGE_SIZE = int(os.getenv("CHAT_PAGE_SIZE", 100))
+CHAT_MAX_PAGE_SIZE = int(os.getenv("CHAT_MAX_PAGE_SIZE", 500))
+
+# Caché (Desarrollo: LocMem). En producción se puede apuntar a otro backend
+# (ej. django.core.cache.backends.db.DatabaseCache o memcached) mediante variables de entorno.
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv(
+            "CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": os.getenv("CACHE_LOCATION", "cancha-default"),
+    },
+}
+
+# Segundos que se conserva una disponibilidad semanal cacheada (la invalidación es explícita)
+WEEKLY_AVAILABILITY_CACHE_TIMEOUT = int(
+    os.getenv("WEEKLY_AVAILABILITY_CACHE_TIMEOUT", 3600)
+)
+
+# Segundos que vive el feed materializado de partidos abiertos (se actualiza en cada cambio)
+OPEN_MATCH_FEED_CACHE_TIMEOUT = int(os.getenv("OPEN_MATCH_FEED_CACHE_TIMEOUT", 300))
+
+# Paginación por cursor del listado de reservas (?page_size= / ?cursor=)
+BOOKING_PAGE_SIZE = int(os.getenv("BOOKING_PAGE_SIZE", 50))
+BOOKING_MAX_PAGE_SIZE = int(os.getenv("BOOKING_MAX_PAGE_SIZE", 200))
+
+# Máximo de ocurrencias por reserva recurrente (POST /bookings/bookings/bulk/)
+BOOKING_BULK_MAX_OCCURRENCES = int(os.getenv("BOOKING_BULK_MAX_OCCURRENCES", 52))
+
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
         "rest_framework_simplejwt.authentication.JWTAuthentication",
@@ -102,6 +174,8 @@ MIDDLEWARE = [
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "allauth.account.middleware.AccountMiddleware",
+    # Claves de los eventos del outbox derivadas de la cabecera Idempotency-Key
+    "realtime.middleware.OutboxIdempotencyMiddleware",
     # Middleware de django-allauth (añadir después de AuthenticationMiddleware)
     # 'allauth.account.middleware.AccountMiddleware', # Este middleware no existe en allauth 0.54.0
 ]
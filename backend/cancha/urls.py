@@ -50,6 +50,7 @@ urlpatterns = [
     path('api/plans/', include('plans.urls')),
     path('api/matches/', include('matches.urls')),
     path('api/chat/', include('chat.urls')),
+    path('api/realtime/', include('realtime.urls')),
     # URLs de django-allauth
     path('accounts/', include('allauth.urls')),
     # URL para obtener la cookie CSRF
@@ -2,19 +2,83 @@ import json
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.contrib.auth import get_user_model
-from matches.models import OpenMatch, MatchParticipant
 from .models import ChatMessage
+from .room_state import room_state_cache
+from .typing import typing_aggregator
+from .write_buffer import chat_write_buffer
 from django.utils import timezone
+from rest_framework.fields import DateTimeField
 from rest_framework_simplejwt.tokens import UntypedToken
 from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 from urllib.parse import parse_qs
+from realtime.frames import encode_frame
+from realtime.groups import chat_group, match_group
+from realtime.multiplex import Topic, TopicError
 
 User = get_user_model()
 
+
+async def is_user_participant(user, match_id):
+    return await room_state_cache.ais_member(match_id, user.id)
+
+
+async def has_match_started(match_id):
+    state = await room_state_cache.aget(match_id)
+    return state is None or state.has_started()
+
+
+async def send_typing(channel_layer, user, match_id, is_typing):
+    # Se agrega por sala: como mucho un typing_state por intervalo (ver TypingAggregator)
+    await typing_aggregator.update(channel_layer, match_id, user.username, is_typing)
+
+
+async def send_chat_message(channel_layer, user, match_id, message):
+    """
+    Difunde un mensaje de chat a la sala y el aviso a los participantes del partido.
+
+    El mensaje se guarda en diferido (chat_write_buffer), así que el frame sale con
+    id None: el id definitivo solo lo tiene el historial. El frame lleva el uuid con el
+    que se guardará, y el cliente descarta duplicados por uuid al mezclar el socket con
+    el historial. Para ponerse al día tras recibir mensajes por el socket usa
+    ?since=<created_at del último> (no since_id); los mensajes aún sin guardar (como
+    mucho CHAT_WRITE_BUFFER_FLUSH_MS) no aparecen todavía en el historial.
+    """
+    chat_message = ChatMessage(user=user, match_id=match_id, message=message, created_at=timezone.now())
+    chat_write_buffer.add(chat_message)
+    typing_aggregator.clear(match_id, user.username)
+
+    # Enviar a todos en el grupo
+    await channel_layer.group_send(
+        chat_group(match_id),
+        {
+            'type': 'chat_message',
+            'match_id': match_id,
+            'id': chat_message.id,
+            'uuid': str(chat_message.uuid),
+            'message': chat_message.message,
+            'username': user.username,
+            'user_id': user.id,
+            # Mismo formato ISO 8601 que el historial: sirve tal cual para ?since=
+            'created_at': DateTimeField().to_representation(chat_message.created_at)
+        }
+    )
+
+    # Badge de notificación: solo a los participantes (grupo del partido en MatchConsumer)
+    notification = {'match_id': match_id, 'message': chat_message.message, 'username': user.username}
+    await channel_layer.group_send(
+        match_group(match_id),
+        {
+            'type': 'chat_notification',
+            'frame': encode_frame('chat_notification', notification),
+            **notification
+        }
+    )
+
+
 class ChatConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         self.match_id = self.scope['url_route']['kwargs']['match_id']
-        self.room_group_name = f'chat_{self.match_id}'
+        self.room_group_name = chat_group(self.match_id)
 
         # El usuario ya viene autenticado por el JWTAuthMiddleware
         user = self.scope.get('user')
@@ -66,6 +130,11 @@ class ChatConsumer(AsyncWebsocketConsumer):
                 self.room_group_name,
                 self.channel_name
             )
+        if hasattr(self, 'user'):
+            # Si se desconecta escribiendo, los demás dejan de verlo
+            await send_typing(self.channel_layer, self.user, self.match_id, False)
+        # Que los mensajes de esta conexión no dependan de otro volcado
+        await chat_write_buffer.flush()
        # print(f"🔌 User disconnected from chat {self.match_id}. Code: {close_code}")
 
     async def receive(self, text_data):
@@ -74,14 +143,7 @@ class ChatConsumer(AsyncWebsocketConsumer):
             
             # Manejar evento de 'typing'
             if data.get('type') == 'typing':
-                await self.channel_layer.group_send(
-                    self.room_group_name,
-                    {
-                        'type': 'user_typing',
-                        'username': self.user.username,
-                        'is_typing': data.get('is_typing', False)
-                    }
-                )
+                await send_typing(self.channel_layer, self.user, self.match_id, data.get('is_typing', False))
                 return
 
             message = data.get('message')
@@ -97,87 +159,112 @@ class ChatConsumer(AsyncWebsocketConsumer):
                 }))
                 return
 
-            # Guardar mensaje
-            saved_msg = await self.save_message(self.user, self.match_id, message)
-
-            # Enviar a todos en el grupo
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    'type': 'chat_message',
-                    'id': saved_msg.id,
-                    'message': saved_msg.message,
-                    'username': self.user.username,
-                    'user_id': self.user.id,
-                    'created_at': str(saved_msg.created_at)
-                }
-            )
-
-            # Notificar al grupo general de matches para el badge de notificación
-            await self.channel_layer.group_send(
-                'matches',
-                {
-                    'type': 'chat_notification',
-                    'match_id': self.match_id,
-                    'message': saved_msg.message,
-                    'username': self.user.username,
-                }
-            )
+            # Guardar mensaje y enviarlo a la sala
+            await send_chat_message(self.channel_layer, self.user, self.match_id, message)
         except Exception as e:
             print(f"❌ Error receiving message: {e}")
 
-    async def chat_notification(self, event):
-        # Este método no hace nada aquí, pero es necesario para que el group_send no falle
-        # si algún consumidor de este tipo está escuchando en este grupo.
-        # En realidad, el handler está en MatchConsumer.
-        pass
-
     async def chat_message(self, event):
         await self.send(text_data=json.dumps({
             'type': 'chat_message',
             'id': event['id'],
+            'uuid': event['uuid'],
             'message': event['message'],
             'username': event['username'],
             'user_id': event['user_id'],
             'created_at': event['created_at']
         }))
 
-    async def user_typing(self, event):
+    async def chat_member_removed(self, event):
+        # Aviso de control de room_state: la baja se aplica también en este proceso
+        room_state_cache.discard_participant(event['match_id'], event['user_id'])
+        if event['user_id'] == self.user.id:
+            await self.close(code=4003)
+
+    async def typing_state(self, event):
         # Evitar enviarse a uno mismo el estado de escritura
-        if event['username'] != self.user.username:
-            await self.send(text_data=json.dumps({
-                'type': 'typing',
-                'username': event['username'],
-                'is_typing': event['is_typing']
-            }))
+        for change in event['changes']:
+            if change['username'] != self.user.username:
+                await self.send(text_data=json.dumps({
+                    'type': 'typing',
+                    'username': change['username'],
+                    'is_typing': change['is_typing']
+                }))
 
     @database_sync_to_async
     def get_user(self, user_id):
         return User.objects.get(id=user_id)
 
-    @database_sync_to_async
-    def is_user_participant(self, user, match_id):
-        try:
-            match = OpenMatch.objects.get(id=match_id)
-            if match.creator == user:
-                return True
-            return MatchParticipant.objects.filter(match_id=match_id, user=user).exists()
-        except OpenMatch.DoesNotExist:
-            return False
+    async def is_user_participant(self, user, match_id):
+        return await is_user_participant(user, match_id)
 
-    @database_sync_to_async
-    def has_match_started(self, match_id):
-        try:
-            match = OpenMatch.objects.get(id=match_id)
-            # Requisito: Los mensajes se borran luego de que inicia la hora del partido
-            return timezone.now() >= match.start_time
-        except OpenMatch.DoesNotExist:
-            return True
+    async def has_match_started(self, match_id):
+        return await has_match_started(match_id)
 
-    @database_sync_to_async
-    def save_message(self, user, match_id, message):
-        return ChatMessage.objects.create(
-            user=user,
-            match_id=match_id,
-            message=message
-        )
+
+
+class ChatTopic(Topic):
+    """
+    Tema 'chat' del socket multiplexado. Parámetro: match_id (clave 'chat:<match_id>').
+
+    Aplica las mismas comprobaciones que ChatConsumer al suscribirse y acepta las mismas
+    acciones del cliente ({'message': ...} o {'type': 'typing', 'is_typing': ...}).
+    """
+    name = 'chat'
+    events = {
+        'chat_message': ('id', 'uuid', 'message', 'username', 'user_id', 'created_at'),
+        'typing_state': ('changes',),
+    }
+    control_events = ('chat_member_removed',)
+
+    @classmethod
+    def key_for_params(cls, params):
+        return f"chat:{params.get('match_id')}"
+
+    @classmethod
+    def key_for_event(cls, event):
+        return f"chat:{event.get('match_id')}"
+
+    @property
+    def match_id(self):
+        return str(self.params.get('match_id'))
+
+    async def get_groups(self):
+        if not self.match_id.isdigit():
+            raise TopicError(4000, 'match_id es requerido.')
+        if await has_match_started(self.match_id):
+            raise TopicError(4004, 'El partido ya comenzó, el chat está cerrado.')
+        if not await is_user_participant(self.user, self.match_id):
+            raise TopicError(4003, 'No participas en este partido.')
+        return [chat_group(self.match_id)]
+
+    def frames(self, event):
+        if event['type'] == 'typing_state':
+            # Evitar enviarse a uno mismo el estado de escritura
+            return [
+                encode_frame('typing', change) for change in event['changes']
+                if change['username'] != self.user.username
+            ]
+        return super().frames(event)
+
+    async def handle_control(self, event):
+        # Baja del participante (ver ChatConsumer.chat_member_removed)
+        room_state_cache.discard_participant(event['match_id'], event['user_id'])
+        if event['user_id'] == self.user.id:
+            await self.consumer.remove_topic(self)
+            await self.consumer.send_control('error', self.key, code=4003, message='No participas en este partido.')
+
+    async def close(self):
+        await send_typing(self.consumer.channel_layer, self.user, self.match_id, False)
+        await chat_write_buffer.flush()
+
+    async def receive(self, data):
+        if data.get('type') == 'typing':
+            await send_typing(self.consumer.channel_layer, self.user, self.match_id, data.get('is_typing', False))
+            return
+        message = data.get('message')
+        if not message:
+            return
+        if await has_match_started(self.match_id):
+            raise TopicError(4004, 'El partido ya comenzó, el chat está cerrado.')
+        await send_chat_message(self.consumer.channel_layer, self.user, self.match_id, message)
@@ -0,0 +1,94 @@
+import asyncio
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from chat.typing import TypingAggregator
+from realtime.groups import chat_group
+
+
+class _CountingLayer:
+    """
+    Capa de canales de prueba: solo cuenta los group_send.
+    """
+
+    def __init__(self):
+        self.messages = 0
+
+    async def group_send(self, group, message):
+        self.messages += 1
+
+
+class Command(BaseCommand):
+    help = (
+        "Simula usuarios escribiendo en varias salas de chat y compara los mensajes por "
+        "segundo que llegan a la capa de canales: un group_send por cada frame 'typing' "
+        "(antes) frente al agregador por sala (chat.typing)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rooms', type=int, default=100, help='Salas de chat activas.')
+        parser.add_argument('--users', type=int, default=4, help='Usuarios escribiendo por sala.')
+        parser.add_argument('--seconds', type=float, default=10, help='Duración de cada medición.')
+        parser.add_argument('--keystroke-ms', type=int, default=150, help='Tiempo medio entre pulsaciones.')
+        parser.add_argument('--interval-ms', type=int, default=1000, help='CHAT_TYPING_INTERVAL_MS del agregador.')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        if min(options['rooms'], options['users']) < 1 or options['seconds'] <= 0 or options['keystroke_ms'] < 1:
+            raise CommandError('--rooms, --users, --seconds y --keystroke-ms deben ser positivos.')
+
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"{options['rooms']} salas x {options['users']} usuarios, {options['seconds']:g} s por medición"
+        ))
+        self.stdout.write(f"{'modo':>10} | {'frames typing/s':>15} | {'group_send/s':>12} | {'entregas/s':>10}")
+        results = []
+        for mode in ('directo', 'agregado'):
+            with override_settings(CHAT_TYPING_INTERVAL_MS=options['interval_ms']):
+                frames, messages = asyncio.run(self._measure(mode, options))
+            seconds = options['seconds']
+            # Cada group_send despierta a todos los consumers de la sala
+            deliveries = messages * options['users']
+            self.stdout.write(
+                f'{mode:>10} | {frames / seconds:>15.1f} | {messages / seconds:>12.1f} | {deliveries / seconds:>10.1f}'
+            )
+            results.append(messages)
+        if results[1]:
+            self.stdout.write(self.style.SUCCESS(f'Mensajes en la capa de canales: x{results[0] / results[1]:.1f} menos'))
+
+    async def _measure(self, mode, options):
+        layer = _CountingLayer()
+        aggregator = TypingAggregator()
+        rng = random.Random(options['seed'])
+        keystroke = options['keystroke_ms'] / 1000
+        until = time.monotonic() + options['seconds']
+        counters = {'frames': 0}
+
+        async def send(room, username, is_typing):
+            counters['frames'] += 1
+            if mode == 'directo':
+                await layer.group_send(chat_group(room), {
+                    'type': 'user_typing', 'match_id': room, 'username': username, 'is_typing': is_typing
+                })
+            else:
+                await aggregator.update(layer, room, username, is_typing)
+
+        async def typist(room, username, user_rng):
+            # Como MatchChat.jsx: true en cada pulsación y false a los 2 s sin escribir
+            await asyncio.sleep(user_rng.uniform(0, 2))
+            while time.monotonic() < until:
+                burst_end = time.monotonic() + user_rng.uniform(1, 5)
+                while time.monotonic() < min(burst_end, until):
+                    await send(room, username, True)
+                    await asyncio.sleep(user_rng.uniform(keystroke / 2, keystroke * 1.5))
+                await asyncio.sleep(2)
+                await send(room, username, False)
+                await asyncio.sleep(user_rng.uniform(0, 3))
+
+        await asyncio.gather(*(
+            typist(str(room), f'user{user}', random.Random(rng.random()))
+            for room in range(options['rooms']) for user in range(options['users'])
+        ))
+        return counters['frames'], layer.messages
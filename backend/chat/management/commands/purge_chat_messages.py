@@ -0,0 +1,55 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from chat.retention import chat_retention
+
+
+class Command(BaseCommand):
+    help = (
+        'Borra (o archiva y borra) los mensajes de chat de los partidos que ya empezaron, '
+        'en lotes cortos, e informa del rendimiento en filas por segundo. Sin --once se '
+        'queda ejecutándose cada --interval segundos.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Mensajes por DELETE.')
+        parser.add_argument('--grace', type=float, default=0.0, help='Minutos tras el inicio del partido antes de borrar.')
+        parser.add_argument('--pause', type=float, default=0.05, help='Segundos de espera entre lotes.')
+        parser.add_argument('--archive', help='Fichero JSON Lines donde añadir los mensajes borrados.')
+        parser.add_argument('--interval', type=float, default=300.0, help='Segundos entre ejecuciones.')
+        parser.add_argument('--once', action='store_true', help='Ejecutar una sola purga y salir.')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1 or options['interval'] <= 0:
+            raise CommandError('--batch-size y --interval deben ser positivos.')
+
+        deleted_total = 0
+        while True:
+            close_old_connections()
+            archive = open(options['archive'], 'a', encoding='utf-8') if options['archive'] else None
+            try:
+                result = chat_retention.purge(
+                    batch_size=options['batch_size'],
+                    grace=timedelta(minutes=options['grace']),
+                    pause=options['pause'],
+                    archive=archive,
+                )
+            finally:
+                if archive is not None:
+                    archive.close()
+
+            deleted_total += result['deleted']
+            if result['deleted'] or options['once']:
+                self.stdout.write(
+                    f"{result['deleted']} mensajes de {result['matches']} partidos borrados en "
+                    f"{result['batches']} lotes, {result['seconds']}s ({result['rows_per_second']} filas/s, "
+                    f"lote más lento {result['max_batch_ms']}ms)"
+                )
+            if options['once']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(f'Retención finalizada: {deleted_total} mensajes borrados.'))
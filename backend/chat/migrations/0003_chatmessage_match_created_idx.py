@@ -0,0 +1,20 @@
+# Generated by Django 5.2 on 2026-10-18 12:05
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0002_chatmessage_created_at_default'),
+        ('matches', '0002_populate_match_categories'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['match', 'created_at', 'id'], name='chat_match_created_idx'),
+        ),
+    ]
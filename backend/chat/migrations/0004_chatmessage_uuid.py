@@ -0,0 +1,33 @@
+import uuid
+
+from django.db import migrations, models
+
+
+def fill_uuids(apps, schema_editor):
+    ChatMessage = apps.get_model('chat', 'ChatMessage')
+    messages = list(ChatMessage.objects.filter(uuid__isnull=True).only('id'))
+    for message in messages:
+        message.uuid = uuid.uuid4()
+    ChatMessage.objects.bulk_update(messages, ['uuid'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0003_chatmessage_match_created_idx'),
+    ]
+
+    operations = [
+        # Los mensajes existentes reciben cada uno su propio UUID antes de exigir unicidad
+        migrations.AddField(
+            model_name='chatmessage',
+            name='uuid',
+            field=models.UUIDField(editable=False, null=True),
+        ),
+        migrations.RunPython(fill_uuids, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='chatmessage',
+            name='uuid',
+            field=models.UUIDField(default=uuid.uuid4, editable=False, unique=True),
+        ),
+    ]
@@ -1,5 +1,8 @@
+import uuid
+
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 from matches.models import OpenMatch
 
 class ChatMessage(models.Model):
@@ -7,10 +10,17 @@ class ChatMessage(models.Model):
     match = models.ForeignKey(OpenMatch, on_delete=models.CASCADE, related_name='chat_messages')
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='chat_messages')
     message = models.TextField()
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Lo fija el consumer al recibir el mensaje (se guarda en diferido)
+    created_at = models.DateTimeField(default=timezone.now)
+    # Clave visible para el cliente desde el frame del socket (el id llega al guardar)
+    uuid = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
     
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            # Historial paginado de una sala: match = X AND (created_at, id) > cursor
+            models.Index(fields=['match', 'created_at', 'id'], name='chat_match_created_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} en Match {self.match.id}: {self.message[:50]}"
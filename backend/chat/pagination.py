@@ -0,0 +1,79 @@
+import re
+from datetime import datetime
+
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound, ValidationError
+
+from cancha.pagination import KeysetPagination
+
+
+class ChatKeysetPagination(KeysetPagination):
+    """
+    Paginación por cursor (keyset) del historial de chat sobre (created_at, id) en orden
+    cronológico.
+
+    Cada página es WHERE match_id = X AND (created_at, id) > (cursor) ORDER BY created_at,
+    id LIMIT n, resuelta con el índice (match, created_at, id). Para ponerse al día tras
+    reconectar el socket, el cliente pide solo lo posterior a su último mensaje:
+
+        ?since_id=<id>     después de un mensaje del historial
+        ?since=<fecha>     después del created_at (ISO 8601) de un mensaje recibido por
+                           el socket (esos llegan sin id porque se guardan en diferido,
+                           así que es la única forma de continuar desde uno de ellos)
+
+    Un since_id o since mal formado responde 400; un cursor inválido o un since_id que
+    ya no existe, 404.
+
+    Sin ninguno de estos parámetros (ni cursor ni page_size) la respuesta sigue siendo
+    la lista completa.
+    """
+    descending = False
+    page_size_setting = 'CHAT_PAGE_SIZE'
+    default_page_size = 100
+    max_page_size_setting = 'CHAT_MAX_PAGE_SIZE'
+    default_max_page_size = 500
+
+    since_id_query_param = 'since_id'
+    since_query_param = 'since'
+    invalid_since_message = 'Fecha inválida: se espera ISO 8601 (ej. 2026-10-18T12:00:00.123456-05:00).'
+
+    # Un '+' sin codificar en la query string llega como espacio: '...00.123456 05:00'
+    _unencoded_offset = re.compile(r' (\d{2}:?\d{2})$')
+
+    def get_query_params(self) -> tuple:
+        return super().get_query_params() + (self.since_id_query_param, self.since_query_param)
+
+    def get_position(self, queryset, request):
+        """
+        Además del cursor, acepta since_id y since para ponerse al día tras reconectar.
+        """
+        position = super().get_position(queryset, request)
+        if position is not None:
+            return position
+
+        params = request.query_params
+        since_id = params.get(self.since_id_query_param)
+        if since_id:
+            if not since_id.isdigit():
+                raise ValidationError({self.since_id_query_param: ['Debe ser el id numérico de un mensaje.']})
+            created_at = queryset.filter(pk=since_id).values_list('created_at', flat=True).first()
+            if created_at is None:
+                # Borrado o de otro partido: el cliente debe recargar el historial
+                raise NotFound('Mensaje no encontrado.')
+            return created_at, int(since_id)
+
+        since = params.get(self.since_query_param)
+        if since:
+            created_at = self.parse_since(since)
+            # Cualquier id con ese mismo instante ya lo tiene el cliente
+            return created_at, None
+        return None
+
+    def parse_since(self, since: str) -> datetime:
+        try:
+            created_at = parse_datetime(self._unencoded_offset.sub(r'+\1', since.strip()))
+        except ValueError:
+            created_at = None
+        if created_at is None:
+            raise ValidationError({self.since_query_param: [self.invalid_since_message]})
+        return created_at
@@ -0,0 +1,100 @@
+import json
+import time
+from datetime import timedelta
+from typing import Any, Dict, Optional, TextIO
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+from matches.models import OpenMatch
+
+from .models import ChatMessage
+
+
+class ChatRetention:
+    """
+    Retención del historial de chat: los mensajes se borran cuando empieza el partido.
+
+    ChatMessageViewSet ya oculta el historial de los partidos empezados; aquí se borra
+    de verdad para que chat_chatmessage no crezca sin límite. Se borra por partido en
+    lotes pequeños, cada uno en su propia transacción y localizado con el índice
+    (match, created_at, id), así que ningún lote bloquea la tabla más que unos
+    milisegundos y los chats abiertos no esperan.
+    """
+
+    def started_match_ids(self, grace: timedelta = timedelta(0)):
+        """
+        IDs de los partidos empezados hace más de grace que aún tienen mensajes.
+        """
+        cutoff = timezone.now() - grace
+        return list(
+            OpenMatch.objects.filter(start_time__lte=cutoff, chat_messages__isnull=False)
+            .values_list('id', flat=True).distinct().order_by('id')
+        )
+
+    def purge(
+        self, batch_size: int = 1000, grace: timedelta = timedelta(0), pause: float = 0.0,
+        archive: Optional[TextIO] = None,
+    ) -> Dict[str, Any]:
+        """
+        Borra los mensajes de los partidos empezados.
+
+        Args:
+            batch_size (int): Mensajes por DELETE.
+            grace (timedelta): Tiempo tras el inicio del partido antes de borrar.
+            pause (float): Segundos de espera entre lotes para ceder la tabla.
+            archive (file, optional): Si se indica, cada mensaje borrado se escribe como
+                una línea JSON tras confirmarse su lote, así que un DELETE o commit
+                fallido no deja en el archivo mensajes que siguen en la tabla (ni los
+                repite en la siguiente purga).
+
+        Returns:
+            dict: {'deleted', 'matches', 'batches', 'seconds', 'rows_per_second',
+                'max_batch_ms'}.
+        """
+        start = time.monotonic()
+        deleted = batches = 0
+        max_batch_ms = 0.0
+        match_ids = self.started_match_ids(grace)
+
+        for match_id in match_ids:
+            while True:
+                batch_start = time.monotonic()
+                with transaction.atomic():
+                    rows = ChatMessage.objects.filter(match_id=match_id).order_by('created_at', 'id')
+                    if archive is not None:
+                        rows = list(rows.values('id', 'match_id', 'user_id', 'message', 'created_at')[:batch_size])
+                        ids = [row['id'] for row in rows]
+                    else:
+                        ids = list(rows.values_list('id', flat=True)[:batch_size])
+                    if not ids:
+                        break
+                    count, _ = ChatMessage.objects.filter(id__in=ids).delete()
+
+                if archive is not None:
+                    # Solo tras el commit: el archivo tiene cada mensaje borrado una vez
+                    for row in rows:
+                        archive.write(json.dumps(row, cls=DjangoJSONEncoder) + '\n')
+                    archive.flush()
+
+                deleted += count
+                batches += 1
+                max_batch_ms = max(max_batch_ms, (time.monotonic() - batch_start) * 1000)
+                if len(ids) < batch_size:
+                    break
+                if pause:
+                    time.sleep(pause)
+
+        seconds = time.monotonic() - start
+        return {
+            'deleted': deleted,
+            'matches': len(match_ids),
+            'batches': batches,
+            'seconds': round(seconds, 3),
+            'rows_per_second': round(deleted / seconds, 1) if seconds and deleted else 0.0,
+            'max_batch_ms': round(max_batch_ms, 3),
+        }
+
+
+chat_retention = ChatRetention()
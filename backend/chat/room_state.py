@@ -0,0 +1,186 @@
+import threading
+import time
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from matches.models import MatchParticipant, OpenMatch
+from realtime.dispatcher import notification_dispatcher
+from realtime.groups import chat_group
+
+
+class RoomState:
+    """
+    Lo que necesita el chat de un partido para autorizar: hora de inicio, creador y
+    participantes.
+    """
+    __slots__ = ('start_time', 'creator_id', 'participant_ids')
+
+    def __init__(self, start_time, creator_id, participant_ids):
+        self.start_time = start_time
+        self.creator_id = creator_id
+        self.participant_ids = set(participant_ids)
+
+    def has_started(self) -> bool:
+        # Requisito: Los mensajes se borran luego de que inicia la hora del partido
+        return timezone.now() >= self.start_time
+
+    def is_member(self, user_id) -> bool:
+        return user_id == self.creator_id or user_id in self.participant_ids
+
+
+class RoomStateCache:
+    """
+    Caché en memoria del RoomState de cada partido, compartida por ChatConsumer,
+    ChatTopic y el historial REST: autorizar un mensaje o una lectura no consulta la
+    base de datos mientras la entrada esté viva.
+
+    Las entradas duran CHAT_ROOM_STATE_CACHE_TTL segundos. En este proceso se
+    actualizan al confirmarse cada alta o baja de participante (unirse, salir,
+    expulsión) y se descartan al cambiar o borrar el partido. Entre procesos:
+
+    - Alta: is_member() no rechaza a nadie solo por la caché; si el usuario no figura,
+      vuelve a leer la sala de la base de datos.
+    - Baja: se avisa a la sala de chat (chat_member_removed) y cada conexión la quita
+      de la caché de su proceso y cierra el chat del usuario dado de baja.
+
+    Los partidos inexistentes no se cachean.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._version = 0
+        self._lock = threading.Lock()
+
+    @property
+    def ttl(self) -> float:
+        return getattr(settings, 'CHAT_ROOM_STATE_CACHE_TTL', 30)
+
+    def get(self, match_id):
+        """
+        Returns:
+            RoomState: Estado de la sala, o None si el partido no existe.
+        """
+        key = str(match_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            version = self._version
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1]
+
+        state = self._load(key)
+        with self._lock:
+            # Si algo cambió durante la consulta, el resultado podría estar obsoleto
+            if state is not None and version == self._version:
+                self._entries[key] = (time.monotonic() + self.ttl, state)
+        return state
+
+    async def aget(self, match_id):
+        """
+        Versión para consumers de get(): solo sale del event loop si hay que consultar.
+        """
+        key = str(match_id)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1]
+        return await database_sync_to_async(self.get)(key)
+
+    def is_member(self, match_id, user_id) -> bool:
+        """
+        True si el usuario es creador o participante del partido. Si la caché dice que
+        no, se confirma contra la base de datos (el alta pudo llegar por otro proceso).
+        """
+        state = self.get(match_id)
+        if state is None:
+            return False
+        if state.is_member(user_id):
+            return True
+        self.evict(match_id)
+        state = self.get(match_id)
+        return state is not None and state.is_member(user_id)
+
+    async def ais_member(self, match_id, user_id) -> bool:
+        """
+        Versión para consumers de is_member(): solo sale del event loop si hay que consultar.
+        """
+        state = await self.aget(match_id)
+        if state is None:
+            return False
+        if state.is_member(user_id):
+            return True
+        return await database_sync_to_async(self.is_member)(match_id, user_id)
+
+    def add_participant(self, match_id, user_id):
+        with self._lock:
+            self._version += 1
+            entry = self._entries.get(str(match_id))
+            if entry is not None:
+                entry[1].participant_ids.add(user_id)
+
+    def discard_participant(self, match_id, user_id):
+        with self._lock:
+            self._version += 1
+            entry = self._entries.get(str(match_id))
+            if entry is not None:
+                entry[1].participant_ids.discard(user_id)
+
+    def evict(self, match_id):
+        with self._lock:
+            self._version += 1
+            self._entries.pop(str(match_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._version += 1
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _load(match_id):
+        if not match_id.isdigit():
+            return None
+        match = OpenMatch.objects.filter(id=match_id).values('start_time', 'creator_id').first()
+        if match is None:
+            return None
+        participant_ids = MatchParticipant.objects.filter(match_id=match_id).values_list('user_id', flat=True)
+        return RoomState(match['start_time'], match['creator_id'], participant_ids)
+
+
+room_state_cache = RoomStateCache()
+
+
+@receiver(post_save, sender=MatchParticipant)
+def cache_participant_joined(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: room_state_cache.add_participant(instance.match_id, instance.user_id))
+
+
+@receiver(post_delete, sender=MatchParticipant)
+def cache_participant_left(sender, instance, **kwargs):
+    # Salir del partido y ser expulsado borran la participación
+    def discard():
+        room_state_cache.discard_participant(instance.match_id, instance.user_id)
+        # Los demás procesos lo quitan de su caché al recibir el aviso (ver ChatConsumer)
+        notification_dispatcher.enqueue(chat_group(instance.match_id), {
+            'type': 'chat_member_removed',
+            'match_id': str(instance.match_id),
+            'user_id': instance.user_id,
+        })
+    transaction.on_commit(discard)
+
+
+@receiver(post_save, sender=OpenMatch)
+@receiver(post_delete, sender=OpenMatch)
+def evict_room_state(sender, instance, **kwargs):
+    """
+    Un cambio de horario o el borrado del partido invalida el estado de su sala.
+    """
+    room_state_cache.evict(instance.pk)
+    transaction.on_commit(lambda: room_state_cache.evict(instance.pk))
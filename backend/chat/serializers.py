@@ -6,5 +6,5 @@ class ChatMessageSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = ChatMessage
-        fields = ['id', 'match', 'user', 'username', 'message', 'created_at']
+        fields = ['id', 'uuid', 'match', 'user', 'username', 'message', 'created_at']
         read_only_fields = ['user']
@@ -1,3 +1,415 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+from datetime import timedelta
+from unittest import mock
+from urllib.parse import urlencode
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from django.db import DatabaseError
+from django.db.models import QuerySet
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.fields import DateTimeField
+from rest_framework.test import APITestCase
+
+from courts.models import Court
+from matches.models import MatchCategory, MatchParticipant, OpenMatch
+from realtime.dispatcher import notification_dispatcher
+from users.models import Role, User
+from .consumers import ChatConsumer, ChatTopic, send_chat_message
+from .models import ChatMessage
+from .retention import ChatRetention
+from .room_state import room_state_cache
+from .typing import TypingAggregator
+from .write_buffer import ChatWriteBuffer
+
+
+class ChatTestMixin:
+    def create_match(self):
+        role = Role.objects.create(name='cliente-test')
+        self.user = User.objects.create(username='jugador-test', role=role)
+        court = Court.objects.create(name='Cancha 1', price=50000)
+        category = MatchCategory.objects.create(name='Mixto-test')
+        start_time = timezone.now() + timedelta(days=1)
+        self.match = OpenMatch.objects.create(
+            court=court, creator=self.user, category=category,
+            start_time=start_time, end_time=start_time + timedelta(hours=1), players_needed=3,
+        )
+        MatchParticipant.objects.create(match=self.match, user=self.user)
+        room_state_cache.clear()
+
+
+class ChatHistoryPaginationTests(ChatTestMixin, APITestCase):
+    """
+    Historial del chat por cursor y puesta al día con since_id y since.
+    """
+
+    def setUp(self):
+        self.create_match()
+        self.client.force_authenticate(self.user)
+        base = timezone.now().replace(microsecond=0) - timedelta(minutes=10)
+        self.messages = [
+            ChatMessage.objects.create(
+                match=self.match, user=self.user, message=f'mensaje {number}',
+                created_at=base + timedelta(seconds=number, microseconds=123456),
+            )
+            for number in range(5)
+        ]
+
+    def _get(self, **params):
+        query = urlencode({'match_id': self.match.id, **params})
+        return self.client.get(f'/api/chat/messages/?{query}')
+
+    def _ids(self, response):
+        return [message['id'] for message in response.data['results']]
+
+    def test_without_paging_params_returns_full_list(self):
+        response = self._get()
+
+        self.assertEqual([message['id'] for message in response.data], [m.id for m in self.messages])
+
+    def test_cursor_pages_are_contiguous(self):
+        ids = []
+        response = self._get(page_size=2)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            ids.extend(self._ids(response))
+            if not response.data['next_cursor']:
+                break
+            response = self._get(page_size=2, cursor=response.data['next_cursor'])
+
+        self.assertEqual(ids, [message.id for message in self.messages])
+
+    def test_since_id_returns_only_later_messages(self):
+        response = self._get(since_id=self.messages[2].id)
+
+        self.assertEqual(self._ids(response), [message.id for message in self.messages[3:]])
+
+    def test_since_accepts_the_socket_created_at(self):
+        created_at = DateTimeField().to_representation(self.messages[1].created_at)
+
+        response = self._get(since=created_at)
+
+        self.assertEqual(self._ids(response), [message.id for message in self.messages[2:]])
+
+    def test_since_with_unencoded_plus_offset(self):
+        created_at = self.messages[1].created_at.astimezone(timezone.get_fixed_timezone(60)).isoformat()
+        self.assertIn('+01:00', created_at)
+
+        # Sin codificar, el '+' del desfase llega como espacio
+        response = self.client.get(f'/api/chat/messages/?match_id={self.match.id}&since={created_at}')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._ids(response), [message.id for message in self.messages[2:]])
+
+    def test_malformed_since_is_a_bad_request(self):
+        self.assertEqual(self._get(since='ayer').status_code, 400)
+        self.assertEqual(self._get(since_id='abc').status_code, 400)
+
+    def test_invalid_cursor_and_unknown_since_id_are_not_found(self):
+        self.assertEqual(self._get(cursor='no-es-un-cursor').status_code, 404)
+        self.assertEqual(self._get(since_id=999999).status_code, 404)
+
+
+class ChatWriteBufferTests(ChatTestMixin, TransactionTestCase):
+    """
+    Los mensajes se guardan al llenarse el lote, al vencer el temporizador o, si el lote
+    falla, uno a uno.
+    """
+
+    def setUp(self):
+        self.create_match()
+        self.buffer = ChatWriteBuffer()
+
+    def _message(self, text, **fields):
+        return ChatMessage(match=self.match, user=self.user, message=text, **fields)
+
+    async def _wait_for_saved(self, expected, timeout=2.0):
+        count = database_sync_to_async(ChatMessage.objects.count)
+        deadline = asyncio.get_running_loop().time() + timeout
+        while await count() < expected and asyncio.get_running_loop().time() < deadline:
+            await asyncio.sleep(0.01)
+        return await count()
+
+    @override_settings(CHAT_WRITE_BUFFER_MAX_MESSAGES=3, CHAT_WRITE_BUFFER_FLUSH_MS=60000)
+    async def test_full_batch_is_flushed_at_once(self):
+        self.buffer.add(self._message('uno'))
+        self.buffer.add(self._message('dos'))
+        await asyncio.sleep(0.05)
+        self.assertEqual(await database_sync_to_async(ChatMessage.objects.count)(), 0)
+
+        self.buffer.add(self._message('tres'))
+
+        self.assertEqual(await self._wait_for_saved(3), 3)
+        self.assertEqual(len(self.buffer), 0)
+
+    @override_settings(CHAT_WRITE_BUFFER_MAX_MESSAGES=50, CHAT_WRITE_BUFFER_FLUSH_MS=20)
+    async def test_timer_flushes_a_partial_batch(self):
+        self.buffer.add(self._message('uno'))
+
+        self.assertEqual(await self._wait_for_saved(1), 1)
+        self.assertEqual(len(self.buffer), 0)
+
+    @override_settings(CHAT_WRITE_BUFFER_FLUSH_MS=60000)
+    async def test_broadcast_frame_carries_the_saved_uuid(self):
+        layer = mock.Mock(group_send=mock.AsyncMock())
+        with mock.patch('chat.consumers.chat_write_buffer', self.buffer):
+            await send_chat_message(layer, self.user, self.match.id, 'Hola')
+
+        frame = layer.group_send.await_args_list[0].args[1]
+        self.assertIsNone(frame['id'])
+        await self.buffer.flush()
+        saved = await database_sync_to_async(ChatMessage.objects.get)()
+        self.assertEqual(frame['uuid'], str(saved.uuid))
+
+    def test_sigterm_flushes_then_runs_the_previous_handler(self):
+        previous = mock.Mock()
+        with mock.patch('chat.write_buffer.signal.getsignal', return_value=previous), \
+                mock.patch('chat.write_buffer.signal.signal') as set_signal:
+            self.buffer.install_sigterm_handler()
+        signum, handler = set_signal.call_args.args
+        self.buffer._pending.append(self._message('uno'))
+
+        handler(signum, None)
+
+        self.assertEqual(ChatMessage.objects.count(), 1)
+        previous.assert_called_once_with(signum, None)
+
+    def test_failed_batch_is_saved_one_by_one(self):
+        # Sin autor: viola NOT NULL y hace fallar el bulk_create
+        orphan = ChatMessage(match=self.match, user_id=None, message='sin autor')
+        batch = [self._message('uno'), orphan, self._message('tres')]
+
+        with self.assertLogs('chat.write_buffer', 'WARNING'):
+            saved = self.buffer._save(batch)
+
+        self.assertEqual(saved, 2)
+        self.assertEqual(
+            list(ChatMessage.objects.order_by('id').values_list('message', flat=True)), ['uno', 'tres']
+        )
+
+
+class RoomStateCacheTests(ChatTestMixin, TestCase):
+    """
+    La caché de la sala sigue las altas y bajas confirmadas y no rechaza a un
+    participante que se unió desde otro proceso.
+    """
+
+    def setUp(self):
+        self.create_match()
+        self.player = User.objects.create(username='otro-jugador', role=self.user.role)
+        dispatcher = mock.patch.object(notification_dispatcher, 'enqueue')
+        self.enqueue = dispatcher.start()
+        self.addCleanup(dispatcher.stop)
+
+    def test_cached_member_does_not_query(self):
+        room_state_cache.get(self.match.id)
+
+        with self.assertNumQueries(0):
+            self.assertTrue(room_state_cache.is_member(self.match.id, self.user.id))
+
+    def test_join_from_another_process_is_confirmed_in_the_database(self):
+        room_state_cache.get(self.match.id)
+        # Sin ejecutar los on_commit: la caché de este proceso no se entera del alta
+        MatchParticipant.objects.create(match=self.match, user=self.player)
+
+        self.assertTrue(room_state_cache.is_member(self.match.id, self.player.id))
+        self.assertIn(self.player.id, room_state_cache.get(self.match.id).participant_ids)
+
+    def test_non_member_is_rejected(self):
+        self.assertFalse(room_state_cache.is_member(self.match.id, self.player.id))
+        self.assertFalse(room_state_cache.is_member(999999, self.user.id))
+
+    def test_join_and_leave_update_the_cache_on_commit(self):
+        state = room_state_cache.get(self.match.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            participant = MatchParticipant.objects.create(match=self.match, user=self.player)
+            self.assertNotIn(self.player.id, state.participant_ids)
+        self.assertIn(self.player.id, state.participant_ids)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            participant.delete()
+        self.assertNotIn(self.player.id, state.participant_ids)
+        self.enqueue.assert_called_once_with(f'chat_{self.match.id}', {
+            'type': 'chat_member_removed', 'match_id': str(self.match.id), 'user_id': self.player.id,
+        })
+
+    def test_match_change_evicts_the_room(self):
+        room_state_cache.get(self.match.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.match.save()
+
+        self.assertEqual(len(room_state_cache), 0)
+
+    def test_removal_notice_closes_the_removed_user_chat(self):
+        state = room_state_cache.get(self.match.id)
+        consumer = ChatConsumer()
+        consumer.user = self.user
+        consumer.close = mock.AsyncMock()
+        event = {'type': 'chat_member_removed', 'match_id': str(self.match.id), 'user_id': self.user.id}
+
+        async_to_sync(consumer.chat_member_removed)({**event, 'user_id': self.player.id})
+        consumer.close.assert_not_awaited()
+
+        # Baja confirmada en otro proceso: este la aplica al recibir el aviso
+        state.participant_ids.add(self.player.id)
+        async_to_sync(consumer.chat_member_removed)({**event, 'user_id': self.player.id})
+        self.assertNotIn(self.player.id, state.participant_ids)
+
+        async_to_sync(consumer.chat_member_removed)(event)
+        consumer.close.assert_awaited_once_with(code=4003)
+
+    def test_removal_notice_ends_the_chat_topic(self):
+        consumer = mock.Mock(scope={'user': self.user}, remove_topic=mock.AsyncMock(), send_control=mock.AsyncMock())
+        topic = ChatTopic(consumer, {'match_id': self.match.id})
+
+        async_to_sync(topic.handle_control)(
+            {'type': 'chat_member_removed', 'match_id': str(self.match.id), 'user_id': self.user.id}
+        )
+
+        consumer.remove_topic.assert_awaited_once_with(topic)
+        consumer.send_control.assert_awaited_once_with(
+            'error', f'chat:{self.match.id}', code=4003, message='No participas en este partido.'
+        )
+
+
+class RecordingChannelLayer:
+    def __init__(self):
+        self.sent = []
+
+    async def group_send(self, group, message):
+        self.sent.append((group, message['changes']))
+
+
+@override_settings(CHAT_TYPING_INTERVAL_MS=50)
+class TypingAggregatorTests(SimpleTestCase):
+    """
+    Cada sala emite al momento el primer cambio y agrupa los siguientes por intervalo;
+    los pares empezar/parar de la ventana no salen y la sala se libera sin escritores.
+    """
+
+    def setUp(self):
+        self.aggregator = TypingAggregator()
+        self.layer = RecordingChannelLayer()
+
+    def _run(self, scenario):
+        async_to_sync(scenario)()
+
+    async def _update(self, username, is_typing):
+        await self.aggregator.update(self.layer, 7, username, is_typing)
+
+    async def _wait_window(self):
+        await asyncio.sleep(0.15)
+
+    def test_first_change_is_immediate_and_later_ones_are_batched(self):
+        async def scenario():
+            await self._update('ana', True)
+            self.assertEqual(self.layer.sent, [('chat_7', [{'username': 'ana', 'is_typing': True}])])
+
+            await self._update('luis', True)
+            await self._update('luis', True)
+            await self._update('eva', True)
+            self.assertEqual(len(self.layer.sent), 1)
+
+            await self._wait_window()
+            self.assertEqual(self.layer.sent[1], ('chat_7', [
+                {'username': 'luis', 'is_typing': True}, {'username': 'eva', 'is_typing': True},
+            ]))
+
+        self._run(scenario)
+
+    def test_start_stop_pairs_inside_the_window_are_not_sent(self):
+        async def scenario():
+            await self._update('ana', True)
+            await self._update('luis', True)
+            await self._update('luis', False)
+            await self._update('ana', False)
+            await self._update('ana', True)
+
+            await self._wait_window()
+            self.assertEqual(len(self.layer.sent), 1)
+
+        self._run(scenario)
+
+    def test_clear_on_send_drops_the_user_without_a_stop_message(self):
+        async def scenario():
+            await self._update('ana', True)
+            await self._update('luis', True)
+            self.aggregator.clear(7, 'ana')
+            self.aggregator.clear(7, 'luis')
+            # El frontend manda is_typing false tras enviar: ya no es un cambio
+            await self._update('ana', False)
+
+            await self._wait_window()
+            self.assertEqual(len(self.layer.sent), 1)
+
+        self._run(scenario)
+
+    def test_room_is_freed_when_nobody_is_typing(self):
+        async def scenario():
+            await self._update('ana', True)
+            await self._update('ana', False)
+            # Una ventana para emitir la parada y otra para liberar la sala
+            await self._wait_window()
+            await self._wait_window()
+
+            self.assertEqual(self.layer.sent[-1], ('chat_7', [{'username': 'ana', 'is_typing': False}]))
+            self.assertEqual(self.aggregator._rooms, {})
+
+        self._run(scenario)
+
+
+class ChatRetentionTests(ChatTestMixin, TestCase):
+    """
+    La purga borra los mensajes de los partidos empezados, deja los futuros y archiva
+    cada mensaje borrado una sola vez.
+    """
+
+    def setUp(self):
+        self.create_match()
+        start_time = timezone.now() - timedelta(hours=1)
+        self.started = OpenMatch.objects.create(
+            court=self.match.court, creator=self.user, category=self.match.category,
+            start_time=start_time, end_time=start_time + timedelta(hours=1), players_needed=3,
+        )
+        self.old_messages = [
+            ChatMessage.objects.create(match=self.started, user=self.user, message=f'viejo {number}')
+            for number in range(5)
+        ]
+        self.future_message = ChatMessage.objects.create(match=self.match, user=self.user, message='futuro')
+        self.retention = ChatRetention()
+
+    def test_purges_started_matches_and_keeps_future_ones(self):
+        result = self.retention.purge(batch_size=2)
+
+        self.assertEqual((result['deleted'], result['matches'], result['batches']), (5, 1, 3))
+        self.assertEqual(list(ChatMessage.objects.values_list('id', flat=True)), [self.future_message.id])
+
+    def test_grace_keeps_recently_started_matches(self):
+        result = self.retention.purge(grace=timedelta(hours=2))
+
+        self.assertEqual(result['deleted'], 0)
+        self.assertEqual(ChatMessage.objects.count(), 6)
+
+    def test_archive_has_each_deleted_message_once(self):
+        archive = io.StringIO()
+
+        self.retention.purge(batch_size=2, archive=archive)
+
+        archived = [json.loads(line) for line in archive.getvalue().splitlines()]
+        self.assertEqual([row['id'] for row in archived], [message.id for message in self.old_messages])
+        self.assertEqual(archived[0]['message'], 'viejo 0')
+
+    def test_failed_delete_archives_nothing(self):
+        archive = io.StringIO()
+
+        with mock.patch.object(QuerySet, 'delete', side_effect=DatabaseError('bloqueo')):
+            with self.assertRaises(DatabaseError):
+                self.retention.purge(archive=archive)
+
+        self.assertEqual(archive.getvalue(), '')
+        self.assertEqual(ChatMessage.objects.count(), 6)
@@ -0,0 +1,113 @@
+import asyncio
+import time
+
+from django.conf import settings
+
+from realtime.groups import chat_group
+
+
+class TypingAggregator:
+    """
+    Agrega los avisos de 'escribiendo...' de cada sala antes de difundirlos.
+
+    El frontend manda {'type': 'typing', 'is_typing': true} en cada pulsación. Aquí solo
+    se guarda el último estado de cada usuario y cada sala emite como mucho un mensaje
+    typing_state por CHAT_TYPING_INTERVAL_MS con los usuarios que cambiaron de estado:
+    las pulsaciones repetidas y los pares empezar/parar dentro de la ventana no salen
+    del proceso. El primer cambio tras una ventana sin emisiones sale al momento. Una
+    sala en la que ya nadie escribe se libera una ventana después de su último mensaje.
+
+    El estado es del proceso (del event loop de los consumers): con varios workers cada
+    uno agrega los usuarios conectados a él.
+    """
+
+    def __init__(self):
+        self._rooms = {}
+
+    @property
+    def interval(self) -> float:
+        return getattr(settings, 'CHAT_TYPING_INTERVAL_MS', 1000) / 1000
+
+    async def update(self, channel_layer, match_id, username, is_typing):
+        """
+        Registra el estado de escritura de un usuario en una sala.
+        """
+        room = self._room(match_id)
+        room['channel_layer'] = channel_layer
+        room['pending'][username] = bool(is_typing)
+
+        loop = asyncio.get_running_loop()
+        if room['timer'] is not None and room['timer_loop'] is loop:
+            return
+        delay = room['last_emit'] + self.interval - time.monotonic()
+        if delay <= 0:
+            await self.flush(match_id)
+        else:
+            self._schedule(room, match_id, delay)
+
+    def clear(self, match_id, username):
+        """
+        El usuario envió su mensaje: los clientes ya dejan de mostrarlo escribiendo.
+        """
+        room = self._rooms.get(str(match_id))
+        if room is not None:
+            room['pending'].pop(username, None)
+            room['typing'].discard(username)
+
+    async def flush(self, match_id):
+        """
+        Difunde los cambios de estado pendientes de una sala en un único mensaje.
+        """
+        key = str(match_id)
+        room = self._rooms.get(key)
+        if room is None:
+            return
+        if room['timer'] is not None:
+            room['timer'].cancel()
+            room['timer'] = None
+
+        changes = []
+        for username, is_typing in room['pending'].items():
+            if is_typing == (username in room['typing']):
+                continue
+            changes.append({'username': username, 'is_typing': is_typing})
+            if is_typing:
+                room['typing'].add(username)
+            else:
+                room['typing'].discard(username)
+        room['pending'] = {}
+
+        if not changes:
+            if not room['typing']:
+                del self._rooms[key]
+            return
+        room['last_emit'] = time.monotonic()
+        if not room['typing']:
+            # Nadie escribe: si no llega nada más en la ventana, el próximo volcado libera la sala
+            self._schedule(room, match_id, self.interval)
+        await room['channel_layer'].group_send(
+            chat_group(key),
+            {
+                'type': 'typing_state',
+                'match_id': key,
+                'changes': changes
+            }
+        )
+
+    def _schedule(self, room, match_id, delay):
+        loop = asyncio.get_running_loop()
+        room['timer_loop'] = loop
+        room['timer'] = loop.call_later(delay, lambda: loop.create_task(self.flush(match_id)))
+
+    def _room(self, match_id):
+        key = str(match_id)
+        room = self._rooms.get(key)
+        if room is None:
+            room = self._rooms[key] = {
+                'pending': {}, 'typing': set(), 'last_emit': 0.0,
+                'timer': None, 'timer_loop': None, 'channel_layer': None,
+            }
+        return room
+
+
+typing_aggregator = TypingAggregator()
@@ -1,47 +1,43 @@
 from rest_framework import viewsets, permissions
 from .models import ChatMessage
+from .pagination import ChatKeysetPagination
 from .serializers import ChatMessageSerializer
-from matches.models import OpenMatch, MatchParticipant
-from django.utils import timezone
+from .room_state import room_state_cache
 
 class ChatMessageViewSet(viewsets.ReadOnlyModelViewSet):
     """
     Vista para leer el historial de mensajes de un partido.
     Solo accesible para participantes y antes de que el partido comience.
+
+    Paginado por cursor con ?page_size=, ?cursor=, ?since_id= o ?since= (ver
+    ChatKeysetPagination); sin ellos devuelve el historial completo.
     """
     serializer_class = ChatMessageSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = ChatKeysetPagination
 
     def get_queryset(self):
         match_id = self.request.query_params.get('match_id')
         if not match_id:
             return ChatMessage.objects.none()
 
-        try:
-            match = OpenMatch.objects.get(id=match_id)
-            
-            # Verificar si el usuario es participante o creador
-            is_participant = MatchParticipant.objects.filter(match=match, user=self.request.user).exists()
-            is_creator = match.creator == self.request.user
-            
-            if not (is_participant or is_creator):
-                return ChatMessage.objects.none()
-
-            # Lógica de "cerrado": 
-            # Si el partido ya comenzó, el frontend lo ve como cerrado, pero el backend
-            # permite leer los mensajes antiguos o vacía el historial?
-            # Según requerimiento original: "los mensajes se borrar luego de que inicia la hora del partido"
-            # Si permitimos ver el historial después de la hora del partido, el chat no parecería cerrado.
-            # Pero si vaciamos el queryset, el frontend mostrará "Chat cerrado".
-            
-            if timezone.now() >= match.start_time:
-                # Comentar esta línea temporalmente para depuración si es necesario, 
-                # pero es lo que pide el requerimiento.
-                return ChatMessage.objects.none()
-
-            return ChatMessage.objects.filter(match=match).order_by('created_at')
-
-        except OpenMatch.DoesNotExist:
+        # Autorización desde la caché de la sala (la misma que usa el consumer)
+        state = room_state_cache.get(match_id)
+        if state is None:
+            return ChatMessage.objects.none()
+
+        # Verificar si el usuario es participante o creador
+        if not room_state_cache.is_member(match_id, self.request.user.id):
             return ChatMessage.objects.none()
-        except Exception as e:
+
+        # Lógica de "cerrado": 
+        # Si el partido ya comenzó, el frontend lo ve como cerrado, pero el backend
+        # permite leer los mensajes antiguos o vacía el historial?
+        # Según requerimiento original: "los mensajes se borrar luego de que inicia la hora del partido"
+        # Si permitimos ver el historial después de la hora del partido, el chat no parecería cerrado.
+        # Pero si vaciamos el queryset, el frontend mostrará "Chat cerrado".
+
+        if state.has_started():
             return ChatMessage.objects.none()
+
+        return ChatMessage.objects.filter(match_id=match_id).select_related('user').order_by('created_at', 'id')
@@ -0,0 +1,150 @@
+import asyncio
+import atexit
+import logging
+import os
+import signal
+import threading
+import weakref
+from typing import List
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections
+
+from .models import ChatMessage
+
+logger = logging.getLogger(__name__)
+
+
+class ChatWriteBuffer:
+    """
+    Buffer de escritura diferida de los mensajes de chat del proceso.
+
+    Los consumers difunden cada mensaje en cuanto llega y lo dejan aquí; se guardan con
+    un único bulk_create cada CHAT_WRITE_BUFFER_FLUSH_MS milisegundos o al juntarse
+    CHAT_WRITE_BUFFER_MAX_MESSAGES, lo que ocurra antes. Los consumers de chat vacían el
+    buffer al desconectarse y lo pendiente al parar el proceso se guarda en atexit o al
+    recibir SIGTERM (ver install_sigterm_handler). Una caída abrupta (ej. SIGKILL) pierde
+    los mensajes de la ventana en curso, aunque ya se hayan difundido.
+
+    Si el lote falla (ej. se borró el partido) se reintenta mensaje a mensaje para no
+    perder el resto.
+    """
+
+    def __init__(self):
+        self._pending: List[ChatMessage] = []
+        self._lock = threading.Lock()
+        self._flush_locks = weakref.WeakKeyDictionary()
+        self._timer = None
+        self._timer_loop = None
+
+    @property
+    def flush_ms(self) -> int:
+        return getattr(settings, 'CHAT_WRITE_BUFFER_FLUSH_MS', 500)
+
+    @property
+    def max_messages(self) -> int:
+        return getattr(settings, 'CHAT_WRITE_BUFFER_MAX_MESSAGES', 50)
+
+    def add(self, message: ChatMessage) -> None:
+        """
+        Encola un mensaje sin guardar. Debe llamarse desde el event loop del consumer.
+        """
+        with self._lock:
+            self._pending.append(message)
+            size = len(self._pending)
+
+        loop = asyncio.get_running_loop()
+        if size >= self.max_messages or self.flush_ms <= 0:
+            loop.create_task(self.flush())
+        elif self._timer is None or self._timer_loop is not loop:
+            # Un temporizador de un loop ya cerrado (ej. tests) nunca llegaría a vencer
+            self._timer_loop = loop
+            self._timer = loop.call_later(self.flush_ms / 1000, lambda: loop.create_task(self.flush()))
+
+    async def flush(self) -> int:
+        """
+        Guarda los mensajes pendientes.
+
+        Returns:
+            int: Mensajes guardados.
+        """
+        loop = asyncio.get_running_loop()
+        flush_lock = self._flush_locks.get(loop)
+        if flush_lock is None:
+            flush_lock = self._flush_locks[loop] = asyncio.Lock()
+        # Un único volcado a la vez: los lotes se guardan en el orden en que llegaron
+        async with flush_lock:
+            batch = self._take()
+            if not batch:
+                return 0
+            return await database_sync_to_async(self._save)(batch)
+
+    def flush_sync(self) -> int:
+        """
+        Versión síncrona de flush() para el apagado del proceso.
+        """
+        batch = self._take()
+        if not batch:
+            return 0
+        close_old_connections()
+        return self._save(batch)
+
+    def install_sigterm_handler(self) -> None:
+        """
+        Guarda lo pendiente al recibir SIGTERM y después aplica el manejador anterior.
+
+        Solo puede instalarse desde el hilo principal. Los servidores ASGI que instalan
+        su propio manejador después lo sustituyen, pero al cerrarse ordenadamente el
+        volcado de atexit sigue ejecutándose.
+        """
+        if threading.current_thread() is not threading.main_thread():
+            return
+        previous = signal.getsignal(signal.SIGTERM)
+
+        def handle_sigterm(signum, frame):
+            # En un hilo aparte: el ORM no puede usarse síncronamente desde el hilo del event loop
+            flusher = threading.Thread(target=self.flush_sync, name='chat-write-buffer-flush')
+            flusher.start()
+            flusher.join(timeout=10)
+            if callable(previous):
+                previous(signum, frame)
+            elif previous == signal.SIG_DFL:
+                signal.signal(signum, signal.SIG_DFL)
+                os.kill(os.getpid(), signum)
+
+        signal.signal(signal.SIGTERM, handle_sigterm)
+
+    def __len__(self):
+        return len(self._pending)
+
+    def _take(self) -> List[ChatMessage]:
+        with self._lock:
+            batch, self._pending = self._pending, []
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        return batch
+
+    def _save(self, batch: List[ChatMessage]) -> int:
+        try:
+            ChatMessage.objects.bulk_create(batch)
+            return len(batch)
+        except DatabaseError:
+            logger.warning('Falló el guardado en bloque de %s mensajes de chat; se reintenta uno a uno.', len(batch))
+
+        saved = 0
+        for message in batch:
+            try:
+                message.save()
+                saved += 1
+            except DatabaseError:
+                logger.exception('No se pudo guardar el mensaje de chat del partido %s.', message.match_id)
+        return saved
+
+
+chat_write_buffer = ChatWriteBuffer()
+
+atexit.register(chat_write_buffer.flush_sync)
+# Un SIGTERM sin manejador propio del servidor termina el proceso sin pasar por atexit
+chat_write_buffer.install_sigterm_handler()
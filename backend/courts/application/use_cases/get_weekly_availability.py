@@ -6,16 +6,19 @@ class GetWeeklyAvailabilityUseCase:
     """
     Caso de uso para obtener la disponibilidad semanal de una cancha específica.
     """
-    def __init__(self, court_repository):
+    def __init__(self, court_repository, availability_cache=None):
         """
         Inicializa el caso de uso con un repositorio de canchas.
 
         Args:
             court_repository: El repositorio de canchas que implementa la interfaz CourtRepository.
+            availability_cache: Caché opcional con el método aget_or_compute
+                (ver WeeklyAvailabilityCache). Si es None, siempre se consulta el repositorio.
         """
         self.court_repository = court_repository
+        self.availability_cache = availability_cache
 
-    async def execute(self, court_id: int, start_date: datetime, end_date: datetime):
+    async def execute(self, court_id: int, start_date: datetime, end_date: datetime, as_bitmap: bool = False):
         """
         Ejecuta el caso de uso para obtener la disponibilidad semanal.
 
@@ -23,17 +26,31 @@ class GetWeeklyAvailabilityUseCase:
             court_id (int): El ID de la cancha.
             start_date (datetime): La fecha y hora de inicio del rango semanal.
             end_date (datetime): La fecha y hora de fin del rango semanal.
+            as_bitmap (bool): Si es True, devuelve la ocupación compacta (un bitmap por día)
+                en lugar del diccionario hora por hora.
 
         Returns:
             dict: Un diccionario que representa la disponibilidad semanal de la cancha.
                   Ejemplo: { 'YYYY-MM-DD': { hour: boolean, ... }, ... }
+                  Con as_bitmap: { 'YYYY-MM-DD': bitmap, ... }
         """
         # La lógica para obtener la disponibilidad detallada por hora y día
         # se delegará al repositorio.
-        try:
-            weekly_availability = await self.court_repository.get_weekly_availability(
+        async def compute():
+            if as_bitmap:
+                return await self.court_repository.get_weekly_occupancy(
+                    court_id, start_date, end_date
+                )
+            return await self.court_repository.get_weekly_availability(
                 court_id, start_date, end_date
             )
+
+        try:
+            if self.availability_cache is None:
+                return await compute()
+            weekly_availability = await self.availability_cache.aget_or_compute(
+                court_id, start_date, end_date, 'bitmap' if as_bitmap else 'hours', compute
+            )
             return weekly_availability
         except Exception as e:
             print(f"Error en GetWeeklyAvailabilityUseCase: {e}")
@@ -1,5 +1,6 @@
 from abc import ABC, abstractmethod
 from typing import List, Optional, Dict, Any
+from datetime import datetime
 from ...models import Court # Asumiendo que Court está en backend/courts/models.py
 
 class ICourtRepository(ABC):
@@ -54,5 +55,19 @@ class ICourtRepository(ABC):
         """
         pass
 
-    # Podríamos añadir un método para get_weekly_availability si el backend lo soporta directamente.
-    # Por ahora, la lógica de get_weekly_availability en el frontend hace múltiples llamadas a check_availability.
+    @abstractmethod
+    async def get_weekly_availability(self, court_id: int, start_date: datetime, end_date: datetime) -> Dict[str, Dict[int, bool]]:
+        """
+        Obtiene la disponibilidad hora por hora (6 AM a 11 PM) de una cancha en un rango semanal.
+        Ejemplo: { 'YYYY-MM-DD': { hour: boolean, ... }, ... }
+        """
+        pass
+
+    @abstractmethod
+    async def get_weekly_occupancy(self, court_id: int, start_date: datetime, end_date: datetime) -> Dict[str, int]:
+        """
+        Obtiene la ocupación de una cancha en un rango semanal como un bitmap por día.
+        El bit i de cada bitmap indica que la hora 6 + i está ocupada.
+        Ejemplo: { 'YYYY-MM-DD': 0b11, ... }
+        """
+        pass
@@ -0,0 +1,81 @@
+"""
+Representación compacta de la ocupación diaria de una cancha.
+
+Cada día se codifica como un entero de 18 bits, uno por franja horaria
+de 6 AM a 11 PM (horas 6..23). El bit ``i`` corresponde a la hora
+``FIRST_HOUR + i`` y vale 1 cuando la franja está ocupada.
+"""
+
+from datetime import datetime, timedelta
+from typing import Dict
+
+FIRST_HOUR = 6  # Primera franja visible del calendario (6 AM)
+LAST_HOUR = 23  # Última franja visible del calendario (11 PM)
+SLOTS_PER_DAY = LAST_HOUR - FIRST_HOUR + 1
+FULL_DAY_MASK = (1 << SLOTS_PER_DAY) - 1
+
+
+def hour_range_mask(start_hour: int, end_hour: int) -> int:
+    """
+    Construye la máscara de las horas [start_hour, end_hour) recortada a la ventana 6..23.
+
+    Args:
+        start_hour (int): Hora de inicio (inclusiva), 0..24.
+        end_hour (int): Hora de fin (exclusiva), 0..24.
+
+    Returns:
+        int: Máscara de bits con las franjas del rango encendidas.
+    """
+    lo = max(start_hour, FIRST_HOUR)
+    hi = min(end_hour, LAST_HOUR + 1)
+    if hi <= lo:
+        return 0
+    return ((1 << (hi - lo)) - 1) << (lo - FIRST_HOUR)
+
+
+def mark_interval(occupancy: Dict[str, int], start_local: datetime, end_local: datetime) -> None:
+    """
+    Marca como ocupadas, en bloque, todas las franjas que toca el intervalo [start_local, end_local).
+
+    Una hora se considera ocupada si el intervalo la cubre total o parcialmente
+    (una reserva de 10:01 a 11:01 ocupa las franjas de las 10 y de las 11).
+
+    Args:
+        occupancy (dict): Bitmaps por fecha ('YYYY-MM-DD' -> int). Solo se actualizan
+            las fechas que ya existen en el diccionario.
+        start_local (datetime): Inicio del intervalo en hora local.
+        end_local (datetime): Fin del intervalo en hora local.
+    """
+    first_hour_dt = start_local.replace(minute=0, second=0, microsecond=0)
+    last_hour_dt = end_local.replace(minute=0, second=0, microsecond=0)
+    if last_hour_dt < end_local:
+        last_hour_dt += timedelta(hours=1)
+    if last_hour_dt <= first_hour_dt:
+        return
+
+    current_day = first_hour_dt.date()
+    last_day = last_hour_dt.date()
+    while current_day <= last_day:
+        start_hour = first_hour_dt.hour if current_day == first_hour_dt.date() else 0
+        end_hour = last_hour_dt.hour if current_day == last_day else 24
+
+        date_str = current_day.isoformat()
+        if date_str in occupancy:
+            occupancy[date_str] |= hour_range_mask(start_hour, end_hour)
+        current_day += timedelta(days=1)
+
+
+def bitmap_to_hours(bitmap: int) -> Dict[int, bool]:
+    """
+    Expande un bitmap de ocupación al formato hora -> disponible.
+
+    Args:
+        bitmap (int): Bitmap de ocupación del día.
+
+    Returns:
+        dict: Diccionario {hora: bool} con True si la franja está libre.
+    """
+    return {
+        FIRST_HOUR + slot: not (bitmap >> slot) & 1
+        for slot in range(SLOTS_PER_DAY)
+    }
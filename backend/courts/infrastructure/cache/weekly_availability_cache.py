@@ -0,0 +1,162 @@
+import time
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+
+
+class WeeklyAvailabilityCache:
+    """
+    Caché de la disponibilidad semanal de las canchas, con invalidación por (cancha, semana).
+
+    Cada semana ISO de cada cancha tiene un número de versión guardado en la caché.
+    La clave de una entrada incluye las versiones de todas las semanas que cubre su rango,
+    de modo que invalidar una semana (incrementar su versión) deja inaccesibles, sin
+    borrarlas una a una, todas las entradas que la incluían. Las entradas huérfanas
+    expiran por su timeout.
+
+    El backend es el alias configurado en settings.CACHES (LocMemCache en desarrollo).
+    """
+    KEY_PREFIX = 'weekly_availability'
+    # Rangos más largos que esto no se cachean (no corresponden al calendario semanal)
+    MAX_CACHED_WEEKS = 6
+
+    def __init__(self, cache_alias: str = 'default'):
+        self.cache_alias = cache_alias
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    @property
+    def timeout(self) -> int:
+        return getattr(settings, 'WEEKLY_AVAILABILITY_CACHE_TIMEOUT', 3600)
+
+    def _weeks(self, start: datetime, end: datetime) -> List[Tuple[int, int]]:
+        """
+        Devuelve las semanas ISO (año, semana), en hora local, que toca el rango [start, end].
+        """
+        start_date = timezone.localtime(start).date()
+        last_date = timezone.localtime(end).date()
+        weeks = []
+        monday = start_date - timedelta(days=start_date.weekday())
+        while monday <= last_date:
+            iso_year, iso_week, _ = monday.isocalendar()
+            weeks.append((iso_year, iso_week))
+            monday += timedelta(days=7)
+        return weeks
+
+    def _version_key(self, court_id: int, week: Tuple[int, int]) -> str:
+        return f'{self.KEY_PREFIX}:version:{court_id}:{week[0]}-W{week[1]:02d}'
+
+    def _stats_key(self, name: str) -> str:
+        return f'{self.KEY_PREFIX}:stats:{name}'
+
+    async def _acount(self, name: str) -> None:
+        key = self._stats_key(name)
+        await self.cache.aadd(key, 0, None)
+        try:
+            await self.cache.aincr(key)
+        except ValueError:
+            # La clave fue desalojada entre add e incr; se pierde una muestra
+            pass
+
+    async def _aversions(self, version_keys: List[str]) -> Dict[str, Any]:
+        versions = await self.cache.aget_many(version_keys)
+        missing = [key for key in version_keys if key not in versions]
+        if missing:
+            # Versión inicial basada en el reloj: si una versión se desaloja y se recrea,
+            # nunca coincidirá con la de entradas antiguas que aún sigan en la caché.
+            for key in missing:
+                await self.cache.aadd(key, time.time_ns(), None)
+            versions.update(await self.cache.aget_many(missing))
+        return versions
+
+    async def aget_or_compute(
+        self,
+        court_id: int,
+        start_date: datetime,
+        end_date: datetime,
+        variant: str,
+        compute: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        """
+        Devuelve la disponibilidad cacheada para el rango o la calcula y la guarda.
+
+        Args:
+            court_id (int): El ID de la cancha.
+            start_date (datetime): Inicio del rango solicitado.
+            end_date (datetime): Fin del rango solicitado.
+            variant (str): Representación solicitada (ej. 'hours' o 'bitmap').
+            compute (callable): Corrutina sin argumentos que calcula el valor en caso de fallo.
+
+        Returns:
+            Any: El valor cacheado o recién calculado.
+        """
+        weeks = self._weeks(start_date, end_date)
+        if len(weeks) > self.MAX_CACHED_WEEKS:
+            return await compute()
+
+        version_keys = [self._version_key(court_id, week) for week in weeks]
+        versions = await self._aversions(version_keys)
+        version_tag = '.'.join(str(versions.get(key, 0)) for key in version_keys)
+        key = (
+            f'{self.KEY_PREFIX}:{court_id}:{start_date.isoformat()}:'
+            f'{end_date.isoformat()}:{variant}:{version_tag}'
+        )
+
+        cached = await self.cache.aget(key)
+        if cached is not None:
+            await self._acount('hits')
+            return cached
+
+        await self._acount('misses')
+        value = await compute()
+        await self.cache.aset(key, value, self.timeout)
+        return value
+
+    def _bump_versions(self, court_id: int, start_time: datetime, end_time: datetime) -> None:
+        for week in self._weeks(start_time, end_time):
+            try:
+                self.cache.incr(self._version_key(court_id, week))
+            except ValueError:
+                # Sin versión registrada no hay entradas cacheadas para esa semana
+                pass
+        try:
+            self.cache.incr(self._stats_key('invalidations'))
+        except ValueError:
+            self.cache.add(self._stats_key('invalidations'), 1, None)
+
+    def invalidate(self, court_id: int, start_time: datetime, end_time: datetime) -> None:
+        """
+        Invalida las semanas de la cancha que toca el intervalo [start_time, end_time).
+
+        Si hay una transacción en curso, la invalidación se aplica al hacer commit para que
+        ninguna lectura concurrente vuelva a cachear el estado anterior al cambio.
+
+        Args:
+            court_id (int): El ID de la cancha afectada.
+            start_time (datetime): Inicio del intervalo modificado.
+            end_time (datetime): Fin del intervalo modificado.
+        """
+        transaction.on_commit(lambda: self._bump_versions(court_id, start_time, end_time))
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Devuelve los contadores de aciertos, fallos e invalidaciones de la caché.
+
+        Returns:
+            dict: {'hits', 'misses', 'invalidations', 'hit_ratio'}.
+        """
+        names = ['hits', 'misses', 'invalidations']
+        values = self.cache.get_many([self._stats_key(name) for name in names])
+        counters = {name: values.get(self._stats_key(name), 0) for name in names}
+        lookups = counters['hits'] + counters['misses']
+        counters['hit_ratio'] = round(counters['hits'] / lookups, 4) if lookups else 0.0
+        return counters
+
+
+weekly_availability_cache = WeeklyAvailabilityCache()
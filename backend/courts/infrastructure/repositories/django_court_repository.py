@@ -3,9 +3,10 @@ from django.db import transaction
 from asgiref.sync import sync_to_async # Importar sync_to_async
 from ...models import Court, CourtImage # Modelos de Django
 from ...domain.repositories.court_repository import ICourtRepository # Interfaz del Dominio
+from ...domain.slot_bitmap import mark_interval, bitmap_to_hours # Bitmaps de ocupación diaria
 from ...filters import CourtFilter # Asumiendo que CourtFilter está en backend/courts/filters.py
 from django.utils import timezone # Para check_availability
-from django.db.models import Q # Para queries complejas en check_availability
+from django.db.models import Exists, OuterRef # Para queries complejas en check_availability
 from datetime import datetime, timedelta # Importar datetime y timedelta
 
 class DjangoCourtRepository(ICourtRepository):
@@ -104,103 +105,86 @@ class DjangoCourtRepository(ICourtRepository):
 
     @sync_to_async
     def _check_availability_sync(self, start_time_str: str, end_time_str: str, court_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        from bookings.models import Booking # Importar el modelo Booking aquí para evitar circular imports
+        from bookings.infrastructure.overlap_guard import ACTIVE_BOOKING_STATUSES
+
         start_dt = timezone.datetime.fromisoformat(start_time_str.replace('Z', '+00:00'))
         end_dt = timezone.datetime.fromisoformat(end_time_str.replace('Z', '+00:00'))
 
+        # Subconsulta correlacionada: existe alguna reserva que se solape con [start_dt, end_dt)
+        # para la cancha de la fila externa. Así se resuelven todas las canchas en una sola consulta
+        # en lugar de una consulta por cancha (N+1).
+        overlapping_bookings = Booking.objects.filter(
+            court=OuterRef('pk'),
+            start_time__lt=end_dt,
+            end_time__gt=start_dt,
+            status__in=ACTIVE_BOOKING_STATUSES, # Las reservas canceladas no ocupan la cancha
+        )
+
         courts_to_check = Court.objects.all()
         if court_id:
             courts_to_check = courts_to_check.filter(pk=court_id)
 
-        availability_results = []
-        for court_obj in courts_to_check: # Renombrar variable para evitar conflicto con el modelo Court
-            overlapping_bookings = court_obj.booking_set.filter(
-                Q(start_time__lt=end_dt) & Q(end_time__gt=start_dt) &
-                ~Q(status='CANCELLED')
-            ).exists()
+        rows = courts_to_check.annotate(
+            is_busy=Exists(overlapping_bookings)
+        ).values_list('id', 'name', 'is_busy')
 
-            availability_results.append({
-                'id': court_obj.id,
-                'name': court_obj.name,
-                'is_available': not overlapping_bookings
-            })
-        return availability_results
+        return [
+            {'id': pk, 'name': name, 'is_available': not is_busy}
+            for pk, name, is_busy in rows
+        ]
 
     async def check_availability(self, start_time: str, end_time: str, court_id: Optional[int] = None) -> List[Dict[str, Any]]:
         return await self._check_availability_sync(start_time, end_time, court_id)
 
     @sync_to_async
-    def _get_weekly_availability_sync(self, court_id: int, start_date: datetime, end_date: datetime) -> Dict[str, Dict[int, bool]]:
+    def _get_weekly_occupancy_sync(self, court_id: int, start_date: datetime, end_date: datetime) -> Dict[str, int]:
         from bookings.models import Booking # Importar el modelo Booking aquí para evitar circular imports
+        from bookings.infrastructure.overlap_guard import ACTIVE_BOOKING_STATUSES
 
-        try:
-            court = Court.objects.get(pk=court_id)
-        except Court.DoesNotExist:
+        if not Court.objects.filter(pk=court_id).exists():
             return {} # O lanzar una excepción específica
 
-        # Inicializar la estructura de disponibilidad semanal
-        weekly_availability = {}
+        # Un bitmap de 18 bits por día (franjas de 6 AM a 11 PM), inicialmente libre
+        occupancy = {}
         current_date = start_date.date()
         while current_date <= end_date.date():
-            date_str = current_date.strftime('%Y-%m-%d')
-            weekly_availability[date_str] = {hour: True for hour in range(6, 24)} # Horas de 6 AM a 11 PM
+            occupancy[current_date.isoformat()] = 0
             current_date += timedelta(days=1)
 
-        # Obtener todas las reservas para la cancha en el rango de fechas
-        # Considerar solo reservas CONFIRMED o PENDING
-     #   print(f"DEBUG: Consultando reservas para cancha {court_id} ({court.name}) en el rango de {start_date} a {end_date}") # Debug print
+        # Obtener solo los extremos de las reservas activas (no canceladas) que tocan el rango
         bookings = Booking.objects.filter(
-            court=court,
+            court_id=court_id,
             start_time__lt=end_date,
-            end_time__gt=start_date
-        ).exclude(status='CANCELLED') # Excluir reservas canceladas
-
-        # Marcar las horas ocupadas
-    #    print(f"DEBUG: Procesando {len(bookings)} reservas para la cancha {court_id} en el rango {start_date} a {end_date}") # Debug print
-        for booking in bookings:
-            # Convertir las horas de reserva a la zona horaria local configurada en settings.py
-            booking_start_local = timezone.localtime(booking.start_time)
-            booking_end_local = timezone.localtime(booking.end_time)
+            end_time__gt=start_date,
+            status__in=ACTIVE_BOOKING_STATUSES
+        ).values_list('start_time', 'end_time')
 
-        #    print(f"DEBUG: Reserva encontrada: {booking.id} de {booking_start_local} a {booking_end_local} (Local Time)") # Debug print
+        # Convertir el rango semanal a la zona horaria local configurada en settings.py
+        start_date_local = timezone.localtime(start_date)
+        end_date_local = timezone.localtime(end_date)
 
-            # Asegurarse de que las fechas de inicio y fin de la reserva estén dentro del rango semanal
-            # Convertir start_date y end_date a la zona horaria local para la comparación
-            start_date_local = timezone.localtime(start_date)
-            end_date_local = timezone.localtime(end_date)
+        for booking_start, booking_end in bookings:
+            # Recortar la reserva al rango semanal y marcarla como un bloque de franjas (OR de bits)
+            effective_start = max(timezone.localtime(booking_start), start_date_local)
+            effective_end = min(timezone.localtime(booking_end), end_date_local)
+            mark_interval(occupancy, effective_start, effective_end)
 
-            effective_start = max(booking_start_local, start_date_local)
-            effective_end = min(booking_end_local, end_date_local)
+        return occupancy
 
-          #  print(f"DEBUG: Rango efectivo de la reserva dentro de la semana: de {effective_start} a {effective_end}") # Debug print
+    async def get_weekly_occupancy(self, court_id: int, start_date: datetime, end_date: datetime) -> Dict[str, int]:
+        """
+        Obtiene la ocupación semanal de una cancha como un bitmap por día.
 
-          #  print(f"DEBUG: Rango efectivo de la reserva dentro de la semana (Local Time): de {effective_start} a {effective_end}") # Debug print
+        Args:
+            court_id (int): El ID de la cancha.
+            start_date (datetime): La fecha y hora de inicio del rango semanal.
+            end_date (datetime): La fecha y hora de fin del rango semanal.
 
-            # Redondear la hora de inicio de la reserva al inicio de la hora actual o siguiente
-            # Si la reserva empieza a las 10:01, la hora 10:00 ya está ocupada.
-            # Si la reserva empieza a las 10:00, la hora 10:00 está ocupada.
-            current_hour_dt = effective_start.replace(minute=0, second=0, microsecond=0)
-            
-            # Si la reserva termina exactamente en una hora (ej. 11:00), esa hora no se considera ocupada
-            # Si la reserva termina a las 11:01, la hora 11:00 sí se considera ocupada
-            # Ajustar effective_end para que el bucle incluya la última hora si la reserva la ocupa parcialmente
-            adjusted_effective_end = effective_end
-            if effective_end.minute > 0 or effective_end.second > 0 or effective_end.microsecond > 0:
-                adjusted_effective_end = effective_end.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
-            
-            while current_hour_dt < adjusted_effective_end:
-                date_str = current_hour_dt.strftime('%Y-%m-%d')
-                hour = current_hour_dt.hour
-                
-                # Solo marcar si la hora está dentro del rango de 6 AM a 11 PM (23)
-                if 6 <= hour <= 23:
-                    # print(f"DEBUG: Marcando hora como no disponible: {date_str} {hour}:00 (Local Time)") # Debug print
-                    if date_str in weekly_availability and hour in weekly_availability[date_str]:
-                        weekly_availability[date_str][hour] = False # Marcar como no disponible
-                
-                current_hour_dt += timedelta(hours=1)
-        
-       # print(f"DEBUG: Disponibilidad semanal final generada: {weekly_availability}") # Debug print
-        return weekly_availability
+        Returns:
+            dict: { 'YYYY-MM-DD': bitmap, ... } donde el bit i indica que la hora 6 + i está ocupada.
+        """
+        return await self._get_weekly_occupancy_sync(court_id, start_date, end_date)
 
     async def get_weekly_availability(self, court_id: int, start_date: datetime, end_date: datetime) -> Dict[str, Dict[int, bool]]:
         """
@@ -215,4 +199,5 @@ class DjangoCourtRepository(ICourtRepository):
             dict: Un diccionario anidado que representa la disponibilidad semanal.
                   Ejemplo: { 'YYYY-MM-DD': { hour: boolean, ... }, ... }
         """
-        return await self._get_weekly_availability_sync(court_id, start_date, end_date)
+        occupancy = await self.get_weekly_occupancy(court_id, start_date, end_date)
+        return {date_str: bitmap_to_hours(bitmap) for date_str, bitmap in occupancy.items()}
@@ -0,0 +1,274 @@
+from datetime import datetime, timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import SimpleTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from bookings.testing import BookingTestMixin
+from courts.domain.slot_bitmap import FIRST_HOUR, SLOTS_PER_DAY, bitmap_to_hours, hour_range_mask, mark_interval
+from courts.infrastructure.cache.weekly_availability_cache import weekly_availability_cache
+from realtime.dispatcher import notification_dispatcher
+
+
+class CourtAvailabilityTests(BookingTestMixin, APITestCase):
+    """
+    La disponibilidad de varias canchas se resuelve en una sola consulta y solo las
+    reservas activas que se solapan con el rango ocupan una cancha.
+    """
+
+    def setUp(self):
+        self.create_fixtures()
+        self.free_court = self.create_court('Cancha 2')
+        self.cancelled_court = self.create_court('Cancha 3')
+
+    def _get(self, **params):
+        response = self.client.get('/api/courts/availability/', {
+            'start_time': self.start.isoformat(),
+            'end_time': (self.start + timedelta(hours=1)).isoformat(),
+            **params,
+        })
+        self.assertEqual(response.status_code, 200)
+        return {court['id']: court['is_available'] for court in response.data}
+
+    def test_overlapping_active_booking_excludes_the_court(self):
+        self.create_booking(self.start + timedelta(minutes=30))
+        self.create_booking(self.start, court=self.cancelled_court, booking_status='cancelled')
+        # Termina justo cuando empieza el rango: no se solapa
+        self.create_booking(self.start - timedelta(hours=1), court=self.free_court)
+
+        self.assertEqual(self._get(), {
+            self.court.id: False,
+            self.free_court.id: True,
+            self.cancelled_court.id: True,
+        })
+
+    def test_court_id_restricts_the_result(self):
+        self.create_booking(booking_status='confirmed')
+
+        self.assertEqual(self._get(court_id=self.court.id), {self.court.id: False})
+
+    def test_query_count_does_not_grow_with_courts(self):
+        with CaptureQueriesContext(connection) as few:
+            self._get()
+        for _ in range(5):
+            self.create_booking(court=self.create_court())
+        with CaptureQueriesContext(connection) as many:
+            availability = self._get()
+
+        self.assertEqual(len(availability), 8)
+        self.assertEqual(len(few), len(many))
+
+
+def _local(day, hour, minute=0):
+    return timezone.make_aware(datetime(2030, 1, day, hour, minute))
+
+
+class SlotBitmapTests(SimpleTestCase):
+    """
+    Marcado de franjas horarias (6..23) en el bitmap diario.
+    """
+
+    def _mark(self, start, end, days=(7, 8)):
+        occupancy = {f'2030-01-{day:02d}': 0 for day in days}
+        mark_interval(occupancy, start, end)
+        return {date_str: sorted(hour for hour, free in bitmap_to_hours(bitmap).items() if not free)
+                for date_str, bitmap in occupancy.items()}
+
+    def test_whole_hours_end_at_the_boundary(self):
+        self.assertEqual(self._mark(_local(7, 10), _local(7, 11))['2030-01-07'], [10])
+
+    def test_partial_hours_occupy_both_slots(self):
+        self.assertEqual(self._mark(_local(7, 10, 1), _local(7, 11, 1))['2030-01-07'], [10, 11])
+
+    def test_hours_outside_the_window_are_ignored(self):
+        self.assertEqual(self._mark(_local(7, 4), _local(7, 7))['2030-01-07'], [6])
+        self.assertEqual(self._mark(_local(7, 23), _local(8, 1)), {'2030-01-07': [23], '2030-01-08': []})
+        self.assertEqual(hour_range_mask(0, FIRST_HOUR), 0)
+        self.assertEqual(hour_range_mask(0, 24), (1 << SLOTS_PER_DAY) - 1)
+
+    def test_booking_crossing_midnight_marks_both_days(self):
+        self.assertEqual(self._mark(_local(7, 22), _local(8, 7, 30)), {
+            '2030-01-07': [22, 23],
+            '2030-01-08': [6, 7],
+        })
+
+    def test_days_outside_the_occupancy_are_skipped(self):
+        self.assertEqual(self._mark(_local(6, 20), _local(7, 8), days=(7,)), {'2030-01-07': [6, 7]})
+
+
+class WeeklyAvailabilityTests(BookingTestMixin, APITestCase):
+    """
+    El calendario semanal construido con bitmaps debe coincidir con el recorrido hora por
+    hora de las reservas activas, y ?bitmap=true debe describir la misma ocupación.
+    """
+
+    def setUp(self):
+        self.create_fixtures()
+        self.week_start = _local(7, 0)
+        self.week_end = _local(13, 23, 59)
+        cache.clear()
+
+    def _get(self, **params):
+        response = self.client.get(f'/api/courts/{self.court.id}/weekly-availability/', {
+            'start_date': self.week_start.isoformat(),
+            'end_date': self.week_end.isoformat(),
+            **params,
+        })
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def _hourly_reference(self, intervals):
+        """
+        Calendario calculado como antes de los bitmaps: se recorre cada hora de cada reserva.
+        """
+        grid = {}
+        current_date = self.week_start.date()
+        while current_date <= self.week_end.date():
+            grid[current_date.strftime('%Y-%m-%d')] = {hour: True for hour in range(6, 24)}
+            current_date += timedelta(days=1)
+        for start, end in intervals:
+            current = max(start, self.week_start).replace(minute=0, second=0, microsecond=0)
+            end = min(end, self.week_end)
+            if end.minute or end.second or end.microsecond:
+                end = end.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+            while current < end:
+                date_str = current.strftime('%Y-%m-%d')
+                if 6 <= current.hour <= 23 and date_str in grid:
+                    grid[date_str][current.hour] = False
+                current += timedelta(hours=1)
+        return grid
+
+    def test_grid_matches_the_hour_by_hour_reference(self):
+        intervals = [
+            (_local(7, 10), _local(7, 11)),
+            (_local(8, 9, 30), _local(8, 11, 15)),
+            (_local(9, 22), _local(10, 7)),
+            (_local(6, 20), _local(7, 8)),
+            (_local(13, 23), _local(14, 2)),
+        ]
+        for start, end in intervals:
+            self.create_booking(start, hours=(end - start) / timedelta(hours=1))
+
+        self.assertEqual(self._get(), self._hourly_reference(intervals))
+
+    def test_cancelled_bookings_leave_the_slots_free(self):
+        self.create_booking(_local(8, 10), booking_status='cancelled')
+        self.create_booking(_local(8, 12), booking_status='confirmed')
+
+        day = self._get()['2030-01-08']
+
+        self.assertTrue(day[10])
+        self.assertFalse(day[12])
+
+    def test_bitmap_describes_the_default_grid(self):
+        self.create_booking(_local(7, 6))
+        self.create_booking(_local(9, 22), hours=9)
+        self.create_booking(_local(11, 15, 30), hours=2)
+
+        grid = self._get()
+        compact = self._get(bitmap='true')
+
+        self.assertEqual(compact['first_hour'], FIRST_HOUR)
+        self.assertEqual(compact['slots_per_day'], SLOTS_PER_DAY)
+        self.assertEqual(
+            {date_str: bitmap_to_hours(bitmap) for date_str, bitmap in compact['occupied'].items()},
+            grid,
+        )
+
+
+class WeeklyAvailabilityCacheTests(BookingTestMixin, APITestCase):
+    """
+    El calendario semanal se sirve desde la caché hasta que una escritura toca esa
+    (cancha, semana).
+    """
+
+    def setUp(self):
+        self.create_fixtures('admin-test', is_staff=True)
+        self.client.force_authenticate(self.user)
+        self.week_start = _local(7, 0)
+        self.week_end = _local(13, 23, 59)
+        cache.clear()
+        # Los avisos WebSocket del outbox no intervienen en la caché
+        dispatcher = mock.patch.object(notification_dispatcher, 'enqueue')
+        dispatcher.start()
+        self.addCleanup(dispatcher.stop)
+
+    def _day(self, day=8, week_start=None):
+        week_start = week_start or self.week_start
+        response = self.client.get(f'/api/courts/{self.court.id}/weekly-availability/', {
+            'start_date': week_start.isoformat(),
+            'end_date': (week_start + timedelta(days=6, hours=23, minutes=59)).isoformat(),
+        })
+        self.assertEqual(response.status_code, 200)
+        return response.data[(week_start + timedelta(days=day - 7)).date().isoformat()]
+
+    def _write(self, method, url, data=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = getattr(self.client, method)(url, data, format='json')
+        self.assertLess(response.status_code, 300, getattr(response, 'data', None))
+        return response
+
+    def test_repeated_reads_hit_the_cache(self):
+        self._day()
+        self.create_booking(_local(8, 10))  # Sin pasar por la API: no invalida
+        self.assertTrue(self._day()[10])
+
+        stats = weekly_availability_cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+    def test_other_courts_and_weeks_keep_their_entries(self):
+        self._day()
+        other_court = self.create_court()
+        self._write('post', '/api/bookings/bookings/', {
+            'court': other_court.id,
+            'start_time': _local(15, 10).isoformat(),
+            'end_time': _local(15, 11).isoformat(),
+        })
+
+        self._day()
+        self.assertEqual(weekly_availability_cache.stats()['hits'], 1)
+
+    def test_create_invalidates_the_week(self):
+        self._day()
+        self._write('post', '/api/bookings/bookings/', {
+            'court': self.court.id,
+            'start_time': _local(8, 10).isoformat(),
+            'end_time': _local(8, 11).isoformat(),
+        })
+
+        self.assertFalse(self._day()[10])
+
+    def test_update_status_invalidates_the_week(self):
+        booking = self.create_booking(_local(8, 10))
+        self.assertFalse(self._day()[10])
+
+        self._write('post', f'/api/bookings/bookings/{booking.id}/update-status/', {'status': 'cancelled'})
+
+        self.assertTrue(self._day()[10])
+
+    def test_destroy_invalidates_the_week(self):
+        booking = self.create_booking(_local(8, 10))
+        self.assertFalse(self._day()[10])
+
+        self._write('delete', f'/api/bookings/bookings/{booking.id}/')
+
+        self.assertTrue(self._day()[10])
+
+    def test_update_invalidates_the_previous_and_the_new_week(self):
+        booking = self.create_booking(_local(8, 10))
+        next_week = self.week_start + timedelta(weeks=1)
+        self.assertFalse(self._day()[10])
+        self.assertTrue(self._day(week_start=next_week)[12])
+
+        self._write('put', f'/api/bookings/bookings/{booking.id}/', {
+            'court': self.court.id,
+            'start_time': (_local(8, 12) + timedelta(weeks=1)).isoformat(),
+            'end_time': (_local(8, 13) + timedelta(weeks=1)).isoformat(),
+        })
+
+        self.assertTrue(self._day()[10])
+        self.assertFalse(self._day(week_start=next_week)[12])
@@ -152,6 +152,8 @@ class CourtDetail(views.APIView):
 
 
 from .application.use_cases.get_weekly_availability import GetWeeklyAvailabilityUseCase # Importar el nuevo caso de uso
+from .domain.slot_bitmap import FIRST_HOUR, SLOTS_PER_DAY # Metadatos del formato bitmap
+from .infrastructure.cache.weekly_availability_cache import weekly_availability_cache
 
 class CourtAvailabilityView(views.APIView):
     permission_classes = [AllowAny]
@@ -219,17 +221,40 @@ class CourtWeeklyAvailabilityView(views.APIView):
         except ValueError:
             return Response({"error": "Formato de fecha/hora inválido. Use formato ISO 8601."}, status=status.HTTP_400_BAD_REQUEST)
 
+        # Los clientes que lo soliciten (?bitmap=true) reciben la ocupación compacta:
+        # un entero por día donde el bit i indica que la hora FIRST_HOUR + i está ocupada.
+        as_bitmap = request.query_params.get('bitmap', '').lower() in ('1', 'true')
+
         court_repository = DjangoCourtRepository()
-        get_weekly_availability_use_case = GetWeeklyAvailabilityUseCase(court_repository)
+        get_weekly_availability_use_case = GetWeeklyAvailabilityUseCase(
+            court_repository, availability_cache=weekly_availability_cache
+        )
 
         try:
             # Envolver la llamada asíncrona con async_to_sync
             weekly_availability_data = async_to_sync(get_weekly_availability_use_case.execute)(
                 court_id=court_id,
                 start_date=start_dt,
-                end_date=end_dt
+                end_date=end_dt,
+                as_bitmap=as_bitmap
             )
+            if as_bitmap:
+                weekly_availability_data = {
+                    'first_hour': FIRST_HOUR,
+                    'slots_per_day': SLOTS_PER_DAY,
+                    'occupied': weekly_availability_data,
+                }
             return Response(weekly_availability_data, status=status.HTTP_200_OK)
         except Exception as e:
             # print(f"Error en CourtWeeklyAvailabilityView: {e}") // Eliminado mensaje de consola
             return Response({"error": "Error al obtener la disponibilidad semanal."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class WeeklyAvailabilityCacheStatsView(views.APIView):
+    """
+    Vista para consultar los contadores de la caché de disponibilidad semanal.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response(weekly_availability_cache.stats(), status=status.HTTP_200_OK)
@@ -6,10 +6,35 @@ from django.contrib.auth import get_user_model
 from rest_framework_simplejwt.tokens import UntypedToken
 from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 from urllib.parse import parse_qs
+from realtime.frames import PreEncodedFrameMixin
+from realtime.groups import OPEN_MATCHES_GROUP, match_group, user_group
+from realtime.multiplex import Topic
 
 User = get_user_model()
 
-class MatchConsumer(AsyncWebsocketConsumer):
+
+@database_sync_to_async
+def get_active_match_ids(user):
+    """IDs de los partidos no terminados en los que participa el usuario"""
+    from django.utils import timezone
+    from .models import MatchParticipant, OpenMatch
+    return list(
+        MatchParticipant.objects.filter(
+            user=user,
+            match__status__in=[OpenMatch.MatchStatus.OPEN, OpenMatch.MatchStatus.FULL],
+            match__end_time__gte=timezone.now()
+        ).values_list('match_id', flat=True)
+    )
+
+
+async def match_groups(user):
+    """Feed público, avisos propios y grupos de los partidos en los que participa"""
+    groups = {OPEN_MATCHES_GROUP, user_group('matches', user.id)}
+    groups.update(match_group(match_id) for match_id in await get_active_match_ids(user))
+    return groups
+
+
+class MatchConsumer(PreEncodedFrameMixin, AsyncWebsocketConsumer):
     async def connect(self):
         # El usuario ya viene autenticado por el JWTAuthMiddleware
         user = self.scope.get('user')
@@ -18,23 +43,23 @@ class MatchConsumer(AsyncWebsocketConsumer):
             await self.close()
             return
 
-        self.room_group_name = 'matches'
-        
-        # Unirse al grupo de matches
-        await self.channel_layer.group_add(
-            self.room_group_name,
-            self.channel_name
-        )
+        self.group_names = await match_groups(user)
+
+        for group_name in self.group_names:
+            await self.channel_layer.group_add(
+                group_name,
+                self.channel_name
+            )
 
         # Si usamos el subprotocolo para el token, debemos aceptarlo
         accepted_subprotocol = self.scope.get('accepted_subprotocol')
         await self.accept(subprotocol=accepted_subprotocol)
 
     async def disconnect(self, close_code):
-        # Salir del grupo
-        if hasattr(self, 'room_group_name'):
+        # Salir de todos los grupos
+        for group_name in getattr(self, 'group_names', set()):
             await self.channel_layer.group_discard(
-                self.room_group_name,
+                group_name,
                 self.channel_name
             )
       #  print(f"🔌 WebSocket disconnected: {self.channel_name}")
@@ -49,68 +74,79 @@ class MatchConsumer(AsyncWebsocketConsumer):
     # Handlers para diferentes tipos de eventos
     async def match_created(self, event):
         """Enviar notificación de partido creado"""
-        await self.send(text_data=json.dumps({
-            'type': 'match_created',
-            'match': event['match']
-        }))
+        await self.send_frame(event, ('match',))
 
     async def match_updated(self, event):
         """Enviar notificación de partido actualizado"""
-        await self.send(text_data=json.dumps({
-            'type': 'match_updated',
-            'match': event['match']
-        }))
-
-    async def participant_joined(self, event):
-        """Enviar notificación de participante que se unió"""
-        await self.send(text_data=json.dumps({
-            'type': 'participant_joined',
-            'match_id': event['match_id'],
-            'user': event['user'],
-            'participants': event['participants']
-        }))
-
-    async def participant_left(self, event):
-        """Enviar notificación de participante que se fue"""
-        await self.send(text_data=json.dumps({
-            'type': 'participant_left',
-            'match_id': event['match_id'],
-            'user': event['user'],
-            'participants': event['participants']
-        }))
-
-    async def participant_removed(self, event):
-        """Enviar notificación de participante expulsado"""
-        await self.send(text_data=json.dumps({
-            'type': 'participant_removed',
-            'match_id': event['match_id'],
-            'user': event['user'],
-            'participants': event['participants']
-        }))
+        await self.send_frame(event, ('match',))
 
     async def match_cancelled(self, event):
         """Enviar notificación de partido cancelado"""
-        await self.send(text_data=json.dumps({
-            'type': 'match_cancelled',
-            'match_id': event['match_id'],
-            'match': event['match']
-        }))
+        await self.send_frame(event, ('match_id', 'match'))
 
     async def match_deleted(self, event):
         """Enviar notificación de partido eliminado"""
-        await self.send(text_data=json.dumps({
-            'type': 'match_deleted',
-            'match_id': event['match_id']
-        }))
+        await self.send_frame(event, ('match_id',))
+
+    async def match_state(self, event):
+        """Enviar los cambios de participantes agregados de un partido"""
+        await self.send_frame(event, ('match_id', 'participants_count', 'added', 'removed'))
+
+    async def match_participants_changed(self, event):
+        """Enviar el resumen de participantes de un partido del feed"""
+        await self.send_frame(event, ('match_id', 'participants_count'))
+
+    # Avisos de control: no se reenvían al cliente
+    async def match_subscribe(self, event):
+        """Suscribir esta conexión al grupo de un partido al que el usuario se unió"""
+        group_name = match_group(event['match_id'])
+        if group_name not in self.group_names:
+            self.group_names.add(group_name)
+            await self.channel_layer.group_add(group_name, self.channel_name)
+
+    async def match_unsubscribe(self, event):
+        """Dar de baja esta conexión del grupo de un partido que el usuario dejó"""
+        group_name = match_group(event['match_id'])
+        if group_name in self.group_names:
+            self.group_names.discard(group_name)
+            await self.channel_layer.group_discard(group_name, self.channel_name)
 
     async def chat_notification(self, event):
         """Enviar notificación de nuevo mensaje en el chat"""
         # No enviar la notificación al usuario que envió el mensaje
         user = self.scope.get('user')
         if user and user.is_authenticated and user.username != event['username']:
-            await self.send(text_data=json.dumps({
-                'type': 'chat_notification',
-                'match_id': event['match_id'],
-                'message': event['message'],
-                'username': event['username']
-            }))
+            await self.send_frame(event, ('match_id', 'message', 'username'))
+
+
+class MatchTopic(Topic):
+    """
+    Tema 'matches' del socket multiplexado: los mismos eventos que MatchConsumer.
+    """
+    name = 'matches'
+    events = {
+        'match_created': ('match',),
+        'match_updated': ('match',),
+        'match_cancelled': ('match_id', 'match'),
+        'match_deleted': ('match_id',),
+        'match_state': ('match_id', 'participants_count', 'added', 'removed'),
+        'match_participants_changed': ('match_id', 'participants_count'),
+        'chat_notification': ('match_id', 'message', 'username'),
+    }
+    control_events = ('match_subscribe', 'match_unsubscribe')
+
+    async def get_groups(self):
+        return await match_groups(self.user)
+
+    def render(self, event):
+        # No enviar la notificación de chat al usuario que envió el mensaje
+        if event['type'] == 'chat_notification' and event['username'] == self.user.username:
+            return None
+        return super().render(event)
+
+    async def handle_control(self, event):
+        group_name = match_group(event['match_id'])
+        if event['type'] == 'match_subscribe':
+            await self.consumer.add_topic_group(self, group_name)
+        else:
+            await self.consumer.discard_topic_group(self, group_name)
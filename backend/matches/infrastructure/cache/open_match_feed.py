@@ -0,0 +1,145 @@
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+
+from matches.models import OpenMatch
+
+
+class OpenMatchFeedCache:
+    """
+    Feed materializado de partidos abiertos (el listado de OpenMatchViewSet.list).
+
+    Cada partido abierto y futuro se guarda ya serializado con OpenMatchSerializer en su
+    propia entrada, y un índice ordenado [(start_time, id), ...] dice qué partidos forman
+    el feed. Leer el feed es un get del índice y un get_many de las entradas: ninguna
+    consulta a la base de datos, tenga cada partido los participantes que tenga. Los
+    partidos que ya empezaron se descartan al leer comparando con el start_time del
+    índice.
+
+    El índice y las entradas llevan en la clave un número de versión guardado en la
+    caché. Crear, actualizar, unirse, salir, expulsar, cancelar o borrar un partido llama
+    a invalidate(), que al hacer commit incrementa la versión; la siguiente lectura no
+    encuentra índice y reconstruye el feed completo en una consulta. Ninguna escritura
+    lee y reescribe el índice, así que dos cambios concurrentes no pueden pisarse, y una
+    reconstrucción que leyó la base de datos antes de un commit guarda su resultado bajo
+    la versión anterior, que ya nadie lee. Las claves huérfanas expiran a los
+    OPEN_MATCH_FEED_CACHE_TIMEOUT segundos, que también acotan el desajuste por cambios
+    en el perfil de un participante.
+
+    El backend es el alias configurado en settings.CACHES (LocMemCache en desarrollo).
+    """
+    KEY_PREFIX = 'open_match_feed'
+
+    def __init__(self, cache_alias: str = 'default'):
+        self.cache_alias = cache_alias
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    @property
+    def timeout(self) -> int:
+        return getattr(settings, 'OPEN_MATCH_FEED_CACHE_TIMEOUT', 300)
+
+    def _version_key(self) -> str:
+        return f'{self.KEY_PREFIX}:version'
+
+    def _index_key(self, version: int) -> str:
+        return f'{self.KEY_PREFIX}:{version}:index'
+
+    def _entry_key(self, version: int, match_id: int) -> str:
+        return f'{self.KEY_PREFIX}:{version}:match:{match_id}'
+
+    def _version(self) -> int:
+        version = self.cache.get(self._version_key())
+        if version is None:
+            # Versión inicial basada en el reloj: si se desaloja y se recrea, nunca
+            # coincidirá con la de un índice antiguo que aún siga en la caché.
+            self.cache.add(self._version_key(), time.time_ns(), None)
+            version = self.cache.get(self._version_key())
+        return version
+
+    def _read_queryset(self):
+        from matches.serializers import OpenMatchSerializer
+        return OpenMatchSerializer.setup_eager_loading(OpenMatch.objects.all())
+
+    def _serialize(self, matches: Iterable[OpenMatch]) -> Dict[int, Dict[str, Any]]:
+        from matches.serializers import OpenMatchSerializer
+        return {match.id: OpenMatchSerializer(match).data for match in matches}
+
+    def _open_matches(self, **filters) -> List[OpenMatch]:
+        return list(
+            self._read_queryset()
+            .filter(status=OpenMatch.MatchStatus.OPEN, start_time__gte=timezone.now(), **filters)
+            .order_by('start_time', 'id')
+        )
+
+    def _store_entries(self, version: int, data: Dict[int, Dict[str, Any]]) -> None:
+        self.cache.set_many(
+            {self._entry_key(version, match_id): value for match_id, value in data.items()}, self.timeout
+        )
+
+    def list(self) -> List[Dict[str, Any]]:
+        """
+        Partidos abiertos y futuros ordenados por start_time, ya serializados.
+        """
+        version = self._version()
+        index = self.cache.get(self._index_key(version))
+        if index is None:
+            return self.rebuild(version)
+
+        now = timezone.now()
+        match_ids = [match_id for start_time, match_id in index if start_time >= now]
+        entries = self.cache.get_many([self._entry_key(version, match_id) for match_id in match_ids])
+        missing = [match_id for match_id in match_ids if self._entry_key(version, match_id) not in entries]
+        if missing:
+            # Entradas desalojadas: se materializan de nuevo en una sola consulta
+            data = self._serialize(self._open_matches(id__in=missing))
+            self._store_entries(version, data)
+            entries.update({self._entry_key(version, match_id): value for match_id, value in data.items()})
+        return [
+            entries[self._entry_key(version, match_id)] for match_id in match_ids
+            if self._entry_key(version, match_id) in entries
+        ]
+
+    def rebuild(self, version: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Vuelve a materializar el feed completo desde la base de datos.
+
+        La versión se lee antes de consultar: si un commit la incrementa mientras tanto,
+        el resultado queda guardado bajo la versión anterior y no se sirve.
+        """
+        if version is None:
+            version = self._version()
+        matches = self._open_matches()
+        data = self._serialize(matches)
+        self._store_entries(version, data)
+        self.cache.set(self._index_key(version), [(match.start_time, match.id) for match in matches], self.timeout)
+        return [data[match.id] for match in matches]
+
+    def refresh(self, match_id: int) -> None:
+        """
+        Deja obsoleto el feed materializado tras un cambio en el partido.
+        """
+        try:
+            self.cache.incr(self._version_key())
+        except ValueError:
+            # Sin versión registrada no hay feed materializado
+            pass
+
+    def invalidate(self, match_id: int) -> None:
+        """
+        Invalida el feed al hacer commit de la transacción en curso, para que ninguna
+        lectura concurrente vuelva a materializar el estado anterior al cambio.
+        """
+        transaction.on_commit(lambda: self.refresh(match_id))
+
+    def clear(self) -> None:
+        self.cache.delete(self._version_key())
+
+
+open_match_feed = OpenMatchFeedCache()
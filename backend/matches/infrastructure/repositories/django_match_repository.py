@@ -11,6 +11,9 @@ from matches.models import OpenMatch, MatchCategory, MatchParticipant
 from users.models import User
 from courts.models import Court
 from bookings.models import Booking # Importar el modelo Booking
+from bookings.infrastructure.overlap_guard import save_without_overlap
+from courts.infrastructure.cache.weekly_availability_cache import weekly_availability_cache
+from matches.infrastructure.cache.open_match_feed import open_match_feed
 
 class DjangoMatchRepository(IMatchRepository):
 
@@ -25,16 +28,20 @@ class DjangoMatchRepository(IMatchRepository):
         with transaction.atomic():
             match = OpenMatch.objects.create(**match_data)
             MatchParticipant.objects.create(match=match, user=match.creator)
+            open_match_feed.invalidate(match.id)
 
             # Crear una reserva asociada al partido
             try:
-                Booking.objects.create(
+                # save_without_overlap usa un savepoint: un conflicto no aborta la transacción del partido
+                save_without_overlap(Booking(
                     user=match.creator,
                     court=match.court,
                     start_time=match.start_time,
                     end_time=match.end_time,
                     status='confirmed' # O 'pending', dependiendo de la lógica de negocio
-                )
+                ))
+                # Se aplica al hacer commit de la transacción del partido
+                weekly_availability_cache.invalidate(match.court_id, match.start_time, match.end_time)
             except Exception as e:
                 # Log the error, but don't prevent match creation if booking fails
                 print(f"Error creating booking for match {match.id}: {e}")
@@ -73,12 +80,13 @@ class DjangoMatchRepository(IMatchRepository):
                 return match # Opcional: devolver el partido sin cambios o lanzar error
 
             MatchParticipant.objects.create(match=match, user=user)
+            open_match_feed.invalidate(match.id)
             
             # El número total de jugadores es el creador (1) + los que se necesitan.
             total_players_required = match.players_needed + 1
             
-            # Contamos cuántos participantes hay AHORA.
-            current_participant_count = match.participants.count()
+            # Contamos cuántos participantes hay AHORA (sin la lista precargada antes de unirse).
+            current_participant_count = MatchParticipant.objects.filter(match=match).count()
 
             if current_participant_count >= total_players_required:
                 match.status = OpenMatch.MatchStatus.FULL
@@ -99,6 +107,7 @@ class DjangoMatchRepository(IMatchRepository):
                 if match.status == OpenMatch.MatchStatus.FULL:
                     match.status = OpenMatch.MatchStatus.OPEN
                     match.save()
+            open_match_feed.invalidate(match.id)
             return match
 
     @sync_to_async
@@ -130,4 +139,5 @@ class DjangoMatchRepository(IMatchRepository):
                 setattr(match, key, value)
             
             match.save()
+            open_match_feed.invalidate(match.id)
             return match
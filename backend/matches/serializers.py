@@ -1,3 +1,4 @@
+from django.db.models import Prefetch
 from rest_framework import serializers
 from .models import MatchCategory, OpenMatch, MatchParticipant
 from users.serializers import UserSerializer # Reutilizamos el serializer de usuario
@@ -39,11 +40,21 @@ class OpenMatchSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'creator', 'status', 'created_at', 'participants']
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """
+        Carga cancha, categoría, creador (con rol) y participantes (con usuario y rol) en un
+        número fijo de consultas, tenga cada partido los participantes que tenga.
+        """
+        return queryset.select_related('court', 'category', 'creator__role').prefetch_related(
+            Prefetch('participants', queryset=MatchParticipant.objects.select_related('user__role'))
+        )
+
     def get_category_id_read(self, obj):
-        return obj.category.id
+        return obj.category_id
 
     def get_court_id_read(self, obj):
-        return obj.court.id
+        return obj.court_id
 
     def create(self, validated_data):
         # El 'creator' se añadirá en la vista a partir del usuario autenticado
@@ -1,3 +1,260 @@
-from django.test import TestCase
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.db import connection
+from django.test import TestCase, override_settings
+from asgiref.sync import async_to_sync
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from bookings.testing import BookingTestMixin
+from realtime.dispatcher import notification_dispatcher
+from .infrastructure.cache.open_match_feed import open_match_feed
+from .infrastructure.repositories.django_match_repository import DjangoMatchRepository
+from .models import MatchCategory, MatchParticipant, OpenMatch
+from .utils.websocket_notifier import match_notifier, match_state_coalescer, participants_count_coalescer
+
+
+class OpenMatchReadQueryCountTests(BookingTestMixin, APITestCase):
+    """
+    Las lecturas de partidos deben costar un número fijo de consultas, sin importar cuántos
+    partidos o participantes haya.
+    """
+
+    def setUp(self):
+        self.create_fixtures('jugador-test')
+        self.client.force_authenticate(self.user)
+        self.category = MatchCategory.objects.create(name='Mixto-test')
+        self.next_start = self.start
+        open_match_feed.clear()
+
+    def _create_match(self, participants, creator=None):
+        creator = creator or self.create_user()
+        match = OpenMatch.objects.create(
+            court=self.create_court(),
+            creator=creator,
+            category=self.category,
+            start_time=self.next_start,
+            end_time=self.next_start + timedelta(hours=1),
+            players_needed=20,
+        )
+        MatchParticipant.objects.create(match=match, user=creator)
+        for _ in range(participants - 1):
+            MatchParticipant.objects.create(match=match, user=self.create_user())
+        self.next_start += timedelta(hours=1)
+        return match
+
+    def _count_queries(self, method, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response
+
+    def test_list_query_count_does_not_grow_with_matches(self):
+        self._create_match(participants=1)
+        few_queries, response = self._count_queries('get', '/api/matches/open-matches/')
+        self.assertEqual(len(response.data), 1)
+
+        open_match_feed.clear()
+        for _ in range(5):
+            self._create_match(participants=4)
+        many_queries, response = self._count_queries('get', '/api/matches/open-matches/')
+        self.assertEqual(len(response.data), 6)
+
+        self.assertEqual(few_queries, many_queries)
+
+    def test_retrieve_query_count_does_not_grow_with_participants(self):
+        small = self._create_match(participants=1)
+        few_queries, _ = self._count_queries('get', f'/api/matches/open-matches/{small.id}/')
+
+        large = self._create_match(participants=8)
+        many_queries, response = self._count_queries('get', f'/api/matches/open-matches/{large.id}/')
+        self.assertEqual(len(response.data['participants']), 8)
+        self.assertEqual(response.data['participants'][0]['user']['role'], 'cliente-test')
+
+        self.assertEqual(few_queries, many_queries)
+
+    def test_my_upcoming_matches_query_count_does_not_grow_with_matches(self):
+        self._create_match(participants=1, creator=self.user)
+        few_queries, response = self._count_queries('get', '/api/matches/open-matches/my-upcoming-matches/')
+        self.assertEqual(len(response.data), 1)
+
+        for _ in range(5):
+            self._create_match(participants=4, creator=self.user)
+        many_queries, response = self._count_queries('get', '/api/matches/open-matches/my-upcoming-matches/')
+        self.assertEqual(len(response.data), 6)
+
+        self.assertEqual(few_queries, many_queries)
+
+    def test_join_and_leave_query_count_does_not_grow_with_participants(self):
+        small = self._create_match(participants=1)
+        few_join, _ = self._count_queries('post', f'/api/matches/open-matches/{small.id}/join/')
+        few_leave, _ = self._count_queries('post', f'/api/matches/open-matches/{small.id}/leave/')
+
+        large = self._create_match(participants=8)
+        many_join, response = self._count_queries('post', f'/api/matches/open-matches/{large.id}/join/')
+        self.assertEqual(len(response.data['participants']), 9)
+        many_leave, response = self._count_queries('post', f'/api/matches/open-matches/{large.id}/leave/')
+        self.assertEqual(len(response.data['participants']), 8)
+
+        self.assertEqual(few_join, many_join)
+        self.assertEqual(few_leave, many_leave)
+
+
+@override_settings(MATCH_EVENT_COALESCE_WINDOW_MS=60000)
+class MatchEventOrderingTests(TestCase):
+    """
+    Un evento inmediato de un partido no debe adelantar a sus cambios de participantes
+    que siguen agregándose en la ventana.
+    """
+
+    def tearDown(self):
+        # No dejar ventanas abiertas para otras pruebas
+        with mock.patch.object(notification_dispatcher, 'enqueue'):
+            for coalescer in (match_state_coalescer, participants_count_coalescer):
+                coalescer.flush(1)
+
+    def _enqueued_types(self, notify):
+        with mock.patch.object(notification_dispatcher, 'enqueue') as enqueue:
+            with self.captureOnCommitCallbacks(execute=True):
+                notify()
+        return [(call.args[0], call.args[1]['type']) for call in enqueue.call_args_list]
+
+    def _join_then(self, immediate):
+        user = {'id': 5, 'username': 'jugador-5'}
+        match_notifier.notify_participant_joined(1, user, [{'user': user, 'joined_at': None}])
+        immediate()
+
+    def test_pending_match_state_is_sent_before_match_deleted(self):
+        sent = self._enqueued_types(lambda: self._join_then(lambda: match_notifier.notify_match_deleted(1)))
+
+        self.assertEqual(sent, [
+            ('matches_user_5', 'match_subscribe'),
+            ('match_1', 'match_state'),
+            ('matches', 'match_participants_changed'),
+            ('matches', 'match_deleted'),
+        ])
+
+    def test_pending_match_state_is_sent_before_match_cancelled_and_updated(self):
+        sent = self._enqueued_types(lambda: self._join_then(lambda: (
+            match_notifier.notify_match_cancelled(1, {'id': 1}),
+            match_notifier.notify_match_updated({'id': 1}),
+        )))
+
+        self.assertEqual([event_type for _, event_type in sent], [
+            'match_subscribe', 'match_state', 'match_participants_changed', 'match_cancelled', 'match_updated',
+        ])
+
+    def test_other_matches_keep_their_window(self):
+        sent = self._enqueued_types(lambda: self._join_then(lambda: match_notifier.notify_match_deleted(2)))
+
+        self.assertEqual([event_type for _, event_type in sent], ['match_subscribe', 'match_deleted'])
+
+
+class OpenMatchFeedMaintenanceTests(BookingTestMixin, APITestCase):
+    """
+    Crear, completar, liberar y cancelar un partido lo mete o lo saca del feed al hacer commit.
+    """
+
+    def setUp(self):
+        self.create_fixtures('creador-test')
+        self.creator = self.user
+        self.player = self.create_user('jugador-test')
+        self.category = MatchCategory.objects.create(name='Mixto-test')
+        self.repository = DjangoMatchRepository()
+        # Los avisos WebSocket del outbox no intervienen en el feed
+        dispatcher = mock.patch.object(notification_dispatcher, 'enqueue')
+        dispatcher.start()
+        self.addCleanup(dispatcher.stop)
+        open_match_feed.clear()
+        # Feed ya materializado (vacío): cada cambio debe invalidarlo
+        self.assertEqual(open_match_feed.list(), [])
+
+    def _feed_ids(self):
+        return [match['id'] for match in open_match_feed.list()]
+
+    def _run(self, method, *args):
+        with self.captureOnCommitCallbacks(execute=True):
+            return async_to_sync(method)(*args)
+
+    def _match_data(self, hours=0):
+        start_time = timezone.now() + timedelta(days=1, hours=hours)
+        return {
+            'court': self.court,
+            'creator': self.creator,
+            'category': self.category,
+            'start_time': start_time,
+            'end_time': start_time + timedelta(hours=1),
+            'players_needed': 1,
+        }
+
+    def _create_match(self):
+        return self._run(self.repository.create_open_match, self._match_data())
+
+    def test_create_adds_the_match(self):
+        match = self._create_match()
+
+        self.assertEqual(self._feed_ids(), [match.id])
+        self.assertEqual(len(open_match_feed.list()[0]['participants']), 1)
+
+    def test_join_to_full_and_leave_from_full_move_the_match(self):
+        match = self._create_match()
+
+        self._run(self.repository.add_participant_to_match, match.id, self.player.id)
+        self.assertEqual(OpenMatch.objects.get(id=match.id).status, OpenMatch.MatchStatus.FULL)
+        self.assertEqual(self._feed_ids(), [])
+
+        self._run(self.repository.remove_participant_from_match, match.id, self.player.id)
+        self.assertEqual(OpenMatch.objects.get(id=match.id).status, OpenMatch.MatchStatus.OPEN)
+        self.assertEqual(self._feed_ids(), [match.id])
+
+    def test_cancel_removes_the_match(self):
+        match = self._create_match()
+        self.client.force_authenticate(self.creator)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f'/api/matches/open-matches/{match.id}/cancel/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._feed_ids(), [])
+
+    def test_leave_refreshes_the_feed_once(self):
+        match = self._create_match()
+        self._run(self.repository.add_participant_to_match, match.id, self.player.id)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            async_to_sync(self.repository.remove_participant_from_match)(match.id, self.player.id)
+
+        refreshes = [callback for callback in callbacks if 'OpenMatchFeedCache' in callback.__qualname__]
+        self.assertEqual(len(refreshes), 1)
+
+    def test_interleaved_refreshes_keep_both_changes(self):
+        with self.captureOnCommitCallbacks() as first:
+            first_match = async_to_sync(self.repository.create_open_match)(self._match_data())
+        with self.captureOnCommitCallbacks() as second:
+            second_match = async_to_sync(self.repository.create_open_match)(self._match_data(hours=2))
+
+        # El segundo commit llega a la caché antes que el primero
+        for callback in second + first:
+            callback()
+
+        self.assertEqual(self._feed_ids(), [first_match.id, second_match.id])
+
+    def test_rebuild_racing_a_commit_is_not_served(self):
+        open_match_feed.clear()
+        with self.captureOnCommitCallbacks() as pending:
+            match = async_to_sync(self.repository.create_open_match)(self._match_data())
+        read_matches = open_match_feed._open_matches
+
+        def commit_after_reading(**filters):
+            # La reconstrucción leyó la base de datos antes del commit del partido
+            matches = [found for found in read_matches(**filters) if found.id != match.id]
+            for callback in pending:
+                callback()
+            return matches
+
+        with mock.patch.object(open_match_feed, '_open_matches', side_effect=commit_after_reading):
+            self.assertEqual(self._feed_ids(), [])
+
+        self.assertEqual(self._feed_ids(), [match.id])
@@ -1,67 +1,138 @@
 # matches/utils/websocket_notifier.py
 from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
+from realtime.coalescing import EventCoalescer
+from realtime.frames import encode_frame
+from realtime.groups import OPEN_MATCHES_GROUP, match_group, user_group
+from realtime.outbox import outbox
+
+
+def merge_match_state(current, new):
+    """
+    Fusiona dos deltas match_state consecutivos de un partido.
+
+    El cliente aplica un delta quitando los usuarios de 'removed' y luego insertando o
+    reemplazando los de 'added', así que un usuario solo aparece en una de las listas:
+    la de su último cambio. El número de participantes es el del delta más reciente.
+    """
+    added = {participant['user']['id']: participant for participant in current['added']}
+    removed = {user['id']: user for user in current['removed']}
+    for participant in new['added']:
+        removed.pop(participant['user']['id'], None)
+        added[participant['user']['id']] = participant
+    for user in new['removed']:
+        added.pop(user['id'], None)
+        removed[user['id']] = user
+    return {
+        'match_id': new['match_id'],
+        'participants_count': new['participants_count'],
+        'added': list(added.values()),
+        'removed': list(removed.values()),
+    }
+
+
+# Los cambios de participantes de un mismo partido dentro de la ventana
+# (MATCH_EVENT_COALESCE_WINDOW_MS) salen como un solo mensaje por grupo
+match_state_coalescer = EventCoalescer(merge_match_state, window_setting='MATCH_EVENT_COALESCE_WINDOW_MS')
+participants_count_coalescer = EventCoalescer(
+    lambda current, new: new, window_setting='MATCH_EVENT_COALESCE_WINDOW_MS'
+)
 
 class MatchWebSocketNotifier:
-    """Helper para enviar notificaciones WebSocket sobre partidos"""
+    """
+    Helper para enviar notificaciones WebSocket sobre partidos.
+
+    El ciclo de vida de un partido va al feed público de partidos abiertos. Los cambios
+    de participantes van al grupo del partido como deltas match_state (solo los
+    participantes que cambian) y el feed recibe el número de participantes; en ambos
+    casos las ráfagas se agregan en una ventana corta. Cada usuario que entra o sale de
+    un partido recibe en su grupo un aviso para que su conexión se suscriba o se dé de
+    baja del grupo del partido.
+    """
     
     def __init__(self):
         self.channel_layer = get_channel_layer()
-        self.group_name = 'matches'
+        self.group_name = OPEN_MATCHES_GROUP
 
-    def _send_to_group(self, event_type, data):
-        """Enviar un evento al grupo de matches"""
+    def _publish(self, group, event_type, payload, dispatch=None):
         if not self.channel_layer:
             print("⚠️ Channel layer not configured")
             return
             
-        async_to_sync(self.channel_layer.group_send)(
-            self.group_name,
-            {
-                'type': event_type,
-                **data
-            }
-        )
+        # Se registra en el outbox dentro de la transacción actual y se envía tras el commit
+        outbox.publish(group, event_type, payload, dispatch=dispatch)
+
+    def _send_to_group(self, event_type, data, group=None, match_id=None):
+        """Enviar un evento a un grupo (por defecto, el feed de partidos)"""
+        dispatch = None
+        if match_id is not None:
+            dispatch = lambda event: self._dispatch_after_pending_state(event, match_id)
+        # El frame se codifica una sola vez; los consumers lo reenvían sin serializar
+        self._publish(group or self.group_name, event_type, {'frame': encode_frame(event_type, data)}, dispatch=dispatch)
+
+    @staticmethod
+    def _dispatch_after_pending_state(event, match_id):
+        """Encolar primero los cambios de participantes agregados del partido y luego el evento"""
+        # Sin esto un match_state en su ventana llegaría después de (ej.) match_deleted
+        match_state_coalescer.flush(match_id)
+        participants_count_coalescer.flush(match_id)
+        outbox.dispatch(event)
+
+    def _send_membership(self, event_type, match_id, user_id):
+        """Avisar a las conexiones de un usuario de que entren o salgan del grupo del partido"""
+        # Aviso de control para el consumer: no lleva frame porque no llega al cliente
+        self._publish(user_group('matches', user_id), event_type, {'match_id': match_id})
+
+    def _send_participant_change(self, match_id, participants_data, added_user=None, removed_user=None):
+        """Publicar el cambio de un participante como delta (se agrega tras el commit)"""
+        added = [
+            participant for participant in participants_data
+            if added_user is not None and participant['user']['id'] == added_user['id']
+        ]
+        self._publish(match_group(match_id), 'match_state', {
+            'match_id': match_id,
+            'participants_count': len(participants_data),
+            'added': added,
+            'removed': [removed_user] if removed_user is not None else []
+        }, dispatch=lambda event: match_state_coalescer.add(event, match_id))
+        self._publish(self.group_name, 'match_participants_changed', {
+            'match_id': match_id,
+            'participants_count': len(participants_data)
+        }, dispatch=lambda event: participants_count_coalescer.add(event, match_id))
 
     def notify_match_created(self, match_data):
         """Notificar que se creó un nuevo partido"""
         self._send_to_group('match_created', {
             'match': match_data
         })
+        # El creador es el primer participante
+        creator = match_data.get('creator') or {}
+        if creator.get('id') is not None:
+            self._send_membership('match_subscribe', match_data.get('id'), creator['id'])
         print(f"📢 Notified: Match created {match_data.get('id')}")
 
     def notify_match_updated(self, match_data):
         """Notificar que se actualizó un partido"""
         self._send_to_group('match_updated', {
             'match': match_data
-        })
+        }, match_id=match_data.get('id'))
         print(f"📢 Notified: Match updated {match_data.get('id')}")
 
     def notify_participant_joined(self, match_id, user_data, participants_data):
         """Notificar que un participante se unió"""
-        self._send_to_group('participant_joined', {
-            'match_id': match_id,
-            'user': user_data,
-            'participants': participants_data
-        })
+        self._send_membership('match_subscribe', match_id, user_data['id'])
+        self._send_participant_change(match_id, participants_data, added_user=user_data)
         print(f"📢 Notified: Participant joined match {match_id}")
 
     def notify_participant_left(self, match_id, user_data, participants_data):
         """Notificar que un participante se fue"""
-        self._send_to_group('participant_left', {
-            'match_id': match_id,
-            'user': user_data,
-            'participants': participants_data
-        })
+        self._send_participant_change(match_id, participants_data, removed_user=user_data)
+        self._send_membership('match_unsubscribe', match_id, user_data['id'])
         print(f"📢 Notified: Participant left match {match_id}")
 
     def notify_participant_removed(self, match_id, user_data, participants_data):
         """Notificar que un participante fue expulsado"""
-        self._send_to_group('participant_removed', {
-            'match_id': match_id,
-            'user': user_data,
-            'participants': participants_data
-        })
+        self._send_participant_change(match_id, participants_data, removed_user=user_data)
+        self._send_membership('match_unsubscribe', match_id, user_data['id'])
         print(f"📢 Notified: Participant removed from match {match_id}")
 
     def notify_match_cancelled(self, match_id, match_data):
@@ -69,14 +140,14 @@ class MatchWebSocketNotifier:
         self._send_to_group('match_cancelled', {
             'match_id': match_id,
             'match': match_data
-        })
+        }, match_id=match_id)
         print(f"📢 Notified: Match cancelled {match_id}")
 
     def notify_match_deleted(self, match_id):
         """Notificar que un partido fue eliminado"""
         self._send_to_group('match_deleted', {
             'match_id': match_id
-        })
+        }, match_id=match_id)
         print(f"📢 Notified: Match deleted {match_id}")
 
 
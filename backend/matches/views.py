@@ -4,9 +4,11 @@ from rest_framework import viewsets, status
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import action
+from django.db import transaction
 from .models import OpenMatch, MatchCategory
 from .serializers import OpenMatchSerializer, MatchCategorySerializer
 from .utils.websocket_notifier import match_notifier
+from .infrastructure.cache.open_match_feed import open_match_feed
 from .permissions import IsMatchCreator
 
 class OpenMatchViewSet(viewsets.ModelViewSet):
@@ -14,6 +16,18 @@ class OpenMatchViewSet(viewsets.ModelViewSet):
     serializer_class = OpenMatchSerializer
     permission_classes = [IsAuthenticated]
 
+    def get_queryset(self):
+        # OpenMatchSerializer anida creador, participantes (usuario y rol), cancha y categoría
+        return OpenMatchSerializer.setup_eager_loading(OpenMatch.objects.all())
+
+    def get_fresh_match(self, match):
+        """
+        Vuelve a leer el partido con sus relaciones tras un cambio de participantes (los
+        participantes precargados por get_object ya no son válidos).
+        """
+        return self.get_queryset().get(pk=match.pk)
+
+    @transaction.atomic
     def create(self, request, *args, **kwargs):
         """Crear un nuevo partido"""
         serializer = self.get_serializer(data=request.data)
@@ -27,14 +41,18 @@ class OpenMatchViewSet(viewsets.ModelViewSet):
         MatchParticipant.objects.create(match=match, user=request.user)
         
         # Recargar para obtener participantes
-        match.refresh_from_db()
+        match = self.get_fresh_match(match)
         response_serializer = self.get_serializer(match)
         
+        # Feed de partidos abiertos (se actualiza al hacer commit)
+        open_match_feed.invalidate(match.id)
+
         # Notificar por WebSocket
         match_notifier.notify_match_created(response_serializer.data)
         
         return Response(response_serializer.data, status=status.HTTP_201_CREATED)
 
+    @transaction.atomic
     def update(self, request, *args, **kwargs):
         """Actualizar un partido existente"""
         partial = kwargs.pop('partial', False)
@@ -50,6 +68,9 @@ class OpenMatchViewSet(viewsets.ModelViewSet):
         
         response_serializer = self.get_serializer(match)
         
+        # Feed de partidos abiertos (se actualiza al hacer commit)
+        open_match_feed.invalidate(match.id)
+
         # Notificar por WebSocket
         match_notifier.notify_match_updated(response_serializer.data)
         
@@ -57,14 +78,8 @@ class OpenMatchViewSet(viewsets.ModelViewSet):
 
     def list(self, request, *args, **kwargs):
         """Listar todos los partidos abiertos y futuros"""
-        from django.utils import timezone
-        # Solo partidos abiertos y cuya fecha de inicio sea mayor o igual a ahora
-        queryset = self.get_queryset().filter(
-            status='OPEN',
-            start_time__gte=timezone.now()
-        ).order_by('start_time')
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        # Servido desde el feed materializado (mismo filtro: OPEN y start_time >= ahora)
+        return Response(open_match_feed.list())
 
     def retrieve(self, request, *args, **kwargs):
         """Obtener detalles de un partido"""
@@ -73,6 +88,7 @@ class OpenMatchViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
     @action(detail=True, methods=['post'])
+    @transaction.atomic
     def join(self, request, pk=None):
         """Unirse a un partido"""
         match = self.get_object()
@@ -105,9 +121,12 @@ class OpenMatchViewSet(viewsets.ModelViewSet):
         MatchParticipant.objects.create(match=match, user=user)
         
         # Recargar y serializar
-        match.refresh_from_db()
+        match = self.get_fresh_match(match)
         match_serializer = self.get_serializer(match)
         
+        # Feed de partidos abiertos (se actualiza al hacer commit)
+        open_match_feed.invalidate(match.id)
+
         # Notificar por WebSocket
         match_notifier.notify_participant_joined(
             match_id=match.id,
@@ -121,6 +140,7 @@ class OpenMatchViewSet(viewsets.ModelViewSet):
         return Response(match_serializer.data)
 
     @action(detail=True, methods=['post'])
+    @transaction.atomic
     def leave(self, request, pk=None):
         """Salir de un partido"""
         match = self.get_object()
@@ -144,9 +164,12 @@ class OpenMatchViewSet(viewsets.ModelViewSet):
             )
         
         # Recargar y serializar
-        match.refresh_from_db()
+        match = self.get_fresh_match(match)
         match_serializer = self.get_serializer(match)
         
+        # Feed de partidos abiertos (se actualiza al hacer commit)
+        open_match_feed.invalidate(match.id)
+
         # Notificar por WebSocket
         match_notifier.notify_participant_left(
             match_id=match.id,
@@ -160,6 +183,7 @@ class OpenMatchViewSet(viewsets.ModelViewSet):
         return Response(match_serializer.data)
 
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated, IsMatchCreator])
+    @transaction.atomic
     def cancel(self, request, pk=None):
         """Cancelar un partido (solo creador)"""
         match = self.get_object()
@@ -170,6 +194,9 @@ class OpenMatchViewSet(viewsets.ModelViewSet):
         
         match_serializer = self.get_serializer(match)
         
+        # Feed de partidos abiertos (se actualiza al hacer commit)
+        open_match_feed.invalidate(match.id)
+
         # Notificar por WebSocket
         match_notifier.notify_match_cancelled(
             match_id=match.id,
@@ -179,6 +206,7 @@ class OpenMatchViewSet(viewsets.ModelViewSet):
         return Response(match_serializer.data)
 
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated, IsMatchCreator])
+    @transaction.atomic
     def remove_participant(self, request, pk=None):
         """Expulsar a un participante (solo creador)"""
         match = self.get_object()
@@ -227,9 +255,12 @@ class OpenMatchViewSet(viewsets.ModelViewSet):
             )
         
         # Recargar y serializar
-        match.refresh_from_db()
+        match = self.get_fresh_match(match)
         match_serializer = self.get_serializer(match)
         
+        # Feed de partidos abiertos (se actualiza al hacer commit)
+        open_match_feed.invalidate(match.id)
+
         # Notificar por WebSocket
         match_notifier.notify_participant_removed(
             match_id=match.id,
@@ -239,6 +270,10 @@ class OpenMatchViewSet(viewsets.ModelViewSet):
         
         return Response(match_serializer.data)
 
+    def perform_destroy(self, instance):
+        open_match_feed.invalidate(instance.id)
+        super().perform_destroy(instance)
+
     @action(detail=False, methods=['get'])
     def categories(self, request):
         """Obtener todas las categorías"""
@@ -0,0 +1,28 @@
+"""
+Datos de ejemplo compartidos por los comandos de medición de WebSockets
+(websocket_fanout_loadtest, websocket_frame_benchmark).
+"""
+
+
+def sample_booking_data(booking_id, user_id, court_id):
+    """
+    Reserva con la misma forma que BookingSerializer: 'user' y 'court' son write_only y
+    solo salen anidados en user_details y court_details.
+    """
+    return {
+        'id': booking_id,
+        'user_details': {
+            'id': user_id, 'username': f'user{user_id}', 'email': f'user{user_id}@example.com',
+            'first_name': 'Nombre', 'last_name': 'Apellido', 'is_staff': False, 'is_active': True,
+        },
+        'court_details': {
+            'id': court_id, 'name': f'Cancha {court_id}', 'description': 'Cancha sintética',
+            'price': '80000.00', 'is_active': True, 'images': [],
+        },
+        'start_time': '2026-01-10T19:00:00-05:00',
+        'end_time': '2026-01-10T20:00:00-05:00',
+        'status': 'pending',
+        'payment': None,
+        'payment_percentage': None,
+        'created_at': '2026-01-01T12:00:00-05:00',
+    }
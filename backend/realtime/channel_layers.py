@@ -0,0 +1,496 @@
+import asyncio
+import json
+import logging
+import random
+import select
+import string
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import pool as pg_pool
+from psycopg2 import sql
+from channels.exceptions import ChannelFull
+from channels.layers import BaseChannelLayer
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import ChannelGroupMembership, ChannelMessage
+
+logger = logging.getLogger(__name__)
+
+MESSAGE_TABLE = ChannelMessage._meta.db_table
+GROUP_TABLE = ChannelGroupMembership._meta.db_table
+
+# Prefijo de los canales de notificación de PostgreSQL (uno por proceso)
+NOTIFY_CHANNEL_PREFIX = 'channels_'
+
+
+class _Inbox:
+    """
+    Mensajes recibidos para un canal del proceso y corrutinas esperando en receive().
+    """
+    __slots__ = ('messages', 'waiters')
+
+    def __init__(self):
+        self.messages = deque()
+        self.waiters = []
+
+    def pop(self):
+        now = time.monotonic()
+        while self.messages:
+            expires_at, message = self.messages.popleft()
+            if expires_at >= now:
+                return message
+        return None
+
+
+def _wake(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class PostgresChannelLayer(BaseChannelLayer):
+    """
+    Capa de canales sobre la base de datos PostgreSQL existente (LISTEN/NOTIFY + tabla).
+
+    Permite que group_send llegue a los clientes conectados en cualquier proceso de Daphne:
+    - Las pertenencias a grupos se guardan en ChannelGroupMembership.
+    - send/group_send insertan los mensajes en ChannelMessage y avisan con pg_notify a
+      cada proceso destinatario, todo en una sola sentencia (un viaje a la base de datos
+      por group_send, sin importar cuántos miembros o procesos tenga el grupo).
+    - Cada proceso tiene un hilo que escucha su canal de notificación, retira sus
+      mensajes de la tabla y los entrega a las corrutinas que esperan en receive().
+
+    Solo se admiten canales específicos de proceso (los creados con new_channel(), que
+    son los que usan los consumers de WebSocket). Los mensajes se serializan en JSON.
+
+    Capacidad: cada proceso solo retira de la tabla los mensajes que caben en el buzón
+    de cada canal; el resto espera en la tabla hasta que el consumer lee. Si un canal
+    ya tiene 'capacity' mensajes sin retirar, send() lanza ChannelFull y group_send lo
+    omite (como el resto de capas de canales).
+
+    Configuración (CHANNEL_LAYERS['default']['CONFIG']):
+        database (str): Alias de settings.DATABASES a usar. Por defecto 'default'.
+        expiry (int): Segundos que vive un mensaje sin entregar.
+        group_expiry (int): Segundos que dura una pertenencia a grupo.
+        capacity (int): Mensajes pendientes por canal en el proceso receptor.
+        pool_size (int): Conexiones máximas para enviar mensajes.
+        cleanup_interval (int): Cada cuántos segundos se purgan mensajes y grupos expirados.
+    """
+    extensions = ['groups', 'flush']
+
+    def __init__(
+        self,
+        database='default',
+        expiry=60,
+        group_expiry=86400,
+        capacity=100,
+        channel_capacity=None,
+        pool_size=4,
+        cleanup_interval=30,
+        **kwargs,
+    ):
+        super().__init__(expiry=expiry, capacity=capacity, **kwargs)
+        self.channel_capacity = self.compile_capacities(channel_capacity or {})
+        self.database = database
+        self.group_expiry = group_expiry
+        self.pool_size = pool_size
+        self.cleanup_interval = cleanup_interval
+
+        # Identifica a este proceso dentro de los nombres de canal
+        self.client_prefix = uuid.uuid4().hex[:12]
+        self.notify_channel = f'{NOTIFY_CHANNEL_PREFIX}{self.client_prefix}'
+
+        self._connection_kwargs = self._build_connection_kwargs()
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._inboxes = {}
+        self._inboxes_lock = threading.Lock()
+        self._listener = None
+        self._listener_lock = threading.Lock()
+        self._stop = threading.Event()
+        # Canales con mensajes que no cupieron en su buzón y siguen en la tabla
+        self._backlogged = set()
+        self._refetch = threading.Event()
+
+    def _build_connection_kwargs(self):
+        db_settings = settings.DATABASES[self.database]
+        if 'postgresql' not in db_settings['ENGINE']:
+            raise ImproperlyConfigured(
+                f"PostgresChannelLayer requiere una base de datos PostgreSQL "
+                f"(DATABASES['{self.database}'] usa {db_settings['ENGINE']})."
+            )
+        kwargs = {
+            'dbname': db_settings.get('NAME'),
+            'user': db_settings.get('USER'),
+            'password': db_settings.get('PASSWORD'),
+            'host': db_settings.get('HOST'),
+            'port': db_settings.get('PORT'),
+        }
+        kwargs.update(db_settings.get('OPTIONS', {}))
+        return {key: value for key, value in kwargs.items() if value}
+
+    # Conexiones
+
+    def _get_pool(self):
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = pg_pool.ThreadedConnectionPool(1, self.pool_size, **self._connection_kwargs)
+            return self._pool
+
+    @contextmanager
+    def _cursor(self):
+        """
+        Cursor de una conexión del pool dentro de una transacción.
+        """
+        connection_pool = self._get_pool()
+        conn = connection_pool.getconn()
+        broken = False
+        try:
+            with conn:
+                with conn.cursor() as cursor:
+                    yield cursor
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        finally:
+            connection_pool.putconn(conn, close=broken or bool(conn.closed))
+
+    async def _run(self, function, *args):
+        # psycopg2 es bloqueante: las consultas se ejecutan en el executor del loop
+        return await asyncio.get_running_loop().run_in_executor(None, function, *args)
+
+    # Nombres
+
+    def _client_prefix_of(self, channel):
+        if '!' not in channel:
+            raise NotImplementedError(
+                'PostgresChannelLayer solo admite canales específicos de proceso (creados con new_channel()).'
+            )
+        return channel[:channel.find('!')].rsplit('.', 1)[-1]
+
+    async def new_channel(self, prefix='specific.'):
+        """
+        Devuelve un nuevo canal específico de este proceso.
+        """
+        self._ensure_listener()
+        token = ''.join(random.choice(string.ascii_letters) for _ in range(12))
+        return f'{prefix}{self.client_prefix}!{token}'
+
+    # Envío
+
+    def _encode(self, message):
+        assert isinstance(message, dict), 'message is not a dict'
+        return json.dumps(message, cls=DjangoJSONEncoder)
+
+    def _send_sync(self, channel, client_prefix, payload, capacity):
+        with self._cursor() as cursor:
+            # Solo se inserta si el canal tiene menos de 'capacity' mensajes sin retirar
+            cursor.execute(
+                sql.SQL("""
+                    WITH inserted AS (
+                        INSERT INTO {messages} (channel, client_prefix, payload, expires_at)
+                        SELECT %s, %s, %s, now() + %s * interval '1 second'
+                        WHERE (
+                            SELECT count(*) FROM {messages}
+                            WHERE client_prefix = %s AND channel = %s AND expires_at > now()
+                        ) < %s
+                        RETURNING client_prefix
+                    )
+                    SELECT pg_notify(%s || client_prefix, '') FROM inserted
+                """).format(messages=sql.Identifier(MESSAGE_TABLE)),
+                [
+                    channel, client_prefix, payload, self.expiry,
+                    client_prefix, channel, capacity, NOTIFY_CHANNEL_PREFIX,
+                ]
+            )
+            return bool(cursor.fetchall())
+
+    async def send(self, channel, message):
+        """
+        Envía un mensaje a un canal específico de cualquier proceso.
+
+        Raises:
+            ChannelFull: Si el canal ya tiene su capacidad de mensajes sin entregar.
+        """
+        self.require_valid_channel_name(channel)
+        sent = await self._run(
+            self._send_sync, channel, self._client_prefix_of(channel), self._encode(message),
+            self.get_capacity(channel)
+        )
+        if not sent:
+            raise ChannelFull(channel)
+
+    def _group_send_sync(self, group, payload):
+        with self._cursor() as cursor:
+            # Un mensaje por miembro con hueco y una notificación por proceso destinatario
+            cursor.execute(
+                sql.SQL("""
+                    WITH inserted AS (
+                        INSERT INTO {messages} (channel, client_prefix, payload, expires_at)
+                        SELECT member.channel, member.client_prefix, %s, now() + %s * interval '1 second'
+                        FROM {groups} AS member
+                        WHERE member.group_name = %s AND member.expires_at > now() AND (
+                            SELECT count(*) FROM {messages} AS pending
+                            WHERE pending.client_prefix = member.client_prefix
+                                AND pending.channel = member.channel AND pending.expires_at > now()
+                        ) < %s
+                        RETURNING client_prefix
+                    )
+                    SELECT pg_notify(%s || client_prefix, '')
+                    FROM (SELECT DISTINCT client_prefix FROM inserted) AS recipients
+                """).format(
+                    messages=sql.Identifier(MESSAGE_TABLE),
+                    groups=sql.Identifier(GROUP_TABLE),
+                ),
+                [payload, self.expiry, group, self.capacity, NOTIFY_CHANNEL_PREFIX]
+            )
+
+    async def group_send(self, group, message):
+        """
+        Envía un mensaje a todos los canales del grupo, estén en el proceso que estén.
+        Los canales llenos (con 'capacity' mensajes sin retirar) se omiten.
+        """
+        self.require_valid_group_name(group)
+        await self._run(self._group_send_sync, group, self._encode(message))
+
+    # Grupos
+
+    def _group_add_sync(self, group, channel, client_prefix):
+        with self._cursor() as cursor:
+            cursor.execute(
+                sql.SQL("""
+                    INSERT INTO {groups} (group_name, channel, client_prefix, expires_at)
+                    VALUES (%s, %s, %s, now() + %s * interval '1 second')
+                    ON CONFLICT (group_name, channel) DO UPDATE SET expires_at = EXCLUDED.expires_at
+                """).format(groups=sql.Identifier(GROUP_TABLE)),
+                [group, channel, client_prefix, self.group_expiry]
+            )
+
+    async def group_add(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        await self._run(self._group_add_sync, group, channel, self._client_prefix_of(channel))
+
+    def _group_discard_sync(self, group, channel):
+        with self._cursor() as cursor:
+            cursor.execute(
+                sql.SQL('DELETE FROM {groups} WHERE group_name = %s AND channel = %s').format(
+                    groups=sql.Identifier(GROUP_TABLE)
+                ),
+                [group, channel]
+            )
+
+    async def group_discard(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        await self._run(self._group_discard_sync, group, channel)
+
+    # Recepción
+
+    async def receive(self, channel):
+        """
+        Espera el siguiente mensaje de un canal específico de este proceso.
+        """
+        self.require_valid_channel_name(channel)
+        if self._client_prefix_of(channel) != self.client_prefix:
+            raise ValueError(f'El canal {channel} no pertenece a este proceso.')
+        self._ensure_listener()
+
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._inboxes_lock:
+                inbox = self._inboxes.setdefault(channel, _Inbox())
+                message = inbox.pop()
+                if message is not None:
+                    if channel in self._backlogged:
+                        # Hay hueco: el oyente retira lo que esperaba en la tabla
+                        self._backlogged.discard(channel)
+                        self._refetch.set()
+                    return message
+                waiter = loop.create_future()
+                inbox.waiters.append((loop, waiter))
+            try:
+                await waiter
+            finally:
+                with self._inboxes_lock:
+                    if (loop, waiter) in inbox.waiters:
+                        inbox.waiters.remove((loop, waiter))
+                    if not inbox.messages and not inbox.waiters:
+                        self._inboxes.pop(channel, None)
+
+    def _deliver(self, rows):
+        """
+        Reparte los mensajes retirados de la tabla entre los canales locales (hilo oyente).
+        """
+        expires_at = time.monotonic() + self.expiry
+        to_wake = []
+        with self._inboxes_lock:
+            for channel, payload in rows:
+                inbox = self._inboxes.setdefault(channel, _Inbox())
+                inbox.messages.append((expires_at, json.loads(payload)))
+                to_wake.extend(inbox.waiters)
+                inbox.waiters = []
+        for loop, waiter in to_wake:
+            try:
+                loop.call_soon_threadsafe(_wake, waiter)
+            except RuntimeError:
+                # El loop de la corrutina ya se cerró
+                pass
+
+    # Hilo oyente
+
+    def _ensure_listener(self):
+        if self._listener is not None and self._listener.is_alive():
+            return
+        with self._listener_lock:
+            if self._listener is not None and self._listener.is_alive():
+                return
+            self._stop.clear()
+            self._listener = threading.Thread(
+                target=self._listen_forever, name=f'channels-listener-{self.client_prefix}', daemon=True
+            )
+            self._listener.start()
+
+    def _listen_forever(self):
+        backoff = 0.5
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(**self._connection_kwargs)
+                conn.autocommit = True
+                with conn.cursor() as cursor:
+                    cursor.execute(sql.SQL('LISTEN {}').format(sql.Identifier(self.notify_channel)))
+                backoff = 0.5
+                # Mensajes que llegaron antes del LISTEN o durante una reconexión
+                self._fetch_pending(conn)
+                self._listen(conn)
+            except psycopg2.Error:
+                logger.exception('Error en el oyente de la capa de canales; reintentando en %.1fs', backoff)
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 10)
+            finally:
+                if conn is not None and not conn.closed:
+                    conn.close()
+
+    def _listen(self, conn):
+        next_cleanup = time.monotonic() + self.cleanup_interval
+        while not self._stop.is_set():
+            # Con canales en espera se vuelve pronto para retirar lo que ya cabe
+            readable, _, _ = select.select([conn], [], [], 0.05 if self._backlogged else 1.0)
+            if readable:
+                conn.poll()
+            if conn.notifies or self._refetch.is_set():
+                # Varias notificaciones se atienden con una sola consulta
+                conn.notifies.clear()
+                self._refetch.clear()
+                self._fetch_pending(conn)
+            if time.monotonic() >= next_cleanup:
+                self._cleanup(conn)
+                self._prune_inboxes()
+                next_cleanup = time.monotonic() + self.cleanup_interval
+
+    def _fetch_pending(self, conn):
+        with conn.cursor() as cursor:
+            cursor.execute(
+                sql.SQL('SELECT id, channel FROM {messages} WHERE client_prefix = %s ORDER BY id').format(
+                    messages=sql.Identifier(MESSAGE_TABLE)
+                ),
+                [self.client_prefix]
+            )
+            claimed = self._claim(cursor.fetchall())
+            if not claimed:
+                return
+            cursor.execute(
+                sql.SQL("""
+                    DELETE FROM {messages}
+                    WHERE id = ANY(%s)
+                    RETURNING id, channel, payload, expires_at > now()
+                """).format(messages=sql.Identifier(MESSAGE_TABLE)),
+                [claimed]
+            )
+            rows = sorted(cursor.fetchall())
+        self._deliver([(channel, payload) for _, channel, payload, alive in rows if alive])
+
+    def _claim(self, pending):
+        """
+        IDs de los mensajes pendientes (id, canal) que caben en el buzón de su canal; los
+        canales con mensajes que no caben quedan marcados para volver a retirar.
+        """
+        claimed = []
+        room = {}
+        with self._inboxes_lock:
+            for message_id, channel in pending:
+                if channel not in room:
+                    inbox = self._inboxes.get(channel)
+                    room[channel] = self.get_capacity(channel) - (len(inbox.messages) if inbox else 0)
+                if room[channel] > 0:
+                    room[channel] -= 1
+                    claimed.append(message_id)
+                else:
+                    self._backlogged.add(channel)
+        return claimed
+
+    def _cleanup(self, conn):
+        """
+        Purga mensajes expirados y saca de sus grupos a los canales que no los recogieron
+        (procesos caídos), igual que InMemoryChannelLayer.
+        """
+        with conn.cursor() as cursor:
+            cursor.execute(
+                sql.SQL("""
+                    WITH expired AS (
+                        DELETE FROM {messages} WHERE expires_at < now() RETURNING channel
+                    )
+                    DELETE FROM {groups}
+                    WHERE expires_at < now() OR channel IN (SELECT channel FROM expired)
+                """).format(
+                    messages=sql.Identifier(MESSAGE_TABLE),
+                    groups=sql.Identifier(GROUP_TABLE),
+                )
+            )
+
+    def _prune_inboxes(self):
+        # Canales sin receptor (consumers ya desconectados) cuyos mensajes expiraron
+        now = time.monotonic()
+        with self._inboxes_lock:
+            for channel, inbox in list(self._inboxes.items()):
+                if not inbox.waiters and all(expires_at < now for expires_at, _ in inbox.messages):
+                    del self._inboxes[channel]
+
+    # Flush / cierre
+
+    def _flush_sync(self):
+        with self._cursor() as cursor:
+            cursor.execute(sql.SQL('DELETE FROM {}').format(sql.Identifier(MESSAGE_TABLE)))
+            cursor.execute(sql.SQL('DELETE FROM {}').format(sql.Identifier(GROUP_TABLE)))
+
+    async def flush(self):
+        await self._run(self._flush_sync)
+        with self._inboxes_lock:
+            self._inboxes = {}
+            self._backlogged.clear()
+
+    def _close_sync(self):
+        # Este proceso deja de recibir: sus canales ya no pertenecen a ningún grupo
+        with self._cursor() as cursor:
+            cursor.execute(
+                sql.SQL('DELETE FROM {} WHERE client_prefix = %s').format(sql.Identifier(GROUP_TABLE)),
+                [self.client_prefix]
+            )
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.closeall()
+                self._pool = None
+
+    async def close(self):
+        self._stop.set()
+        if self._listener is not None:
+            await self._run(self._listener.join)
+            self._listener = None
+        await self._run(self._close_sync)
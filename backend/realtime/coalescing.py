@@ -0,0 +1,99 @@
+import logging
+import threading
+from typing import Any, Callable, Dict, Hashable
+
+from django.conf import settings
+
+from .dispatcher import notification_dispatcher
+from .frames import encode_frame
+from .models import OutboxEvent
+from .outbox import outbox
+
+logger = logging.getLogger(__name__)
+
+
+class EventCoalescer:
+    """
+    Agrega los eventos del outbox que llegan para la misma clave dentro de una ventana.
+
+    El primer evento de una clave abre la ventana; los siguientes se fusionan con
+    merge(acumulado, nuevo). Al cerrarse, se encola un único mensaje con el frame
+    codificado una vez, y al entregarse se marcan como publicados todos los eventos
+    fusionados. La latencia añadida está acotada por la ventana aunque sigan llegando
+    eventos.
+
+    Un evento inmediato sobre la misma clave debe llamar antes a flush(key) para no
+    adelantar al estado agregado pendiente (ej. match_deleted tras un match_state).
+
+    Cada evento ya está guardado en el outbox: si el proceso cae con una ventana
+    abierta, relay_outbox los reenvía uno a uno (sin agregar).
+    """
+
+    def __init__(
+        self,
+        merge: Callable[[Dict[str, Any], Dict[str, Any]], Dict[str, Any]],
+        window_setting: str,
+        default_window_ms: int = 200,
+    ):
+        """
+        Args:
+            merge (callable): Fusiona los datos acumulados con los de un evento nuevo y
+                devuelve un diccionario nuevo.
+            window_setting (str): Setting con la ventana en milisegundos (0 desactiva la
+                agregación).
+            default_window_ms (int): Ventana si el setting no existe.
+        """
+        self._merge = merge
+        self._window_setting = window_setting
+        self._default_window_ms = default_window_ms
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    @property
+    def window_ms(self) -> int:
+        return getattr(settings, self._window_setting, self._default_window_ms)
+
+    def add(self, event: OutboxEvent, key: Hashable) -> None:
+        """
+        Añade un evento confirmado a la ventana de (grupo, tipo, key).
+
+        Args:
+            event (OutboxEvent): Evento recién confirmado (se usa como dispatch del outbox).
+            key (hashable): Clave de agregación dentro del grupo (ej. el id del partido).
+        """
+        window_key = (event.group_name, event.event_type, key)
+        with self._lock:
+            pending = self._pending.get(window_key)
+            if pending is not None:
+                pending['data'] = self._merge(pending['data'], event.payload)
+                pending['event_ids'].append(event.id)
+                return
+            self._pending[window_key] = {'data': event.payload, 'event_ids': [event.id]}
+
+        window_ms = self.window_ms
+        if window_ms <= 0:
+            self._flush(window_key)
+        else:
+            notification_dispatcher.call_later(window_ms / 1000, self._flush, window_key)
+
+    def flush(self, key: Hashable) -> None:
+        """
+        Cierra ya las ventanas abiertas de key (en cualquier grupo), de modo que su
+        mensaje se encole antes que lo que se publique a continuación.
+        """
+        with self._lock:
+            window_keys = [window_key for window_key in self._pending if window_key[2] == key]
+        for window_key in window_keys:
+            self._flush(window_key)
+
+    def _flush(self, window_key) -> None:
+        with self._lock:
+            pending = self._pending.pop(window_key, None)
+        if pending is None:
+            return
+
+        group, event_type, _ = window_key
+        message = {'type': event_type, 'frame': encode_frame(event_type, pending['data'])}
+        notification_dispatcher.enqueue(group, message, ack=(outbox.mark_published, tuple(pending['event_ids'])))
+        if len(pending['event_ids']) > 1:
+            logger.debug('%s eventos %s fusionados para %s', len(pending['event_ids']), event_type, group)
@@ -0,0 +1,160 @@
+import json
+
+from channels.generic.websocket import AsyncWebsocketConsumer
+
+from bookings.consumers import BookingTopic
+from chat.consumers import ChatTopic
+from matches.consumers import MatchTopic
+from users.consumers import UserTopic
+
+from .frames import with_topic
+from .multiplex import TopicError
+
+# Temas disponibles en el socket multiplexado, por nombre
+TOPICS = {topic.name: topic for topic in (BookingTopic, MatchTopic, UserTopic, ChatTopic)}
+
+# Tipo de evento de la capa de canales -> tema que lo recibe
+EVENT_TOPICS = {event_type: topic for topic in TOPICS.values() for event_type in topic.event_types()}
+
+# Límite de temas a los que se puede suscribir una conexión
+MAX_TOPICS_PER_CONNECTION = 20
+
+
+class MultiplexConsumer(AsyncWebsocketConsumer):
+    """
+    Socket único para todos los flujos en tiempo real.
+
+    El cliente abre una sola conexión (un handshake y una autenticación) y se suscribe
+    a los temas con frames de control:
+
+        {"action": "subscribe", "topic": "bookings", "params": {"courts": [1, 2]}}
+        {"action": "subscribe", "topic": "chat", "params": {"match_id": 12}}
+        {"action": "send", "topic": "chat:12", "data": {"message": "Hola"}}
+        {"action": "unsubscribe", "topic": "chat:12"}
+
+    Respuestas: {"type": "subscribed"|"unsubscribed", "topic": clave} o
+    {"type": "error", "topic": clave, "code": ..., "message": ...}. Los eventos llevan
+    la clave del tema: {"topic": "chat:12", "type": "chat_message", ...}.
+
+    Cada tema usa los mismos grupos y validaciones que su consumer dedicado, que sigue
+    disponible. Un grupo compartido por varios temas se une una sola vez.
+    """
+
+    async def connect(self):
+        # El usuario ya viene autenticado por el JWTAuthMiddleware
+        user = self.scope.get('user')
+
+        if not user or user.is_anonymous:
+            await self.close()
+            return
+
+        self.topics = {}
+        self.group_topics = {}
+
+        accepted_subprotocol = self.scope.get('accepted_subprotocol')
+        await self.accept(subprotocol=accepted_subprotocol)
+
+    async def disconnect(self, close_code):
+        for group_name in list(getattr(self, 'group_topics', {})):
+            await self.channel_layer.group_discard(group_name, self.channel_name)
+        for topic in getattr(self, 'topics', {}).values():
+            await topic.close()
+        self.group_topics = {}
+        self.topics = {}
+
+    async def receive(self, text_data):
+        try:
+            data = json.loads(text_data)
+        except (TypeError, ValueError):
+            await self.send_control('error', None, code=4000, message='Mensaje JSON inválido.')
+            return
+        if not isinstance(data, dict):
+            await self.send_control('error', None, code=4000, message='Mensaje JSON inválido.')
+            return
+
+        action = data.get('action')
+        topic_key = data.get('topic')
+        try:
+            if action == 'subscribe':
+                await self.subscribe(topic_key, data.get('params') or {})
+            elif action == 'unsubscribe':
+                await self.unsubscribe(topic_key)
+            elif action == 'send':
+                topic = self.topics.get(topic_key)
+                if topic is None:
+                    raise TopicError(4000, 'No estás suscrito a este tema.')
+                await topic.receive(data.get('data') or {})
+            else:
+                raise TopicError(4000, 'Acción no soportada.')
+        except TopicError as e:
+            await self.send_control('error', topic_key, code=e.code, message=e.message)
+
+    async def subscribe(self, name, params):
+        topic_class = TOPICS.get(name)
+        if topic_class is None or not isinstance(params, dict):
+            raise TopicError(4000, 'Tema no soportado.')
+
+        topic = topic_class(self, params)
+        previous = self.topics.get(topic.key)
+        if previous is None and len(self.topics) >= MAX_TOPICS_PER_CONNECTION:
+            raise TopicError(4029, 'Demasiados temas en esta conexión.')
+
+        groups = await topic.get_groups()
+        # Volver a suscribirse a un tema reemplaza sus parámetros (ej. otras pistas)
+        if previous is not None:
+            await self.remove_topic(previous)
+        self.topics[topic.key] = topic
+        for group_name in groups:
+            await self.add_topic_group(topic, group_name)
+        await self.send_control('subscribed', topic.key)
+
+    async def unsubscribe(self, topic_key):
+        topic = self.topics.get(topic_key)
+        if topic is None:
+            raise TopicError(4000, 'No estás suscrito a este tema.')
+        await self.remove_topic(topic)
+        await self.send_control('unsubscribed', topic_key)
+
+    async def remove_topic(self, topic):
+        for group_name in list(topic.groups):
+            await self.discard_topic_group(topic, group_name)
+        self.topics.pop(topic.key, None)
+        await topic.close()
+
+    async def add_topic_group(self, topic, group_name):
+        topic.groups.add(group_name)
+        keys = self.group_topics.get(group_name)
+        if keys is None:
+            keys = self.group_topics[group_name] = set()
+            await self.channel_layer.group_add(group_name, self.channel_name)
+        keys.add(topic.key)
+
+    async def discard_topic_group(self, topic, group_name):
+        topic.groups.discard(group_name)
+        keys = self.group_topics.get(group_name)
+        if keys is None:
+            return
+        keys.discard(topic.key)
+        if not keys:
+            del self.group_topics[group_name]
+            await self.channel_layer.group_discard(group_name, self.channel_name)
+
+    async def dispatch(self, message):
+        topic_class = EVENT_TOPICS.get(message['type'])
+        if topic_class is None:
+            # websocket.connect/receive/disconnect
+            await super().dispatch(message)
+            return
+
+        # Eventos de un tema ya cancelado (ej. en vuelo al desuscribirse) se descartan
+        topic = getattr(self, 'topics', {}).get(topic_class.key_for_event(message))
+        if topic is None:
+            return
+        if message['type'] in topic_class.control_events:
+            await topic.handle_control(message)
+            return
+        for frame in topic.frames(message):
+            await self.send(text_data=with_topic(frame, topic.key))
+
+    async def send_control(self, message_type, topic_key, **fields):
+        await self.send(text_data=json.dumps({'type': message_type, 'topic': topic_key, **fields}))
@@ -0,0 +1,251 @@
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Dict
+
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class NotificationDispatcher:
+    """
+    Cola de salida de eventos WebSocket, desacoplada de las peticiones HTTP.
+
+    enqueue() guarda el evento en un buffer acotado y vuelve de inmediato (O(1)); una
+    tarea en segundo plano lo vacía por lotes y hace group_send. Dentro de un lote los
+    eventos de grupos distintos se envían en paralelo y los de un mismo grupo en el
+    orden en que se encolaron, así que el orden por grupo se mantiene.
+
+    Si un group_send falla, ese grupo deja de enviarse en el lote: el evento fallido y
+    los siguientes del grupo vuelven al principio del buffer, en orden, y se reintentan
+    tras NOTIFICATION_RETRY_DELAY segundos. Tras NOTIFICATION_MAX_ATTEMPTS intentos se
+    descartan y se contabilizan como fallidos.
+
+    La tarea se ejecuta en el loop del servidor ASGI (el mismo que atiende los
+    WebSockets, lo que es necesario para InMemoryChannelLayer), que registra
+    DispatcherLoopMiddleware con bind_loop() al recibir cada conexión. Fuera de ASGI
+    (comandos, shell, tests síncronos) se usa un loop propio en un hilo del proceso.
+
+    Si el buffer está lleno el evento se descarta y se contabiliza: una vista nunca se
+    bloquea esperando a la capa de canales.
+
+    Solo se recuperan los eventos respaldados por el outbox (realtime.outbox), y solo
+    mientras relay_outbox esté en marcha: sus filas siguen pendientes hasta que un acuse
+    las marca como publicadas. Un evento sin outbox descartado (buffer lleno o
+    reintentos agotados) se pierde.
+
+    Un evento puede llevar un acuse (ack): tras enviar cada lote se llama una sola vez a
+    cada manejador con las claves de los eventos entregados (ej. el outbox marca sus
+    filas como publicadas).
+    """
+
+    def __init__(self, max_size: int = None, batch_size: int = None):
+        self._max_size = max_size
+        self._batch_size = batch_size
+        self._buffer = deque()
+        self._lock = threading.Lock()
+        self._draining_loop = None
+        self._main_loop = None
+        self._fallback_loop = None
+        self._counters = {
+            'enqueued': 0,
+            'delivered': 0,
+            'dropped': 0,
+            'failed': 0,
+            'batches': 0,
+            'max_depth': 0,
+        }
+        self._total_wait = 0.0
+        self._last_batch_ms = 0.0
+
+    @property
+    def max_size(self) -> int:
+        return self._max_size or getattr(settings, 'NOTIFICATION_QUEUE_MAX_SIZE', 1000)
+
+    @property
+    def batch_size(self) -> int:
+        return self._batch_size or getattr(settings, 'NOTIFICATION_QUEUE_BATCH_SIZE', 100)
+
+    @property
+    def max_attempts(self) -> int:
+        return getattr(settings, 'NOTIFICATION_MAX_ATTEMPTS', 3)
+
+    @property
+    def retry_delay(self) -> float:
+        return getattr(settings, 'NOTIFICATION_RETRY_DELAY', 0.5)
+
+    def enqueue(self, group: str, message: Dict[str, Any], ack=None) -> bool:
+        """
+        Encola un evento para un grupo de la capa de canales.
+
+        Args:
+            group (str): Nombre del grupo (ej. 'bookings').
+            message (dict): Evento con la clave 'type' del handler del consumer.
+            ack (tuple, optional): (manejador, clave). El manejador se ejecuta en un hilo
+                con la lista de claves de los eventos entregados del lote.
+
+        Returns:
+            bool: False si el buffer estaba lleno y el evento se descartó (si no está
+                respaldado por el outbox, se pierde).
+        """
+        with self._lock:
+            if len(self._buffer) >= self.max_size:
+                self._counters['dropped'] += 1
+                logger.warning('Cola de notificaciones llena; se descarta %s para %s', message.get('type'), group)
+                return False
+            self._buffer.append((group, message, time.monotonic(), ack, 0))
+            self._counters['enqueued'] += 1
+            self._counters['max_depth'] = max(self._counters['max_depth'], len(self._buffer))
+
+            if self._draining_loop is not None and self._draining_loop.is_running():
+                return True
+            loop = self._target_loop()
+            self._draining_loop = loop
+        # Contexto vacío: la tarea no hereda el de la petición (el executor de
+        # sync_to_async en uso), lo que haría fallar los acuses con database_sync_to_async
+        loop.call_soon_threadsafe(self._start_drain, context=contextvars.Context())
+        return True
+
+    def call_later(self, delay: float, callback, *args) -> None:
+        """
+        Programa callback(*args) en el loop de envío tras delay segundos (ej. cerrar una
+        ventana de agregación de eventos). Se puede llamar desde cualquier hilo.
+        """
+        loop = self._target_loop()
+        loop.call_soon_threadsafe(loop.call_later, delay, callback, *args, context=contextvars.Context())
+
+    def bind_loop(self, loop) -> None:
+        """
+        Registra el loop del servidor ASGI, en el que se harán los envíos.
+        """
+        self._main_loop = loop
+
+    def _target_loop(self):
+        # Loop del servidor ASGI, también desde los hilos de sync_to_async de las vistas
+        main_loop = self._main_loop
+        if main_loop is not None and main_loop.is_running():
+            return main_loop
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if running_loop is not None:
+            return running_loop
+        return self._get_fallback_loop()
+
+    def _get_fallback_loop(self):
+        if self._fallback_loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name='notification-dispatcher', daemon=True).start()
+            self._fallback_loop = loop
+        return self._fallback_loop
+
+    def _start_drain(self):
+        asyncio.get_running_loop().create_task(self._drain())
+
+    async def _drain(self):
+        channel_layer = get_channel_layer()
+        while True:
+            with self._lock:
+                if not self._buffer:
+                    self._draining_loop = None
+                    return
+                batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+            if await self._send_batch(channel_layer, batch):
+                await asyncio.sleep(self.retry_delay)
+
+    async def _send_batch(self, channel_layer, batch) -> bool:
+        """
+        Envía un lote y devuelve True si algún grupo quedó pendiente de reintento.
+        """
+        start = time.monotonic()
+        by_group = {}
+        for group, message, enqueued_at, ack, attempts in batch:
+            by_group.setdefault(group, []).append((message, enqueued_at, ack, attempts))
+
+        results = await asyncio.gather(
+            *(self._send_group(channel_layer, group, events) for group, events in by_group.items())
+        )
+
+        finished = time.monotonic()
+        acks = {}
+        retries = []
+        with self._lock:
+            self._counters['batches'] += 1
+            for group, (delivered, wait, delivered_acks, pending) in zip(by_group, results):
+                self._counters['delivered'] += delivered
+                self._total_wait += wait
+                for handler, key in delivered_acks:
+                    acks.setdefault(handler, []).append(key)
+                if not pending:
+                    continue
+                if pending[0][3] >= self.max_attempts:
+                    self._counters['failed'] += len(pending)
+                    logger.error(
+                        'Se descartan %s eventos del grupo %s tras %s intentos', len(pending), group, pending[0][3]
+                    )
+                    continue
+                retries.extend((group, *event) for event in pending)
+            # Por delante de lo encolado después, para no adelantar eventos del mismo grupo
+            self._buffer.extendleft(reversed(retries))
+            self._last_batch_ms = (finished - start) * 1000
+
+        for handler, keys in acks.items():
+            try:
+                await database_sync_to_async(handler)(keys)
+            except Exception:
+                logger.exception('Error confirmando %s eventos entregados', len(keys))
+        return bool(retries)
+
+    async def _send_group(self, channel_layer, group, events):
+        """
+        Envía en orden los eventos de un grupo hasta el primer fallo.
+
+        Returns:
+            tuple: (entregados, espera acumulada, acuses de los entregados, eventos sin
+                enviar empezando por el fallido, con su número de intentos ya sumado).
+        """
+        delivered = 0
+        wait = 0.0
+        delivered_acks = []
+        for position, (message, enqueued_at, ack, attempts) in enumerate(events):
+            try:
+                if channel_layer is not None:
+                    await channel_layer.group_send(group, message)
+            except Exception:
+                logger.exception('Error enviando %s al grupo %s', message.get('type'), group)
+                return delivered, wait, delivered_acks, [(message, enqueued_at, ack, attempts + 1)] + events[position + 1:]
+            delivered += 1
+            wait += time.monotonic() - enqueued_at
+            if ack is not None:
+                delivered_acks.append(ack)
+        return delivered, wait, delivered_acks, []
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Devuelve las métricas de la cola de este proceso.
+
+        Returns:
+            dict: Contadores, profundidad actual y máxima, tamaño medio de lote,
+                espera media en cola y duración del último lote (ms).
+        """
+        with self._lock:
+            stats = dict(self._counters)
+            stats['depth'] = len(self._buffer)
+            stats['capacity'] = self.max_size
+            stats['avg_batch_size'] = (
+                round((stats['delivered'] + stats['failed']) / stats['batches'], 2) if stats['batches'] else 0.0
+            )
+            stats['retrying'] = sum(1 for event in self._buffer if event[4])
+            stats['avg_wait_ms'] = round(self._total_wait / stats['delivered'] * 1000, 3) if stats['delivered'] else 0.0
+            stats['last_batch_ms'] = round(self._last_batch_ms, 3)
+        return stats
+
+
+notification_dispatcher = NotificationDispatcher()
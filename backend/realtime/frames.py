@@ -0,0 +1,71 @@
+import json
+from typing import Any, Dict, Iterable
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+try:
+    import orjson
+except ImportError:  # Dependencia opcional: sin ella se usa json de la biblioteca estándar
+    orjson = None
+
+_django_encoder = DjangoJSONEncoder()
+
+
+def fast_json_enabled() -> bool:
+    """
+    Indica si los frames se codifican con orjson (instalado y WEBSOCKET_FAST_JSON activo).
+    """
+    return orjson is not None and getattr(settings, 'WEBSOCKET_FAST_JSON', True)
+
+
+def encode_frame(event_type: str, data: Dict[str, Any]) -> str:
+    """
+    Codifica una sola vez el texto que reciben los clientes WebSocket.
+
+    El notificador llama a esta función y publica el resultado en la clave 'frame' del
+    evento; los consumers lo reenvían sin volver a serializarlo, así que el coste de
+    json.dumps es uno por evento y no uno por conexión.
+
+    Args:
+        event_type (str): Tipo del evento (ej. 'booking_created').
+        data (dict): Campos del evento que ve el cliente.
+
+    Returns:
+        str: JSON {'type': event_type, **data}.
+    """
+    message = {'type': event_type, **data}
+    if fast_json_enabled():
+        # Decimal, UUID, etc. se convierten como lo hace DjangoJSONEncoder
+        return orjson.dumps(message, default=_django_encoder.default).decode()
+    return json.dumps(message, cls=DjangoJSONEncoder)
+
+
+def with_topic(frame: str, topic: str) -> str:
+    """
+    Añade la clave 'topic' a un frame ya codificado sin volver a serializarlo.
+
+    Args:
+        frame (str): Objeto JSON generado por encode_frame.
+        topic (str): Clave del tema en el socket multiplexado (ej. 'chat:12').
+
+    Returns:
+        str: JSON {'topic': topic, **frame}.
+    """
+    return '{"topic":' + json.dumps(topic) + ',' + frame[1:]
+
+
+class PreEncodedFrameMixin:
+    """
+    Mixin para consumers: reenvía el frame precodificado del evento.
+    """
+
+    async def send_frame(self, event: Dict[str, Any], fields: Iterable[str]):
+        """
+        Envía event['frame'] tal cual. Los eventos sin frame (ej. registrados en el outbox
+        antes de este cambio) se codifican aquí con los campos indicados.
+        """
+        frame = event.get('frame')
+        if frame is None:
+            frame = encode_frame(event['type'], {name: event[name] for name in fields})
+        await self.send(text_data=frame)
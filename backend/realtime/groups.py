@@ -0,0 +1,39 @@
+"""
+Nombres de los grupos de la capa de canales.
+
+Cada evento se envía al grupo más estrecho que lo necesita, de modo que el coste de un
+group_send crece con los suscriptores interesados y no con el total de conexiones:
+
+- Grupos de administración (staff): ven todos los eventos de su dominio.
+- Grupos por usuario: eventos de los datos propios y avisos de control del consumer.
+- Grupos por pista: disponibilidad de una pista, sin datos personales.
+- Grupos por partido: detalle de participantes y avisos del chat de un partido.
+- Feed de partidos abiertos: el listado público de partidos.
+- Salas de chat: mensajes y estado de escritura de los participantes de un partido.
+
+Los grupos por usuario llevan el dominio en el nombre porque cada consumer solo tiene
+handlers para sus propios eventos.
+"""
+
+BOOKINGS_ADMIN_GROUP = 'bookings_admin'
+USERS_ADMIN_GROUP = 'users_admin'
+OPEN_MATCHES_GROUP = 'matches'
+
+
+def user_group(domain: str, user_id) -> str:
+    """
+    Grupo de un usuario dentro de un dominio (ej. user_group('bookings', 7) -> 'bookings_user_7').
+    """
+    return f'{domain}_user_{user_id}'
+
+
+def court_group(court_id) -> str:
+    return f'court_{court_id}'
+
+
+def match_group(match_id) -> str:
+    return f'match_{match_id}'
+
+
+def chat_group(match_id) -> str:
+    return f'chat_{match_id}'
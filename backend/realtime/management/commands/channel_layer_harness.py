@@ -0,0 +1,142 @@
+import asyncio
+import multiprocessing
+import queue
+import statistics
+import time
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+def _worker(worker_id, group, expected, timeout, ready_queue, result_queue):
+    """
+    Proceso que simula un worker de Daphne: se une al grupo y cuenta lo que recibe.
+    """
+    import django
+    django.setup()
+    from channels.layers import get_channel_layer
+
+    async def run():
+        layer = get_channel_layer()
+        channel = await layer.new_channel()
+        await layer.group_add(group, channel)
+        ready_queue.put(worker_id)
+
+        received = []
+        latencies = []
+        deadline = time.monotonic() + timeout
+        try:
+            while len(received) < expected:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    message = await asyncio.wait_for(layer.receive(channel), remaining)
+                except asyncio.TimeoutError:
+                    break
+                received.append(message['seq'])
+                latencies.append((time.time() - message['sent_at']) * 1000)
+        finally:
+            await layer.group_discard(group, channel)
+            if hasattr(layer, 'close'):
+                await layer.close()
+
+        result_queue.put({
+            'worker': worker_id,
+            'backend': type(layer).__name__,
+            'received': len(received),
+            'in_order': received == sorted(received),
+            'latencies': latencies,
+        })
+
+    asyncio.run(run())
+
+
+class Command(BaseCommand):
+    help = (
+        'Arranca varios procesos worker contra la misma base de datos y comprueba que '
+        'group_send de la capa de canales configurada llega a todos ellos.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=3, help='Número de procesos receptores.')
+        parser.add_argument('--messages', type=int, default=200, help='Mensajes a enviar al grupo.')
+        parser.add_argument('--timeout', type=float, default=30, help='Segundos máximos de espera por worker.')
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        messages = options['messages']
+        timeout = options['timeout']
+        group = f'harness.{uuid.uuid4().hex[:8]}'
+
+        # 'spawn' garantiza procesos independientes, como varios workers de Daphne
+        context = multiprocessing.get_context('spawn')
+        ready_queue = context.Queue()
+        result_queue = context.Queue()
+        processes = [
+            context.Process(target=_worker, args=(i, group, messages, timeout, ready_queue, result_queue))
+            for i in range(workers)
+        ]
+        for process in processes:
+            process.start()
+
+        try:
+            for _ in range(workers):
+                ready_queue.get(timeout=timeout)
+        except queue.Empty:
+            for process in processes:
+                process.terminate()
+            raise CommandError('Los workers no se unieron al grupo a tiempo.')
+
+        self.stdout.write(f'{workers} workers unidos al grupo {group}. Enviando {messages} mensajes...')
+        send_seconds = asyncio.run(self._send(group, messages))
+
+        results = []
+        try:
+            for _ in range(workers):
+                results.append(result_queue.get(timeout=timeout + 5))
+        except queue.Empty:
+            pass
+        for process in processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+
+        self._report(results, workers, messages, send_seconds)
+
+    async def _send(self, group, messages):
+        from channels.layers import get_channel_layer
+
+        layer = get_channel_layer()
+        start = time.perf_counter()
+        for seq in range(messages):
+            await layer.group_send(group, {'type': 'harness.message', 'seq': seq, 'sent_at': time.time()})
+        elapsed = time.perf_counter() - start
+        if hasattr(layer, 'close'):
+            await layer.close()
+        return elapsed
+
+    def _report(self, results, workers, messages, send_seconds):
+        self.stdout.write(self.style.MIGRATE_HEADING('\n=== Resultado ==='))
+        if results:
+            self.stdout.write(f"Capa de canales: {results[0]['backend']}")
+        self.stdout.write(
+            f'Envío: {messages} group_send en {send_seconds:.2f}s ({messages / send_seconds:.0f} msg/s)'
+        )
+
+        failed = workers - len(results)
+        for result in sorted(results, key=lambda r: r['worker']):
+            latencies = sorted(result['latencies'])
+            p50 = statistics.median(latencies) if latencies else 0
+            p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else 0
+            ok = result['received'] == messages and result['in_order']
+            failed += 0 if ok else 1
+            line = (
+                f"worker {result['worker']}: {result['received']}/{messages} recibidos, "
+                f"en orden={result['in_order']}, latencia p50={p50:.1f}ms p95={p95:.1f}ms"
+            )
+            self.stdout.write(self.style.SUCCESS(line) if ok else self.style.ERROR(line))
+
+        if failed:
+            raise CommandError(f'{failed} de {workers} workers no recibieron todos los mensajes.')
+        self.stdout.write(self.style.SUCCESS('Todos los workers recibieron todos los mensajes en orden.'))
@@ -0,0 +1,84 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from realtime.outbox import outbox
+
+
+class Command(BaseCommand):
+    help = (
+        'Reenvía a la capa de canales los eventos del outbox que siguen pendientes '
+        '(entrega al menos una vez) e informa del rendimiento y el retraso.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Eventos por lote.')
+        parser.add_argument('--interval', type=float, default=1.0, help='Segundos de espera cuando no hay pendientes.')
+        parser.add_argument('--grace', type=float, default=5.0, help='Antigüedad mínima (s) de un evento para reenviarlo.')
+        parser.add_argument(
+            '--purge-after', type=float, default=None,
+            help='Horas que se conservan los eventos publicados (por defecto OUTBOX_RETENTION_HOURS).'
+        )
+        parser.add_argument('--report-every', type=float, default=60.0, help='Segundos entre informes de métricas.')
+        parser.add_argument('--once', action='store_true', help='Procesar lo pendiente y salir.')
+
+    def handle(self, *args, **options):
+        published_total = 0
+        failed_total = 0
+        window_published = 0
+        window_start = time.monotonic()
+        next_purge = time.monotonic()
+
+        while True:
+            close_old_connections()
+            start = time.monotonic()
+            result = outbox.relay_pending(batch_size=options['batch_size'], grace_seconds=options['grace'])
+            elapsed = time.monotonic() - start
+
+            published_total += result['published']
+            failed_total += result['failed']
+            window_published += result['published']
+            if result['published'] or result['failed']:
+                self.stdout.write(
+                    f"Lote: {result['published']} publicados, {result['failed']} fallidos en "
+                    f"{elapsed * 1000:.1f}ms (retraso máx. {result['max_lag_ms']:.0f}ms)"
+                )
+
+            now = time.monotonic()
+            if now >= next_purge:
+                retention = outbox.retention if options['purge_after'] is None else timedelta(hours=options['purge_after'])
+                purged = outbox.purge_published(retention)
+                if purged:
+                    self.stdout.write(f'{purged} eventos publicados purgados.')
+                next_purge = now + 3600
+
+            if now - window_start >= options['report_every']:
+                self._report(window_published / (now - window_start))
+                window_published = 0
+                window_start = now
+
+            if options['once']:
+                if result['published'] + result['failed'] < options['batch_size']:
+                    break
+                continue
+            # Con un lote completo probablemente quedan más pendientes: no esperar
+            if result['published'] + result['failed'] < options['batch_size']:
+                time.sleep(options['interval'])
+
+        self._report(None)
+        self.stdout.write(self.style.SUCCESS(
+            f'Relé finalizado: {published_total} publicados, {failed_total} fallidos.'
+        ))
+
+    def _report(self, throughput):
+        stats = outbox.stats()
+        line = (
+            f"Pendientes={stats['pending']} retraso más antiguo={stats['oldest_pending_age_s']}s "
+            f"publicados último minuto={stats['published_last_minute']} "
+            f"retraso medio={stats['avg_publish_lag_ms']}ms"
+        )
+        if throughput is not None:
+            line += f' relé={throughput:.1f} ev/s'
+        self.stdout.write(self.style.HTTP_INFO(line))
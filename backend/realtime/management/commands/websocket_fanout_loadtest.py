@@ -0,0 +1,189 @@
+import asyncio
+import json
+import random
+import time
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+
+from bookings.utils.websocket_notifier import BookingWebSocketNotifier
+from realtime.benchmarks import sample_booking_data
+from realtime.groups import BOOKINGS_ADMIN_GROUP, court_group, user_group
+
+
+class _RecordingNotifier(BookingWebSocketNotifier):
+    """
+    Notificador de reservas que, en lugar de escribir en el outbox, guarda los envíos
+    (grupo, tipo, datos). Así la prueba usa exactamente el enrutado y la codificación
+    de producción.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.sent = []
+
+    def _publish(self, group, event_type, payload):
+        self.sent.append((group, event_type, payload))
+
+
+class Command(BaseCommand):
+    help = (
+        'Simula miles de conexiones WebSocket de reservas sobre la capa de canales configurada '
+        'y compara el coste de difundir cada evento a todas (grupo global) con el enrutado '
+        'por grupos de administración, usuario y pista.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, default=2000, help='Conexiones de clientes simuladas.')
+        parser.add_argument('--admins', type=int, default=5, help='Conexiones de staff.')
+        parser.add_argument('--courts', type=int, default=20, help='Número de pistas.')
+        parser.add_argument(
+            '--court-watchers', type=float, default=0.1,
+            help='Fracción de clientes suscritos a la disponibilidad de una pista.'
+        )
+        parser.add_argument('--events', type=int, default=20, help='Reservas creadas durante la prueba.')
+        parser.add_argument('--timeout', type=float, default=60, help='Segundos máximos de espera por modo.')
+        parser.add_argument('--seed', type=int, default=7)
+
+    def handle(self, *args, **options):
+        if options['connections'] < 1 or options['events'] < 1:
+            raise CommandError('--connections y --events deben ser positivos.')
+        self.stdout.write(
+            f"{options['connections']} clientes + {options['admins']} staff, "
+            f"{options['events']} reservas sobre {options['courts']} pistas."
+        )
+        results = asyncio.run(self._run(options))
+        self._report(results)
+
+    def _plan(self, options):
+        """
+        Población simulada y eventos: (grupos de cada conexión, envíos por modo).
+        """
+        rng = random.Random(options['seed'])
+        courts = options['courts']
+
+        subscriptions = []
+        for user_id in range(1, options['connections'] + 1):
+            groups = [user_group('bookings', user_id)]
+            if rng.random() < options['court_watchers']:
+                groups.append(court_group(rng.randint(1, courts)))
+            subscriptions.append(groups)
+        for _ in range(options['admins']):
+            subscriptions.append([BOOKINGS_ADMIN_GROUP])
+
+        notifier = _RecordingNotifier()
+        broadcast = []
+        for booking_id in range(1, options['events'] + 1):
+            data = sample_booking_data(booking_id, rng.randint(1, options['connections']), rng.randint(1, courts))
+            broadcast.append(('bookings', 'booking_created', {'booking': data}))
+            notifier.notify_booking_created(data)
+
+        broadcast_subscriptions = [['bookings'] for _ in subscriptions]
+        return {
+            'broadcast': (broadcast_subscriptions, broadcast),
+            'scoped': (subscriptions, notifier.sent),
+        }
+
+    async def _run(self, options):
+        from channels.layers import get_channel_layer
+
+        layer = get_channel_layer()
+        if layer is None:
+            raise CommandError('No hay capa de canales configurada.')
+
+        results = {}
+        try:
+            for mode, (subscriptions, sends) in self._plan(options).items():
+                results[mode] = await self._run_mode(layer, mode, subscriptions, sends, options['timeout'])
+        finally:
+            if hasattr(layer, 'close'):
+                await layer.close()
+        results['backend'] = type(layer).__name__
+        return results
+
+    async def _run_mode(self, layer, mode, subscriptions, sends, timeout):
+        # Prefijo propio para no mezclar grupos con otras ejecuciones ni con producción
+        prefix = f'loadtest.{uuid.uuid4().hex[:8]}.'
+        members = {}
+        channels = []
+        for groups in subscriptions:
+            channel = await layer.new_channel()
+            channels.append(channel)
+            for group in groups:
+                await layer.group_add(prefix + group, channel)
+                members[group] = members.get(group, 0) + 1
+
+        expected = sum(members.get(group, 0) for group, _, _ in sends)
+        counters = {'received': 0, 'bytes': 0}
+        done = asyncio.Event()
+        if expected == 0:
+            done.set()
+
+        async def consumer(channel):
+            # Lo que hace un consumer por mensaje: reenviar el frame precodificado
+            # o, en el grupo global, serializar el evento
+            while True:
+                message = await layer.receive(channel)
+                frame = message.get('frame')
+                if frame is None:
+                    frame = json.dumps(message)
+                counters['bytes'] += len(frame)
+                counters['received'] += 1
+                if counters['received'] >= expected:
+                    done.set()
+
+        tasks = [asyncio.create_task(consumer(channel)) for channel in channels]
+        start = time.perf_counter()
+        for group, event_type, data in sends:
+            await layer.group_send(prefix + group, {'type': event_type, **data})
+            # Ceder el loop para que los consumers vacíen sus colas, como en un servidor real
+            await asyncio.sleep(0)
+        send_seconds = time.perf_counter() - start
+        try:
+            await asyncio.wait_for(done.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        total_seconds = time.perf_counter() - start
+
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for groups, channel in zip(subscriptions, channels):
+            for group in groups:
+                await layer.group_discard(prefix + group, channel)
+
+        return {
+            'mode': mode,
+            'connections': len(channels),
+            'group_sends': len(sends),
+            'expected': expected,
+            'received': counters['received'],
+            'bytes': counters['bytes'],
+            'send_seconds': send_seconds,
+            'total_seconds': total_seconds,
+        }
+
+    def _report(self, results):
+        self.stdout.write(self.style.MIGRATE_HEADING('\n=== Resultado ==='))
+        self.stdout.write(f"Capa de canales: {results['backend']}")
+        for mode in ('broadcast', 'scoped'):
+            result = results[mode]
+            line = (
+                f"{mode:>9}: {result['group_sends']} group_send, "
+                f"{result['received']}/{result['expected']} entregas "
+                f"({result['received'] / max(result['group_sends'], 1):.1f} por envío), "
+                f"{result['bytes'] / 1024 / 1024:.1f} MiB serializados, "
+                f"envío {result['send_seconds'] * 1000:.0f}ms, total {result['total_seconds'] * 1000:.0f}ms"
+            )
+            ok = result['received'] == result['expected']
+            self.stdout.write(self.style.SUCCESS(line) if ok else self.style.ERROR(line))
+
+        broadcast, scoped = results['broadcast'], results['scoped']
+        if scoped['received'] and scoped['total_seconds']:
+            self.stdout.write(
+                f"Entregas: x{broadcast['received'] / scoped['received']:.0f} menos; "
+                f"tiempo total: x{broadcast['total_seconds'] / scoped['total_seconds']:.1f} menor."
+            )
+        lost = sum(results[mode]['expected'] - results[mode]['received'] for mode in ('broadcast', 'scoped'))
+        if lost:
+            raise CommandError(f'{lost} mensajes no llegaron (capacidad de canal o timeout).')
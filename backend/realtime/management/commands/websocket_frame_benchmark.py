@@ -0,0 +1,73 @@
+import asyncio
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from bookings.consumers import BookingConsumer
+from realtime.frames import encode_frame, orjson
+from realtime.benchmarks import sample_booking_data
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide el tiempo de CPU por evento de difundir una reserva a N conexiones: '
+        'serializando en cada consumer (antes) frente a reenviar el frame codificado una '
+        'sola vez por el notificador, con json estándar y con orjson.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--connections', default='100,500,1000,2000,5000',
+            help='Números de conexiones a medir, separados por comas.'
+        )
+        parser.add_argument('--events', type=int, default=20, help='Eventos por medición.')
+
+    def handle(self, *args, **options):
+        try:
+            counts = [int(value) for value in options['connections'].split(',') if value.strip()]
+        except ValueError:
+            raise CommandError('--connections debe ser una lista de enteros.')
+        events = options['events']
+        if not counts or min(counts) < 1 or events < 1:
+            raise CommandError('--connections y --events deben ser positivos.')
+
+        modes = [('por conexión', False, False), ('precodificado json', True, False)]
+        if orjson is not None:
+            modes.append(('precodificado orjson', True, True))
+        else:
+            self.stdout.write(self.style.WARNING('orjson no está instalado; se omite esa medición.'))
+
+        data = {'booking': sample_booking_data(1, 1, 1)}
+        header = f"{'conexiones':>10} | " + ' | '.join(f'{name:>20}' for name, _, _ in modes) + ' | mejora'
+        self.stdout.write(self.style.MIGRATE_HEADING('CPU por evento (ms)'))
+        self.stdout.write(header)
+        for count in counts:
+            results = [asyncio.run(self._measure(count, events, data, pre_encoded, fast)) for _, pre_encoded, fast in modes]
+            cells = ' | '.join(f'{ms:>20.3f}' for ms in results)
+            self.stdout.write(f'{count:>10} | {cells} | x{results[0] / results[-1]:.0f}')
+
+    async def _measure(self, count, events, data, pre_encoded, fast):
+        sent = {'bytes': 0}
+
+        async def sink(text_data=None, bytes_data=None, close=False):
+            # Sustituye al envío por el socket: solo contabiliza el texto
+            sent['bytes'] += len(text_data)
+
+        consumers = []
+        for _ in range(count):
+            consumer = BookingConsumer()
+            consumer.send = sink
+            consumers.append(consumer)
+
+        with override_settings(WEBSOCKET_FAST_JSON=fast):
+            start = time.process_time()
+            for _ in range(events):
+                event = {'type': 'booking_created', **data}
+                if pre_encoded:
+                    # Lo que hace el notificador: un frame por evento
+                    event = {'type': 'booking_created', 'frame': encode_frame('booking_created', data)}
+                for consumer in consumers:
+                    await consumer.booking_created(event)
+            elapsed = time.process_time() - start
+        return elapsed / events * 1000
@@ -0,0 +1,37 @@
+import asyncio
+
+from .dispatcher import notification_dispatcher
+from .outbox import outbox
+
+
+class OutboxIdempotencyMiddleware:
+    """
+    Liga los eventos del outbox publicados durante la petición a su cabecera
+    Idempotency-Key: el reintento de una escritura (mismo método, ruta y clave) reutiliza
+    las claves de sus eventos y el outbox no los registra de nuevo.
+    """
+    header = 'Idempotency-Key'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        key = request.headers.get(self.header)
+        if not key:
+            return self.get_response(request)
+        with outbox.request_scope(f'{request.method}|{request.path}|{key}'):
+            return self.get_response(request)
+
+
+class DispatcherLoopMiddleware:
+    """
+    Middleware ASGI que registra en la cola de notificaciones el loop del servidor, para
+    que los eventos encolados desde las vistas síncronas se envíen en él.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        notification_dispatcher.bind_loop(asyncio.get_running_loop())
+        return await self.app(scope, receive, send)
@@ -0,0 +1,41 @@
+# Generated by Django 5.2 on 2026-10-18 11:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChannelGroupMembership',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('group_name', models.CharField(max_length=100)),
+                ('channel', models.CharField(max_length=100)),
+                ('client_prefix', models.CharField(max_length=32)),
+                ('expires_at', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['channel'], name='channel_group_channel_idx')],
+                'constraints': [models.UniqueConstraint(fields=('group_name', 'channel'), name='channel_group_unique_member')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ChannelMessage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('channel', models.CharField(max_length=100)),
+                ('client_prefix', models.CharField(max_length=32)),
+                ('payload', models.TextField()),
+                ('expires_at', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['client_prefix', 'id'], name='channel_msg_prefix_idx'), models.Index(fields=['expires_at'], name='channel_msg_expires_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2 on 2026-10-18 11:40
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('realtime', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('group_name', models.CharField(max_length=100)),
+                ('event_type', models.CharField(max_length=100)),
+                ('payload', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('idempotency_key', models.CharField(max_length=150, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('published_at', models.DateTimeField(blank=True, null=True)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True, default='')),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('published_at__isnull', True)), fields=['created_at', 'id'], name='outbox_pending_idx'), models.Index(fields=['published_at'], name='outbox_published_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,84 @@
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+
+
+class ChannelMessage(models.Model):
+    """
+    Mensaje pendiente de entrega de la capa de canales sobre PostgreSQL.
+
+    Cada proceso de Daphne escucha (LISTEN) su propio canal de notificación y borra
+    sus mensajes al recibirlos; las filas solo permanecen si su destinatario no las
+    recoge antes de expires_at.
+    """
+    channel = models.CharField(max_length=100)
+    # Identificador del proceso dueño del canal (parte previa al '!' del nombre)
+    client_prefix = models.CharField(max_length=32)
+    payload = models.TextField()
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['client_prefix', 'id'], name='channel_msg_prefix_idx'),
+            models.Index(fields=['expires_at'], name='channel_msg_expires_idx'),
+        ]
+
+    def __str__(self):
+        return f"Mensaje {self.id} para {self.channel}"
+
+
+class ChannelGroupMembership(models.Model):
+    """
+    Pertenencia de un canal a un grupo, compartida por todos los procesos.
+    """
+    group_name = models.CharField(max_length=100)
+    channel = models.CharField(max_length=100)
+    client_prefix = models.CharField(max_length=32)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['group_name', 'channel'], name='channel_group_unique_member'),
+        ]
+        indexes = [
+            models.Index(fields=['channel'], name='channel_group_channel_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.channel} en {self.group_name}"
+
+
+class OutboxEvent(models.Model):
+    """
+    Evento WebSocket registrado en la misma transacción que el cambio de dominio.
+
+    Se publica en la capa de canales solo después del commit; si la transacción se
+    revierte, el evento desaparece con ella. published_at queda nulo hasta que el
+    evento se entrega, y el relé (manage.py relay_outbox) reenvía los que sigan
+    pendientes (entrega al menos una vez).
+    """
+    group_name = models.CharField(max_length=100)
+    event_type = models.CharField(max_length=100)
+    payload = models.JSONField(encoder=DjangoJSONEncoder)
+    # Evita registrar dos veces el mismo evento (ej. reintentos) y viaja en el mensaje como event_id
+    idempotency_key = models.CharField(max_length=150, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    published_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, default='')
+
+    class Meta:
+        indexes = [
+            # Eventos pendientes en orden de llegada (relé y métrica de retraso)
+            models.Index(fields=['created_at', 'id'], condition=models.Q(published_at__isnull=True), name='outbox_pending_idx'),
+            # Métricas de rendimiento y purga de eventos ya publicados
+            models.Index(fields=['published_at'], name='outbox_published_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.event_type} para {self.group_name} ({self.idempotency_key})"
+
+    def as_message(self):
+        """
+        Mensaje para group_send: el 'type' del handler del consumer, el event_id y los datos.
+        """
+        return {'type': self.event_type, 'event_id': self.idempotency_key, **self.payload}
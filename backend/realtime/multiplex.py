@@ -0,0 +1,101 @@
+from typing import Any, Dict, Iterable, Optional
+
+from .frames import encode_frame
+
+
+class TopicError(Exception):
+    """
+    Suscripción o acción rechazada en un tema del socket multiplexado.
+
+    Los códigos coinciden con los de cierre de los consumers dedicados (ej. 4003 si no
+    es participante del partido).
+    """
+
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+class Topic:
+    """
+    Tema del socket multiplexado (ej. 'bookings' o 'chat:12').
+
+    Cada app define el suyo junto a su consumer dedicado y reutiliza la misma lógica
+    de grupos, así que un tema recibe exactamente los eventos que recibiría el socket
+    dedicado equivalente.
+
+    Atributos de clase:
+        name (str): Nombre del tema en los frames de control.
+        events (dict): Tipo de evento -> campos del frame (para eventos sin frame
+            precodificado).
+        control_events (tuple): Eventos internos que no se reenvían al cliente.
+    """
+    name = None
+    events: Dict[str, Iterable[str]] = {}
+    control_events: Iterable[str] = ()
+
+    def __init__(self, consumer, params: Dict[str, Any]):
+        self.consumer = consumer
+        self.user = consumer.scope['user']
+        self.params = params
+        self.groups = set()
+
+    @classmethod
+    def event_types(cls) -> Iterable[str]:
+        return [*cls.events, *cls.control_events]
+
+    @classmethod
+    def key_for_params(cls, params: Dict[str, Any]) -> str:
+        """
+        Clave del tema para una suscripción (por defecto, el nombre).
+        """
+        return cls.name
+
+    @classmethod
+    def key_for_event(cls, event: Dict[str, Any]) -> str:
+        """
+        Clave del tema al que pertenece un evento de la capa de canales.
+        """
+        return cls.name
+
+    @property
+    def key(self) -> str:
+        return self.key_for_params(self.params)
+
+    async def get_groups(self) -> Iterable[str]:
+        """
+        Grupos de la capa de canales del tema. Lanza TopicError si no está permitido.
+        """
+        raise NotImplementedError
+
+    def render(self, event: Dict[str, Any]) -> Optional[str]:
+        """
+        Texto a enviar al cliente para un evento, o None para descartarlo.
+        """
+        frame = event.get('frame')
+        if frame is None:
+            frame = encode_frame(event['type'], {name: event[name] for name in self.events[event['type']]})
+        return frame
+
+    def frames(self, event: Dict[str, Any]) -> Iterable[str]:
+        """
+        Textos a enviar al cliente para un evento (por defecto, el de render). Los temas
+        con eventos que agrupan varios cambios lo sobrescriben.
+        """
+        frame = self.render(event)
+        return [] if frame is None else [frame]
+
+    async def handle_control(self, event: Dict[str, Any]) -> None:
+        pass
+
+    async def close(self) -> None:
+        """
+        Se llama al desuscribirse del tema o cerrar la conexión.
+        """
+
+    async def receive(self, data: Dict[str, Any]) -> None:
+        """
+        Acción enviada por el cliente al tema (ej. un mensaje de chat).
+        """
+        raise TopicError(4005, 'Este tema no admite mensajes.')
@@ -0,0 +1,247 @@
+import contextvars
+import hashlib
+import json
+import logging
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.db.models import Avg, Count, F, Min
+from django.utils import timezone
+
+from .dispatcher import notification_dispatcher
+from .models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+# Idempotency-Key de la petición HTTP en curso (ver realtime.middleware)
+_request_scope = contextvars.ContextVar('outbox_request_scope', default=None)
+
+
+class TransactionalOutbox:
+    """
+    Publicación de eventos WebSocket ligada a las transacciones de la base de datos.
+
+    publish() escribe el evento en OutboxEvent dentro de la transacción en curso. Tras el
+    commit se entrega enseguida a la cola de notificaciones y, cuando el group_send tiene
+    éxito, la fila se marca como publicada. Lo que quede pendiente (caída del proceso o
+    error de la capa de canales) lo reenvía relay_pending(), ejecutado por el comando
+    relay_outbox.
+
+    Si la petición trae la cabecera Idempotency-Key, la clave de cada evento se deriva de
+    ella y de los datos del evento (el objeto serializado, con su id y su estado): el
+    reintento de la misma escritura genera las mismas claves y sus eventos no se
+    registran dos veces, pero un cambio distinto con la misma cabecera (ej. tras un
+    primer intento que falló a medias) sí se publica. La protección dura lo que se conservan las filas
+    (OUTBOX_RETENTION_HOURS); los eventos publicados más antiguos se purgan al confirmar
+    entregas, como mucho una vez cada OUTBOX_PURGE_INTERVAL segundos por proceso, sin
+    depender de que relay_outbox esté en marcha.
+    """
+
+    def __init__(self):
+        self._next_purge = 0.0
+        self._purge_lock = threading.Lock()
+
+    @property
+    def retention(self) -> timedelta:
+        return timedelta(hours=getattr(settings, 'OUTBOX_RETENTION_HOURS', 24))
+
+    @property
+    def purge_interval(self) -> float:
+        return getattr(settings, 'OUTBOX_PURGE_INTERVAL', 300)
+
+    @contextmanager
+    def request_scope(self, request_key: str):
+        """
+        Deriva de request_key las claves de los eventos publicados dentro del bloque.
+
+        La n-ésima publicación de un mismo (grupo, tipo, datos) recibe siempre la misma
+        clave, así que repetir la petición con el mismo resultado repite las claves.
+        """
+        token = _request_scope.set({'key': request_key, 'counts': {}})
+        try:
+            yield
+        finally:
+            _request_scope.reset(token)
+
+    def _default_key(self, group: str, event_type: str, data: Dict[str, Any]) -> str:
+        scope = _request_scope.get()
+        if scope is None:
+            return uuid.uuid4().hex
+        # Los datos identifican el cambio de dominio (id del objeto y su estado tras el cambio)
+        digest = hashlib.sha256(json.dumps(data, sort_keys=True, cls=DjangoJSONEncoder).encode()).hexdigest()
+        counter = (group, event_type, digest)
+        count = scope['counts'][counter] = scope['counts'].get(counter, 0) + 1
+        return hashlib.sha256(f"{scope['key']}|{group}|{event_type}|{digest}|{count}".encode()).hexdigest()
+
+    def publish(
+        self, group: str, event_type: str, data: Dict[str, Any], idempotency_key: Optional[str] = None,
+        dispatch: Optional[Callable[[OutboxEvent], None]] = None,
+    ) -> Optional[OutboxEvent]:
+        """
+        Registra un evento en la transacción actual.
+
+        Args:
+            group (str): Grupo de la capa de canales.
+            event_type (str): Handler del consumer (ej. 'booking_created').
+            data (dict): Datos del evento.
+            idempotency_key (str, optional): Clave única del evento. Por defecto se deriva
+                del Idempotency-Key de la petición y de data o, sin él, es aleatoria.
+            dispatch (callable, optional): Recibe el evento tras el commit en lugar de la
+                cola de notificaciones (ej. un EventCoalescer). Debe acabar llamando a
+                mark_published con su id.
+
+        Returns:
+            OutboxEvent: El evento registrado, o None si la clave ya existía.
+        """
+        key = idempotency_key or self._default_key(group, event_type, data)
+        try:
+            # Punto de guardado propio: un duplicado no invalida la transacción exterior
+            with transaction.atomic():
+                event = OutboxEvent.objects.create(
+                    group_name=group, event_type=event_type, payload=data, idempotency_key=key
+                )
+        except IntegrityError:
+            logger.info('Evento %s ya registrado en el outbox; se omite.', key)
+            return None
+
+        transaction.on_commit(lambda: (dispatch or self.dispatch)(event))
+        return event
+
+    def dispatch(self, event: OutboxEvent) -> None:
+        """
+        Entrega por defecto tras el commit: encola el evento en la cola de notificaciones.
+        """
+        notification_dispatcher.enqueue(
+            event.group_name, event.as_message(), ack=(self.mark_published, event.id)
+        )
+
+    def mark_published(self, event_ids: List[Union[int, Tuple[int, ...]]]) -> int:
+        """
+        Marca como publicados los eventos entregados (una sola consulta por lote).
+
+        Cada clave es el id de un evento o una tupla de ids (eventos fusionados en un
+        único mensaje).
+        """
+        event_ids = [
+            event_id
+            for key in event_ids
+            for event_id in (key if isinstance(key, tuple) else (key,))
+        ]
+        updated = OutboxEvent.objects.filter(id__in=event_ids, published_at__isnull=True).update(
+            published_at=timezone.now(), attempts=F('attempts') + 1
+        )
+        self._purge_if_due()
+        return updated
+
+    def _purge_if_due(self) -> None:
+        now = time.monotonic()
+        with self._purge_lock:
+            if now < self._next_purge:
+                return
+            self._next_purge = now + self.purge_interval
+        purged = self.purge_published(self.retention, limit=1000)
+        if purged:
+            logger.info('%s eventos publicados purgados del outbox.', purged)
+
+    def relay_pending(self, batch_size: int = 500, grace_seconds: float = 5) -> Dict[str, Any]:
+        """
+        Reenvía un lote de eventos pendientes a la capa de canales.
+
+        Las filas se bloquean con SKIP LOCKED, así que varios relés pueden trabajar en
+        paralelo. Los eventos de un mismo grupo se envían en orden; si uno falla, los
+        siguientes de ese grupo esperan al próximo lote.
+
+        Args:
+            batch_size (int): Máximo de eventos por lote.
+            grace_seconds (float): Antigüedad mínima para no competir con la entrega
+                inmediata tras el commit.
+
+        Returns:
+            dict: {'published', 'failed', 'max_lag_ms'} del lote.
+        """
+        cutoff = timezone.now() - timedelta(seconds=grace_seconds)
+        with transaction.atomic():
+            events = list(
+                OutboxEvent.objects.select_for_update(skip_locked=True)
+                .filter(published_at__isnull=True, created_at__lte=cutoff)
+                .order_by('id')[:batch_size]
+            )
+            if not events:
+                return {'published': 0, 'failed': 0, 'max_lag_ms': 0.0}
+
+            published, failed = async_to_sync(self._send_events)(events)
+
+            now = timezone.now()
+            if published:
+                OutboxEvent.objects.filter(id__in=[event.id for event in published]).update(
+                    published_at=now, attempts=F('attempts') + 1
+                )
+            for event, error in failed:
+                OutboxEvent.objects.filter(id=event.id).update(attempts=F('attempts') + 1, last_error=error)
+
+        max_lag = max(((now - event.created_at).total_seconds() * 1000 for event in published), default=0.0)
+        return {'published': len(published), 'failed': len(failed), 'max_lag_ms': max_lag}
+
+    async def _send_events(self, events):
+        channel_layer = get_channel_layer()
+        published = []
+        failed = []
+        blocked_groups = set()
+        for event in events:
+            if event.group_name in blocked_groups:
+                continue
+            try:
+                if channel_layer is not None:
+                    await channel_layer.group_send(event.group_name, event.as_message())
+                published.append(event)
+            except Exception as e:
+                logger.exception('Error reenviando el evento %s', event.idempotency_key)
+                failed.append((event, str(e)))
+                blocked_groups.add(event.group_name)
+        return published, failed
+
+    def purge_published(self, older_than: timedelta, limit: Optional[int] = None) -> int:
+        """
+        Elimina los eventos publicados hace más de older_than (como mucho limit).
+        """
+        events = OutboxEvent.objects.filter(published_at__lt=timezone.now() - older_than)
+        if limit is not None:
+            events = OutboxEvent.objects.filter(id__in=list(events.order_by('id').values_list('id', flat=True)[:limit]))
+        deleted, _ = events.delete()
+        return deleted
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Devuelve métricas del outbox: pendientes, retraso y rendimiento del último minuto.
+
+        Returns:
+            dict: {'pending', 'oldest_pending_age_s', 'published_last_minute',
+                'avg_publish_lag_ms', 'retried_pending'}.
+        """
+        now = timezone.now()
+        pending = OutboxEvent.objects.filter(published_at__isnull=True).aggregate(
+            count=Count('id'), oldest=Min('created_at')
+        )
+        retried = OutboxEvent.objects.filter(published_at__isnull=True, attempts__gt=0).count()
+        last_minute = OutboxEvent.objects.filter(published_at__gte=now - timedelta(minutes=1)).aggregate(
+            count=Count('id'), lag=Avg(F('published_at') - F('created_at'))
+        )
+        return {
+            'pending': pending['count'],
+            'oldest_pending_age_s': round((now - pending['oldest']).total_seconds(), 3) if pending['oldest'] else 0.0,
+            'published_last_minute': last_minute['count'],
+            'avg_publish_lag_ms': round(last_minute['lag'].total_seconds() * 1000, 3) if last_minute['lag'] else 0.0,
+            'retried_pending': retried,
+        }
+
+
+outbox = TransactionalOutbox()
@@ -0,0 +1,522 @@
+import asyncio
+import threading
+import time
+from datetime import timedelta
+from unittest import mock, skipUnless
+
+from asgiref.sync import async_to_sync
+from channels.exceptions import ChannelFull
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.db import connection, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from bookings.testing import BookingTestMixin
+from chat.room_state import room_state_cache
+from matches.models import MatchCategory, MatchParticipant, OpenMatch
+from . import consumers
+from .channel_layers import PostgresChannelLayer
+from .consumers import MultiplexConsumer
+from .dispatcher import NotificationDispatcher
+from .groups import court_group, user_group
+from .middleware import OutboxIdempotencyMiddleware
+from .models import OutboxEvent
+from .multiplex import Topic
+from .outbox import TransactionalOutbox
+
+
+class TransactionalOutboxTests(TestCase):
+    """
+    Los eventos se registran con la transacción, se entregan tras el commit y el relé
+    reenvía los pendientes.
+    """
+
+    def setUp(self):
+        self.outbox = TransactionalOutbox()
+        self.dispatched = []
+
+    def _publish(self, event_type='booking_created', data=None, **kwargs):
+        return self.outbox.publish(
+            'bookings_admin', event_type, data or {'frame': '{}'}, dispatch=self.dispatched.append, **kwargs
+        )
+
+    def test_event_is_dispatched_only_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            event = self._publish()
+            self.assertEqual(self.dispatched, [])
+
+        self.assertEqual(self.dispatched, [event])
+        self.assertTrue(OutboxEvent.objects.filter(id=event.id, published_at__isnull=True).exists())
+
+    def test_rollback_discards_the_event(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(RuntimeError):
+                with transaction.atomic():
+                    self._publish()
+                    raise RuntimeError('rollback')
+
+        self.assertEqual(self.dispatched, [])
+        self.assertFalse(OutboxEvent.objects.exists())
+
+    def test_duplicate_key_is_skipped(self):
+        self.assertIsNotNone(self._publish(idempotency_key='booking:1:pending'))
+        self.assertIsNone(self._publish(idempotency_key='booking:1:pending'))
+        self.assertEqual(OutboxEvent.objects.count(), 1)
+
+    def test_request_scope_repeats_keys_on_retry(self):
+        keys = []
+        for _ in range(2):
+            with self.outbox.request_scope('POST|/api/bookings/|abc'):
+                keys.append(self.outbox._default_key('bookings_admin', 'booking_created', {'frame': '{}'}))
+                keys.append(self.outbox._default_key('bookings_admin', 'booking_created', {'frame': '{}'}))
+
+        self.assertEqual(keys[:2], keys[2:])
+        self.assertNotEqual(keys[0], keys[1])
+        self.assertNotEqual(self.outbox._default_key('bookings_admin', 'booking_created', {'frame': '{}'}), keys[0])
+
+    def test_reused_request_key_with_a_new_change_is_published(self):
+        first = {'frame': '{"type": "booking_created", "booking": {"id": 1, "status": "pending"}}'}
+        second = {'frame': '{"type": "booking_created", "booking": {"id": 2, "status": "pending"}}'}
+
+        with self.outbox.request_scope('POST|/api/bookings/|abc'):
+            self.assertIsNotNone(self._publish(data=first))
+        # Mismo Idempotency-Key, pero el reintento crea otra reserva
+        with self.outbox.request_scope('POST|/api/bookings/|abc'):
+            self.assertIsNone(self._publish(data=first))
+            self.assertIsNotNone(self._publish(data=second))
+
+        self.assertEqual(OutboxEvent.objects.count(), 2)
+
+    def test_middleware_dedupes_a_retried_request(self):
+        def view(request):
+            self._publish()
+            return HttpResponse()
+
+        middleware = OutboxIdempotencyMiddleware(view)
+        request = RequestFactory().post('/api/bookings/', HTTP_IDEMPOTENCY_KEY='abc')
+
+        middleware(request)
+        middleware(request)
+
+        self.assertEqual(OutboxEvent.objects.count(), 1)
+
+    def _old_event(self, **fields):
+        event = self._publish()
+        OutboxEvent.objects.filter(id=event.id).update(created_at=timezone.now() - timedelta(minutes=1), **fields)
+        return event
+
+    def test_relay_publishes_pending_events(self):
+        event = self._old_event()
+
+        result = self.outbox.relay_pending(grace_seconds=5)
+
+        self.assertEqual(result['published'], 1)
+        event.refresh_from_db()
+        self.assertIsNotNone(event.published_at)
+        self.assertEqual(event.attempts, 1)
+
+    def test_relay_keeps_failed_events_pending_in_order(self):
+        first = self._old_event()
+        second = self._old_event()
+        channel_layer = mock.Mock(group_send=mock.AsyncMock(side_effect=RuntimeError('capa caída')))
+
+        with mock.patch('realtime.outbox.get_channel_layer', return_value=channel_layer), \
+                self.assertLogs('realtime.outbox', 'ERROR'):
+            result = self.outbox.relay_pending(grace_seconds=5)
+
+        # El segundo evento del grupo espera al primero
+        self.assertEqual((result['published'], result['failed']), (0, 1))
+        self.assertEqual(channel_layer.group_send.await_count, 1)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.attempts, first.last_error), (1, 'capa caída'))
+        self.assertEqual(second.attempts, 0)
+        self.assertIsNone(first.published_at)
+
+    @override_settings(OUTBOX_RETENTION_HOURS=1)
+    def test_mark_published_purges_old_published_events(self):
+        old = self._old_event(published_at=timezone.now() - timedelta(hours=2))
+        recent = self._old_event(published_at=timezone.now())
+        pending = self._publish()
+
+        self.outbox.mark_published([pending.id])
+
+        self.assertEqual(
+            set(OutboxEvent.objects.values_list('id', flat=True)), {recent.id, pending.id}
+        )
+        self.assertFalse(OutboxEvent.objects.filter(id=old.id).exists())
+
+
+class FlakyChannelLayer:
+    """
+    Capa de canales que falla los primeros envíos a los grupos indicados.
+    """
+
+    def __init__(self, failures):
+        self.failures = dict(failures)
+        self.sent = []
+        self.threads = set()
+
+    async def group_send(self, group, message):
+        self.threads.add(threading.get_ident())
+        if self.failures.get(group, 0):
+            self.failures[group] -= 1
+            raise ChannelFull()
+        self.sent.append((group, message['type']))
+
+
+@override_settings(NOTIFICATION_RETRY_DELAY=0)
+class NotificationDispatcherTests(SimpleTestCase):
+    """
+    Un fallo de group_send no deja que los eventos siguientes del grupo se adelanten al
+    fallido, y los envíos se hacen en el loop registrado con bind_loop().
+    """
+
+    def setUp(self):
+        self.dispatcher = NotificationDispatcher()
+
+    def _drain(self, layer, enqueue):
+        async def run():
+            with mock.patch('realtime.dispatcher.get_channel_layer', return_value=layer):
+                await enqueue()
+                while self.dispatcher._draining_loop is not None or self.dispatcher.stats()['depth']:
+                    await asyncio.sleep(0.01)
+
+        async_to_sync(run)()
+
+    def _enqueue_all(self, events):
+        async def enqueue():
+            for group, event_type in events:
+                self.dispatcher.enqueue(group, {'type': event_type})
+        return enqueue
+
+    def test_failed_event_is_retried_before_the_rest_of_its_group(self):
+        layer = FlakyChannelLayer({'a': 1})
+
+        self._drain(layer, self._enqueue_all([('a', 'a1'), ('b', 'b1'), ('a', 'a2'), ('a', 'a3')]))
+
+        self.assertEqual([event for group, event in layer.sent if group == 'a'], ['a1', 'a2', 'a3'])
+        self.assertIn(('b', 'b1'), layer.sent)
+        stats = self.dispatcher.stats()
+        self.assertEqual((stats['delivered'], stats['failed']), (4, 0))
+
+    @override_settings(NOTIFICATION_MAX_ATTEMPTS=2)
+    def test_group_is_given_up_after_max_attempts(self):
+        layer = FlakyChannelLayer({'a': 10})
+
+        self._drain(layer, self._enqueue_all([('a', 'a1'), ('a', 'a2'), ('b', 'b1')]))
+
+        self.assertEqual(layer.sent, [('b', 'b1')])
+        self.assertEqual(layer.failures['a'], 8)
+        stats = self.dispatcher.stats()
+        self.assertEqual((stats['delivered'], stats['failed']), (1, 2))
+
+    def test_events_enqueued_from_threads_are_sent_on_the_bound_loop(self):
+        layer = FlakyChannelLayer({})
+        loop_threads = set()
+
+        async def enqueue():
+            loop_threads.add(threading.get_ident())
+            self.dispatcher.bind_loop(asyncio.get_running_loop())
+            await asyncio.to_thread(self.dispatcher.enqueue, 'a', {'type': 'a1'})
+
+        self._drain(layer, enqueue)
+
+        self.assertEqual(layer.sent, [('a', 'a1')])
+        self.assertEqual(layer.threads, loop_threads)
+
+
+class ProbeTopic(Topic):
+    """
+    Tema de prueba: clave 'probe:<id>' y los grupos que indiquen sus parámetros.
+    """
+    name = 'probe'
+    events = {'probe_event': ('value',)}
+
+    @classmethod
+    def key_for_params(cls, params):
+        return f"probe:{params.get('id')}"
+
+    @classmethod
+    def key_for_event(cls, event):
+        return f"probe:{event.get('probe_id')}"
+
+    async def get_groups(self):
+        return self.params.get('groups', [])
+
+
+@mock.patch.dict(consumers.TOPICS, {'probe': ProbeTopic})
+@mock.patch.dict(consumers.EVENT_TOPICS, {'probe_event': ProbeTopic})
+class MultiplexConsumerTests(BookingTestMixin, TestCase):
+    """
+    Protocolo del socket multiplexado: suscripción, baja, acciones, grupos compartidos
+    entre temas, límite de temas y códigos de error.
+    """
+
+    def setUp(self):
+        self.create_fixtures()
+        room_state_cache.clear()
+
+    def _run(self, scenario):
+        async def run():
+            communicator = WebsocketCommunicator(MultiplexConsumer.as_asgi(), '/ws/realtime/')
+            communicator.scope['user'] = self.user
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+            try:
+                return await scenario(communicator, get_channel_layer())
+            finally:
+                await communicator.disconnect()
+
+        return async_to_sync(run)()
+
+    async def _request(self, communicator, **frame):
+        await communicator.send_json_to(frame)
+        return await communicator.receive_json_from()
+
+    def _create_match(self, creator):
+        start_time = timezone.now() + timedelta(days=1)
+        match = OpenMatch.objects.create(
+            court=self.court, creator=creator, category=MatchCategory.objects.create(name='Mixto-test'),
+            start_time=start_time, end_time=start_time + timedelta(hours=1), players_needed=3,
+        )
+        MatchParticipant.objects.create(match=match, user=creator)
+        return match
+
+    def test_subscribe_receive_and_unsubscribe(self):
+        async def scenario(communicator, layer):
+            self.assertEqual(
+                await self._request(communicator, action='subscribe', topic='bookings'),
+                {'type': 'subscribed', 'topic': 'bookings'},
+            )
+            own_group = user_group('bookings', self.user.id)
+            await layer.group_send(own_group, {'type': 'booking_cancelled', 'booking_id': 5})
+            self.assertEqual(
+                await communicator.receive_json_from(),
+                {'topic': 'bookings', 'type': 'booking_cancelled', 'booking_id': 5},
+            )
+
+            self.assertEqual(
+                await self._request(communicator, action='unsubscribe', topic='bookings'),
+                {'type': 'unsubscribed', 'topic': 'bookings'},
+            )
+            await layer.group_send(own_group, {'type': 'booking_cancelled', 'booking_id': 6})
+            self.assertTrue(await communicator.receive_nothing(timeout=0.1))
+
+        self._run(scenario)
+
+    def test_send_reaches_the_topic(self):
+        match = self._create_match(self.user)
+
+        async def scenario(communicator, layer):
+            topic = f'chat:{match.id}'
+            self.assertEqual(
+                await self._request(communicator, action='subscribe', topic='chat', params={'match_id': match.id}),
+                {'type': 'subscribed', 'topic': topic},
+            )
+            frame = await self._request(communicator, action='send', topic=topic, data={'message': 'Hola'})
+            self.assertEqual((frame['topic'], frame['type'], frame['message']), (topic, 'chat_message', 'Hola'))
+
+        self._run(scenario)
+
+    def test_resubscribe_replaces_params(self):
+        first_court, second_court = self.court, self.create_court()
+
+        async def scenario(communicator, layer):
+            await self._request(communicator, action='subscribe', topic='bookings', params={'courts': [first_court.id]})
+            self.assertEqual(
+                await self._request(communicator, action='subscribe', topic='bookings', params={'courts': [second_court.id]}),
+                {'type': 'subscribed', 'topic': 'bookings'},
+            )
+            for court in (first_court, second_court):
+                await layer.group_send(court_group(court.id), {
+                    'type': 'court_availability_changed', 'court_id': court.id, 'slots': [],
+                })
+            frame = await communicator.receive_json_from()
+            self.assertEqual((frame['type'], frame['court_id']), ('court_availability_changed', second_court.id))
+            self.assertTrue(await communicator.receive_nothing(timeout=0.1))
+
+        self._run(scenario)
+
+    def test_shared_group_is_joined_once_and_left_with_its_last_topic(self):
+        async def scenario(communicator, layer):
+            with mock.patch.object(layer, 'group_add', wraps=layer.group_add) as group_add, \
+                    mock.patch.object(layer, 'group_discard', wraps=layer.group_discard) as group_discard:
+                for probe_id in (1, 2):
+                    await self._request(
+                        communicator, action='subscribe', topic='probe', params={'id': probe_id, 'groups': ['shared']},
+                    )
+                self.assertEqual(group_add.await_count, 1)
+
+                await self._request(communicator, action='unsubscribe', topic='probe:1')
+                self.assertEqual(group_discard.await_count, 0)
+                await layer.group_send('shared', {'type': 'probe_event', 'probe_id': 2, 'value': 'x'})
+                self.assertEqual(
+                    await communicator.receive_json_from(), {'topic': 'probe:2', 'type': 'probe_event', 'value': 'x'},
+                )
+
+                await self._request(communicator, action='unsubscribe', topic='probe:2')
+                self.assertEqual(group_discard.await_count, 1)
+                await layer.group_send('shared', {'type': 'probe_event', 'probe_id': 2, 'value': 'y'})
+                self.assertTrue(await communicator.receive_nothing(timeout=0.1))
+
+        self._run(scenario)
+
+    def test_events_for_cancelled_topics_are_dropped(self):
+        async def scenario(communicator, layer):
+            for probe_id in (1, 2):
+                await self._request(communicator, action='subscribe', topic='probe', params={'id': probe_id, 'groups': ['shared']})
+            await self._request(communicator, action='unsubscribe', topic='probe:1')
+
+            # El grupo sigue unido por probe:2, pero probe:1 ya no existe
+            await layer.group_send('shared', {'type': 'probe_event', 'probe_id': 1, 'value': 'x'})
+            self.assertTrue(await communicator.receive_nothing(timeout=0.1))
+
+        self._run(scenario)
+
+    def test_topic_limit_per_connection(self):
+        async def scenario(communicator, layer):
+            for probe_id in range(consumers.MAX_TOPICS_PER_CONNECTION):
+                await self._request(communicator, action='subscribe', topic='probe', params={'id': probe_id})
+
+            self.assertEqual(
+                await self._request(communicator, action='subscribe', topic='probe', params={'id': 'extra'}),
+                {'type': 'error', 'topic': 'probe', 'code': 4029, 'message': 'Demasiados temas en esta conexión.'},
+            )
+            # Volver a suscribirse a un tema existente no cuenta como uno nuevo
+            self.assertEqual(
+                await self._request(communicator, action='subscribe', topic='probe', params={'id': 0}),
+                {'type': 'subscribed', 'topic': 'probe:0'},
+            )
+
+        self._run(scenario)
+
+    def test_topic_error_codes(self):
+        other_match = self._create_match(self.create_user())
+
+        async def scenario(communicator, layer):
+            await communicator.send_to(text_data='no es json')
+            errors = [await communicator.receive_json_from()]
+            for frame in (
+                {'action': 'ping', 'topic': 'bookings'},
+                {'action': 'subscribe', 'topic': 'desconocido'},
+                {'action': 'send', 'topic': 'bookings', 'data': {}},
+                {'action': 'subscribe', 'topic': 'chat', 'params': {'match_id': 'abc'}},
+                {'action': 'subscribe', 'topic': 'chat', 'params': {'match_id': other_match.id}},
+            ):
+                errors.append(await self._request(communicator, **frame))
+            await self._request(communicator, action='subscribe', topic='bookings')
+            errors.append(await self._request(communicator, action='send', topic='bookings', data={}))
+
+            self.assertEqual([error['type'] for error in errors], ['error'] * 7)
+            self.assertEqual([error['code'] for error in errors], [4000, 4000, 4000, 4000, 4000, 4003, 4005])
+
+        self._run(scenario)
+
+
+class PostgresChannelLayerClaimTests(SimpleTestCase):
+    """
+    El oyente solo retira de la tabla los mensajes que caben en el buzón de cada canal.
+    """
+
+    def setUp(self):
+        with mock.patch.object(PostgresChannelLayer, '_build_connection_kwargs', return_value={}):
+            self.layer = PostgresChannelLayer(capacity=2)
+
+    def test_claims_up_to_capacity_per_channel(self):
+        claimed = self.layer._claim([(1, 'a'), (2, 'a'), (3, 'b'), (4, 'a')])
+
+        self.assertEqual(claimed, [1, 2, 3])
+        self.assertEqual(self.layer._backlogged, {'a'})
+
+    def test_receive_frees_room_and_requests_a_refetch(self):
+        self.layer.client_prefix = 'p'
+        self.layer._ensure_listener = lambda: None
+        channel = 'specific.p!a'
+        self.layer._deliver([(channel, '{"type": "x"}'), (channel, '{"type": "y"}')])
+        self.assertEqual(self.layer._claim([(3, channel)]), [])
+
+        message = async_to_sync(self.layer.receive)(channel)
+
+        self.assertEqual(message, {'type': 'x'})
+        self.assertTrue(self.layer._refetch.is_set())
+        self.assertEqual(self.layer._backlogged, set())
+        self.assertEqual(self.layer._claim([(3, channel), (4, channel)]), [3])
+
+
+@skipUnless(connection.vendor == 'postgresql', 'PostgresChannelLayer requiere PostgreSQL')
+class PostgresChannelLayerTests(TransactionTestCase):
+    """
+    Contrato de la capa de canales: envío y recepción, grupos, expiración y ChannelFull.
+    """
+
+    def setUp(self):
+        self.layer = PostgresChannelLayer(expiry=60, capacity=2, cleanup_interval=1)
+
+    def tearDown(self):
+        async_to_sync(self.layer.flush)()
+        async_to_sync(self.layer.close)()
+
+    def _receive(self, channel, timeout=5):
+        async def receive():
+            return await asyncio.wait_for(self.layer.receive(channel), timeout)
+        return async_to_sync(receive)()
+
+    def _run(self, coroutine):
+        async def run():
+            return await coroutine
+        return async_to_sync(run)()
+
+    def test_send_and_receive(self):
+        channel = self._run(self.layer.new_channel())
+        self._run(self.layer.send(channel, {'type': 'test.message', 'text': 'hola'}))
+
+        self.assertEqual(self._receive(channel), {'type': 'test.message', 'text': 'hola'})
+
+    def test_group_send_reaches_members_only(self):
+        first = self._run(self.layer.new_channel())
+        second = self._run(self.layer.new_channel())
+        self._run(self.layer.group_add('partido', first))
+        self._run(self.layer.group_add('partido', second))
+        self._run(self.layer.group_discard('partido', second))
+
+        self._run(self.layer.group_send('partido', {'type': 'match.state'}))
+
+        self.assertEqual(self._receive(first), {'type': 'match.state'})
+        with self.assertRaises(asyncio.TimeoutError):
+            self._receive(second, timeout=0.5)
+
+    def test_expired_messages_are_not_delivered(self):
+        layer = PostgresChannelLayer(expiry=1)
+        try:
+            # Canal de un proceso que no escucha: el mensaje caduca en la tabla
+            channel = f'specific.{layer.client_prefix}!expira'
+            self._run(layer.send(channel, {'type': 'test.message'}))
+            time.sleep(1.5)
+            with self.assertRaises(asyncio.TimeoutError):
+                self._run(asyncio.wait_for(layer.receive(channel), 1))
+        finally:
+            async_to_sync(layer.close)()
+
+    def test_send_raises_channel_full_when_backlog_reaches_capacity(self):
+        # Canal de otro proceso (nadie retira sus mensajes)
+        channel = 'specific.otroproceso!abc'
+        self._run(self.layer.send(channel, {'type': 'test.message'}))
+        self._run(self.layer.send(channel, {'type': 'test.message'}))
+
+        with self.assertRaises(ChannelFull):
+            self._run(self.layer.send(channel, {'type': 'test.message'}))
+
+    def test_full_inbox_keeps_messages_until_the_consumer_reads(self):
+        channel = self._run(self.layer.new_channel())
+        for number in range(4):
+            try:
+                self._run(self.layer.send(channel, {'type': 'test.message', 'number': number}))
+            except ChannelFull:
+                time.sleep(0.2)
+                self._run(self.layer.send(channel, {'type': 'test.message', 'number': number}))
+
+        numbers = [self._receive(channel)['number'] for _ in range(4)]
+        self.assertEqual(numbers, [0, 1, 2, 3])
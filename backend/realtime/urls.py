@@ -0,0 +1,8 @@
+from django.urls import path
+
+from .views import NotificationQueueStatsView, OutboxStatsView
+
+urlpatterns = [
+    path('notifications/stats/', NotificationQueueStatsView.as_view(), name='realtime-notification-queue-stats'),
+    path('outbox/stats/', OutboxStatsView.as_view(), name='realtime-outbox-stats'),
+]
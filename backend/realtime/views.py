@@ -0,0 +1,26 @@
+from rest_framework import status, views
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+
+from .dispatcher import notification_dispatcher
+from .outbox import outbox
+
+
+class NotificationQueueStatsView(views.APIView):
+    """
+    Vista para consultar las métricas de la cola de notificaciones WebSocket del proceso.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response(notification_dispatcher.stats(), status=status.HTTP_200_OK)
+
+
+class OutboxStatsView(views.APIView):
+    """
+    Vista para consultar pendientes, retraso y rendimiento del outbox de eventos.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response(outbox.stats(), status=status.HTTP_200_OK)
@@ -1,13 +1,23 @@
-import json
 from channels.generic.websocket import AsyncWebsocketConsumer
 from django.contrib.auth import get_user_model
 from rest_framework_simplejwt.tokens import UntypedToken
 from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 from urllib.parse import parse_qs
+from realtime.frames import PreEncodedFrameMixin
+from realtime.groups import USERS_ADMIN_GROUP, user_group
+from realtime.multiplex import Topic
 
 User = get_user_model()
 
-class UserConsumer(AsyncWebsocketConsumer):
+
+def users_group(user):
+    """Solo el staff ve los cambios de todos los usuarios; el resto, los de su cuenta"""
+    if user.is_staff:
+        return USERS_ADMIN_GROUP
+    return user_group('users', user.id)
+
+
+class UserConsumer(PreEncodedFrameMixin, AsyncWebsocketConsumer):
     async def connect(self):
         # El usuario ya viene autenticado por el JWTAuthMiddleware
         user = self.scope.get('user')
@@ -16,7 +26,7 @@ class UserConsumer(AsyncWebsocketConsumer):
             await self.close()
             return
 
-        self.room_group_name = 'users_admin'
+        self.room_group_name = users_group(user)
         
         await self.channel_layer.group_add(
             self.room_group_name,
@@ -36,19 +46,25 @@ class UserConsumer(AsyncWebsocketConsumer):
         print(f"🔌 Users WebSocket disconnected: {self.channel_name}")
 
     async def user_updated(self, event):
-        await self.send(text_data=json.dumps({
-            'type': 'user_updated',
-            'user': event['user']
-        }))
+        await self.send_frame(event, ('user',))
 
     async def user_created(self, event):
-        await self.send(text_data=json.dumps({
-            'type': 'user_created',
-            'user': event['user']
-        }))
+        await self.send_frame(event, ('user',))
 
     async def user_deleted(self, event):
-        await self.send(text_data=json.dumps({
-            'type': 'user_deleted',
-            'user_id': event['user_id']
-        }))
+        await self.send_frame(event, ('user_id',))
+
+
+class UserTopic(Topic):
+    """
+    Tema 'users' del socket multiplexado: los mismos eventos que UserConsumer.
+    """
+    name = 'users'
+    events = {
+        'user_updated': ('user',),
+        'user_created': ('user',),
+        'user_deleted': ('user_id',),
+    }
+
+    async def get_groups(self):
+        return [users_group(self.user)]
@@ -1,5 +1,13 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict, deque
+
 from channels.db import database_sync_to_async
+from django.conf import settings
 from django.contrib.auth.models import AnonymousUser
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from rest_framework_simplejwt.tokens import AccessToken
 from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 from django.contrib.auth import get_user_model
@@ -15,14 +23,179 @@ def get_user(token_key):
         token_key (str): El token JWT.
 
     Returns:
-        User: El usuario autenticado o AnonymousUser si el token es inválido.
+        tuple: (usuario, expiración del token en epoch). El usuario es AnonymousUser
+            (y la expiración None) si el token es inválido o la cuenta está inactiva.
     """
     try:
         access_token = AccessToken(token_key)
         user_id = access_token['user_id']
-        return User.objects.get(id=user_id)
+        user = User.objects.get(id=user_id)
     except (InvalidToken, TokenError, User.DoesNotExist):
-        return AnonymousUser()
+        return AnonymousUser(), None
+    if not user.is_active:
+        return AnonymousUser(), None
+    return user, access_token['exp']
+
+
+class TokenUserCache:
+    """
+    Caché acotada en memoria de token verificado -> usuario para los handshakes WebSocket.
+
+    Cada entrada vive lo que ocurra antes: WS_AUTH_CACHE_TTL segundos o la expiración del
+    token. Al guardar o eliminar un usuario (ej. desactivarlo) sus entradas se descartan
+    en este proceso; en el resto de procesos caducan como mucho en WS_AUTH_CACHE_TTL.
+    Solo se guardan usuarios activos. Varios handshakes simultáneos con el mismo token
+    (el frontend abre varios sockets a la vez) comparten una única consulta.
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._tokens_by_user = {}
+        self._inflight = {}
+        self._evictions = 0
+        self._lock = threading.Lock()
+
+    @property
+    def ttl(self) -> float:
+        return getattr(settings, 'WS_AUTH_CACHE_TTL', 60)
+
+    @property
+    def max_entries(self) -> int:
+        return getattr(settings, 'WS_AUTH_CACHE_MAX_ENTRIES', 10000)
+
+    def get(self, token_key):
+        """
+        Devuelve el usuario cacheado del token o None si no está o ha caducado.
+        """
+        with self._lock:
+            entry = self._entries.get(token_key)
+            if entry is None:
+                return None
+            expires_at, user = entry
+            if expires_at <= time.monotonic():
+                self._remove(token_key)
+                return None
+            self._entries.move_to_end(token_key)
+            return user
+
+    def set(self, token_key, user, token_exp):
+        lifetime = min(self.ttl, token_exp - time.time())
+        if lifetime <= 0 or self.max_entries <= 0:
+            return
+        with self._lock:
+            self._remove(token_key)
+            self._entries[token_key] = (time.monotonic() + lifetime, user)
+            self._tokens_by_user.setdefault(user.pk, set()).add(token_key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def evict_user(self, user_id):
+        """
+        Descarta todas las entradas de un usuario (ej. tras desactivarlo).
+        """
+        with self._lock:
+            self._evictions += 1
+            for token_key in list(self._tokens_by_user.get(user_id, ())):
+                self._remove(token_key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tokens_by_user.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remove(self, token_key):
+        entry = self._entries.pop(token_key, None)
+        if entry is None:
+            return
+        user_id = entry[1].pk
+        tokens = self._tokens_by_user.get(user_id)
+        if tokens is not None:
+            tokens.discard(token_key)
+            if not tokens:
+                del self._tokens_by_user[user_id]
+
+    async def resolve(self, token_key):
+        """
+        Usuario del token: desde la caché o, si no está, desde la base de datos.
+
+        Returns:
+            tuple: (usuario, True si no hizo falta consultar la base de datos).
+        """
+        user = self.get(token_key)
+        if user is not None:
+            return user, True
+
+        task = self._inflight.get(token_key)
+        shared = task is not None
+        if not shared:
+            task = asyncio.ensure_future(get_user(token_key))
+            self._inflight[token_key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(token_key, None))
+        evictions = self._evictions
+        user, token_exp = await asyncio.shield(task)
+        # Si algún usuario cambió durante la consulta, el resultado podría estar obsoleto
+        if token_exp is not None and not shared and evictions == self._evictions:
+            self.set(token_key, user, token_exp)
+        return user, shared
+
+
+class HandshakeMetrics:
+    """
+    Métricas de los handshakes WebSocket del proceso: desde que llega la conexión hasta
+    que el consumer la acepta o la cierra (autenticación incluida).
+    """
+
+    def __init__(self, sample_size: int = 1000):
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=sample_size)
+        self._counters = {'handshakes': 0, 'accepted': 0, 'rejected': 0, 'cache_hits': 0, 'cache_misses': 0}
+
+    def record_auth(self, cache_hit: bool):
+        with self._lock:
+            self._counters['cache_hits' if cache_hit else 'cache_misses'] += 1
+
+    def record_handshake(self, seconds: float, accepted: bool):
+        with self._lock:
+            self._counters['handshakes'] += 1
+            self._counters['accepted' if accepted else 'rejected'] += 1
+            self._latencies.append(seconds * 1000)
+
+    def stats(self):
+        """
+        Returns:
+            dict: Contadores, tasa de aciertos de la caché, latencias (ms) p50/p95/máx
+                de las últimas muestras y tamaño de la caché.
+        """
+        with self._lock:
+            stats = dict(self._counters)
+            latencies = sorted(self._latencies)
+        lookups = stats['cache_hits'] + stats['cache_misses']
+        stats['cache_hit_rate'] = round(stats['cache_hits'] / lookups, 3) if lookups else 0.0
+        stats['cache_size'] = len(token_user_cache)
+        stats['latency_ms'] = {
+            'samples': len(latencies),
+            'p50': round(latencies[len(latencies) // 2], 3) if latencies else 0.0,
+            'p95': round(latencies[max(int(len(latencies) * 0.95) - 1, 0)], 3) if latencies else 0.0,
+            'max': round(latencies[-1], 3) if latencies else 0.0,
+        }
+        return stats
+
+
+token_user_cache = TokenUserCache()
+handshake_metrics = HandshakeMetrics()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def evict_cached_user(sender, instance, **kwargs):
+    """
+    Los cambios de un usuario (activación, rol, borrado) invalidan sus handshakes cacheados.
+    """
+    token_user_cache.evict_user(instance.pk)
+
 
 class JWTAuthMiddleware:
     """
@@ -33,19 +206,34 @@ class JWTAuthMiddleware:
         self.app = app
 
     async def __call__(self, scope, receive, send):
+        started = time.perf_counter()
+
         # Buscamos el token en los subprotocolos
         subprotocols = scope.get('subprotocols', [])
-        
+
         # Asumimos que si hay un subprotocolo, es el token
         if subprotocols:
-            token = subprotocols[0] 
-            scope['user'] = await get_user(token)
-            
-            # ¡IMPORTANTE! 
+            token = subprotocols[0]
+            scope['user'], cache_hit = await token_user_cache.resolve(token)
+            handshake_metrics.record_auth(cache_hit)
+
+            # ¡IMPORTANTE!
             # Debemos aceptar el subprotocolo para que el navegador no cierre la conexión
             # por "protocol mismatch". Se pasa al scope para que el consumer lo maneje.
-            scope['accepted_subprotocol'] = token 
+            scope['accepted_subprotocol'] = token
         else:
             scope['user'] = AnonymousUser()
 
-        return await self.app(scope, receive, send)
+        handshake_done = False
+
+        async def timed_send(message):
+            # El handshake termina cuando el consumer acepta o rechaza la conexión
+            nonlocal handshake_done
+            if not handshake_done and message['type'] in ('websocket.accept', 'websocket.close'):
+                handshake_done = True
+                handshake_metrics.record_handshake(
+                    time.perf_counter() - started, accepted=message['type'] == 'websocket.accept'
+                )
+            await send(message)
+
+        return await self.app(scope, receive, timed_send)
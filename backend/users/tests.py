@@ -1,3 +1,113 @@
+import asyncio
+import time
+from datetime import timedelta
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from channels.testing import WebsocketCommunicator
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+
+from bookings.testing import BookingTestMixin
+from . import middleware
+from .middleware import HandshakeMetrics, JWTAuthMiddleware, token_user_cache
+
+
+async def accept_authenticated(scope, receive, send):
+    """
+    Consumer mínimo: acepta la conexión solo si el middleware autenticó al usuario.
+    """
+    await receive()
+    if scope['user'].is_authenticated:
+        await send({'type': 'websocket.accept', 'subprotocol': scope['accepted_subprotocol']})
+    else:
+        await send({'type': 'websocket.close', 'code': 4001})
+
+
+class TokenUserCacheTests(BookingTestMixin, TestCase):
+    """
+    Caché token -> usuario de los handshakes WebSocket: respeta la expiración del token,
+    se vacía al cambiar el usuario y comparte las consultas simultáneas.
+    """
+
+    def setUp(self):
+        self.create_fixtures()
+        token_user_cache.clear()
+        self.addCleanup(token_user_cache.clear)
+        self.metrics = HandshakeMetrics()
+        patcher = mock.patch.object(middleware, 'handshake_metrics', self.metrics)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.token = str(AccessToken.for_user(self.user))
+
+    async def _ahandshake(self, token):
+        communicator = WebsocketCommunicator(
+            JWTAuthMiddleware(accept_authenticated), '/ws/test/', subprotocols=[token],
+        )
+        connected, _ = await communicator.connect()
+        await communicator.disconnect()
+        return connected
+
+    def _handshake(self, token=None):
+        return async_to_sync(self._ahandshake)(token or self.token)
+
+    def test_cache_hit_does_not_query_the_database(self):
+        self.assertTrue(self._handshake())
+
+        with self.assertNumQueries(0):
+            self.assertTrue(self._handshake())
+
+        stats = self.metrics.stats()
+        self.assertEqual((stats['cache_hits'], stats['cache_misses']), (1, 1))
+
+    def test_expired_token_is_not_served_from_the_cache(self):
+        access_token = AccessToken.for_user(self.user)
+        access_token.set_exp(lifetime=timedelta(seconds=30))
+        token = str(access_token)
+        self.assertTrue(self._handshake(token))
+        self.assertEqual(len(token_user_cache), 1)
+
+        # 31 segundos después: el token caducó antes que el TTL de la caché (60 s)
+        later = time.monotonic() + 31
+        fake_time = mock.Mock(wraps=time, monotonic=lambda: later)
+        with mock.patch.object(middleware, 'time', fake_time), \
+                mock.patch('rest_framework_simplejwt.tokens.aware_utcnow',
+                           return_value=timezone.now() + timedelta(seconds=31)):
+            self.assertFalse(self._handshake(token))
+
+        self.assertEqual(len(token_user_cache), 0)
+
+    def test_already_expired_token_is_not_cached(self):
+        token_user_cache.set(self.token, self.user, time.time() - 1)
+
+        self.assertEqual(len(token_user_cache), 0)
+
+    def test_deactivating_the_user_evicts_and_rejects_the_next_handshake(self):
+        self.assertTrue(self._handshake())
+
+        self.user.is_active = False
+        self.user.save()
+
+        self.assertEqual(len(token_user_cache), 0)
+        self.assertFalse(self._handshake())
+
+    def test_deleting_the_user_evicts_and_rejects_the_next_handshake(self):
+        self.assertTrue(self._handshake())
+
+        self.user.delete()
+
+        self.assertEqual(len(token_user_cache), 0)
+        self.assertFalse(self._handshake())
+
+    def test_concurrent_handshakes_share_one_lookup(self):
+        async def run():
+            return await asyncio.gather(*(self._ahandshake(self.token) for _ in range(3)))
+
+        with mock.patch.object(middleware, 'get_user', wraps=middleware.get_user) as get_user:
+            self.assertEqual(async_to_sync(run)(), [True, True, True])
 
-# Create your tests here.
+        self.assertEqual(get_user.call_count, 1)
+        stats = self.metrics.stats()
+        self.assertEqual(stats['accepted'], 3)
+        self.assertEqual(stats['cache_misses'], 1)
@@ -3,7 +3,7 @@ from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView,
 )
-from .views import RegisterView, UserViewSet, GroupViewSet, PermissionViewSet, GoogleLogin, AdminRegisterView, AdminManagementViewSet, UserProfileUpdateView, ChangePasswordView, LoginView, UserStatsView # Añadir LoginView y UserStatsView
+from .views import RegisterView, UserViewSet, GroupViewSet, PermissionViewSet, GoogleLogin, AdminRegisterView, AdminManagementViewSet, UserProfileUpdateView, ChangePasswordView, LoginView, UserStatsView, WebSocketHandshakeStatsView # Añadir LoginView y UserStatsView
 from rest_framework import routers
 from .models import User
 from django.urls import path
@@ -34,6 +34,8 @@ urlpatterns = [
     
     # Ruta para obtener estadísticas de usuarios
     path('stats/', UserStatsView.as_view(), name='user_stats'),
+    # Métricas de los handshakes WebSocket (latencia y caché de autenticación)
+    path('websocket/stats/', WebSocketHandshakeStatsView.as_view(), name='websocket_handshake_stats'),
 
     path('', include(router.urls)),
 ]
@@ -1,30 +1,36 @@
 from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
+from realtime.frames import encode_frame
+from realtime.groups import USERS_ADMIN_GROUP, user_group
+from realtime.outbox import outbox
 
 class UserWebSocketNotifier:
+    """
+    Los eventos de usuarios van a los administradores; los cambios de una cuenta
+    también llegan a las conexiones de su dueño (ej. una suspensión).
+    """
+
     def __init__(self):
         self.channel_layer = get_channel_layer()
-        self.group_name = 'users_admin'
+        self.group_name = USERS_ADMIN_GROUP
 
-    def _send_to_group(self, event_type, data):
+    def _send_to_group(self, event_type, data, user_id=None):
         if not self.channel_layer:
             return
             
-        async_to_sync(self.channel_layer.group_send)(
-            self.group_name,
-            {
-                'type': event_type,
-                **data
-            }
-        )
+        # El frame se codifica una sola vez para todos los grupos y conexiones
+        payload = {'frame': encode_frame(event_type, data)}
+        # Se registra en el outbox dentro de la transacción actual y se envía tras el commit
+        outbox.publish(self.group_name, event_type, payload)
+        if user_id is not None:
+            outbox.publish(user_group('users', user_id), event_type, payload)
 
     def notify_user_created(self, user_data):
         self._send_to_group('user_created', {'user': user_data})
 
     def notify_user_updated(self, user_data):
-        self._send_to_group('user_updated', {'user': user_data})
+        self._send_to_group('user_updated', {'user': user_data}, user_id=user_data.get('id'))
 
     def notify_user_deleted(self, user_id):
-        self._send_to_group('user_deleted', {'user_id': user_id})
+        self._send_to_group('user_deleted', {'user_id': user_id}, user_id=user_id)
 
 user_notifier = UserWebSocketNotifier()
@@ -1,6 +1,7 @@
 from rest_framework import permissions, viewsets, status, views # Añadir status y views
 from rest_framework.response import Response
 from asgiref.sync import async_to_sync # Importar async_to_sync
+from django.db import transaction
 from .serializers import RegisterSerializer, UserSerializer, PerfilSocialSerializer, AdminRegisterSerializer
 from django.contrib.auth.models import Group, Permission
 from rest_framework.permissions import IsAdminUser, IsAuthenticated # Importar IsAuthenticated
@@ -23,6 +24,7 @@ from dj_rest_auth.registration.views import SocialLoginView
 from rest_framework_simplejwt.serializers import TokenRefreshSerializer # TokenObtainPairSerializer ya importado
 from .serializers_jwt import CustomTokenObtainPairSerializer
 from .utils.websocket_notifier import user_notifier
+from .middleware import handshake_metrics
 
 # Importar casos de uso y repositorio
 from .infrastructure.repositories.django_user_repository import DjangoUserRepository
@@ -44,6 +46,7 @@ class UsersConfig(AppConfig):
 class RegisterView(views.APIView): # Cambiar a APIView
     permission_classes = [permissions.AllowAny]
 
+    @transaction.atomic
     def post(self, request): # Cambiar a método síncrono
         user_repository = DjangoUserRepository()
         register_user_use_case = RegisterUserUseCase(user_repository)
@@ -130,6 +133,7 @@ class UserViewSet(viewsets.ModelViewSet): # Mantener ModelViewSet por ahora, ref
         return Response(serializer.data)
 
     @action(detail=True, methods=['patch'], permission_classes=[IsAdminUser])
+    @transaction.atomic
     def activate(self, request, pk=None):
         """
         Activa un usuario con rol 'cliente'. Solo accesible para usuarios con rol 'admin'.
@@ -156,6 +160,7 @@ class UserViewSet(viewsets.ModelViewSet): # Mantener ModelViewSet por ahora, ref
         return Response({"detail": "Usuario no encontrado."}, status=status.HTTP_404_NOT_FOUND)
 
     @action(detail=True, methods=['patch'], permission_classes=[IsAdminUser])
+    @transaction.atomic
     def deactivate(self, request, pk=None):
         """
         Desactiva un usuario con rol 'cliente'. Solo accesible para usuarios con rol 'admin'.
@@ -350,6 +355,7 @@ from .models import Role # Importar el modelo Role
 class AdminRegisterView(views.APIView): # Cambiar a APIView
     permission_classes = [permissions.IsAdminUser]  # Solo los administradores pueden registrar otros administradores
 
+    @transaction.atomic
     def post(self, request): # Cambiar a método síncrono
         user_repository = DjangoUserRepository()
         register_user_use_case = RegisterUserUseCase(user_repository) 
@@ -421,6 +427,7 @@ class AdminManagementViewSet(viewsets.ViewSet):
     # Si se quiere una lógica diferente para adminglobal creando admins, se puede añadir aquí.
 
     @action(detail=True, methods=['patch'])
+    @transaction.atomic
     def suspend(self, request, pk=None): # Suspender admin
         if not self._is_adminglobal(request.user):
             return Response({"detail": "No tienes permiso para realizar esta acción."}, status=status.HTTP_403_FORBIDDEN)
@@ -435,6 +442,7 @@ class AdminManagementViewSet(viewsets.ViewSet):
         return Response({"detail": "Usuario admin no encontrado."}, status=status.HTTP_404_NOT_FOUND)
 
     @action(detail=True, methods=['patch'])
+    @transaction.atomic
     def reactivate(self, request, pk=None): # Reactivar admin
         if not self._is_adminglobal(request.user):
             return Response({"detail": "No tienes permiso para realizar esta acción."}, status=status.HTTP_403_FORBIDDEN)
@@ -448,6 +456,7 @@ class AdminManagementViewSet(viewsets.ViewSet):
             return Response({"detail": f"Usuario admin {user.username} reactivado."}, status=status.HTTP_200_OK)
         return Response({"detail": "Usuario admin no encontrado."}, status=status.HTTP_404_NOT_FOUND)
 
+    @transaction.atomic
     def destroy(self, request, pk=None): # Eliminar admin
         if not self._is_adminglobal(request.user):
             return Response({"detail": "No tienes permiso para realizar esta acción."}, status=status.HTTP_403_FORBIDDEN)
@@ -466,6 +475,15 @@ from .serializers import UserProfileUpdateSerializer # Importar el nuevo seriali
 from django.utils import timezone
 from datetime import timedelta
 
+class WebSocketHandshakeStatsView(views.APIView):
+    """
+    Vista para consultar la latencia de los handshakes WebSocket y la caché de autenticación.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(handshake_metrics.stats(), status=status.HTTP_200_OK)
+
 class UserStatsView(views.APIView):
     """
     Vista para obtener estadísticas de usuarios.
@@ -1,19 +1,31 @@
 class BookingsWebSocket {
   constructor() {
     this.ws = null;
+    this.token = null;
     this.listeners = new Set();
+    // Canchas cuya disponibilidad se recibe (?courts=): id -> número de suscriptores
+    this.courtSubscriptions = new Map();
     this.reconnectAttempts = 0;
     this.maxReconnectAttempts = 5;
     this.reconnectDelay = 3000;
   }
 
-  connect(token) {
-    if (this.ws && this.ws.readyState !== WebSocket.CLOSED) return;
-
+  buildUrl() {
     const apiUrl = import.meta.env.VITE_API_URL || 'http://localhost:8000';
     const host = apiUrl.replace(/^https?:\/\//, '');
     const wsProtocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
-    const wsUrl = `${wsProtocol}//${host}/ws/bookings/`;
+    // Los clientes solo reciben sus propias reservas; la disponibilidad de otras
+    // canchas llega como 'court_availability_changed' a quien se suscribe a ellas
+    const courts = [...this.courtSubscriptions.keys()];
+    const query = courts.length ? `?courts=${courts.join(',')}` : '';
+    return `${wsProtocol}//${host}/ws/bookings/${query}`;
+  }
+
+  connect(token) {
+    this.token = token;
+    if (this.ws && this.ws.readyState !== WebSocket.CLOSED) return;
+
+    const wsUrl = this.buildUrl();
 
     try {
       this.ws = new WebSocket(wsUrl, [token]);
@@ -33,8 +45,9 @@ class BookingsWebSocket {
         }
       };
 
-      this.ws.onerror = (error) => 
+      this.ws.onerror = (error) => {
         // console.error('❌ Booking WebSocket error:', error);
+      };
 
       this.ws.onclose = (event) => {
        // console.log('🔌 Booking WebSocket disconnected:', event.code);
@@ -54,6 +67,38 @@ class BookingsWebSocket {
     }
   }
 
+  /**
+   * Recibe la disponibilidad de una cancha mientras haya algún suscriptor.
+   * Si el conjunto de canchas cambia, el socket se reabre con el nuevo ?courts=.
+   * @param {number|string} courtId - ID de la cancha.
+   * @returns {Function} Función para dejar de recibir la disponibilidad de la cancha.
+   */
+  subscribeCourt(courtId) {
+    const key = String(courtId);
+    const count = this.courtSubscriptions.get(key) || 0;
+    this.courtSubscriptions.set(key, count + 1);
+    if (count === 0) this.reopen();
+
+    return () => {
+      const remaining = (this.courtSubscriptions.get(key) || 0) - 1;
+      if (remaining > 0) {
+        this.courtSubscriptions.set(key, remaining);
+        return;
+      }
+      if (this.courtSubscriptions.delete(key)) this.reopen();
+    };
+  }
+
+  reopen() {
+    // Sin conexión abierta, la próxima llamada a connect() ya usa las canchas actuales
+    if (!this.ws || !this.token) return;
+    const previous = this.ws;
+    previous.onclose = null;
+    this.ws = null;
+    previous.close(1000, 'Court subscriptions changed');
+    this.connect(this.token);
+  }
+
   subscribe(callback) {
     this.listeners.add(callback);
     return () => this.listeners.delete(callback);
@@ -65,6 +110,7 @@ class BookingsWebSocket {
       this.ws = null;
     }
     this.listeners.clear();
+    this.courtSubscriptions.clear();
   }
 }
 
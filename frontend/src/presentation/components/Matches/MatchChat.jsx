@@ -30,7 +30,11 @@ const MatchChat = ({ matchId, onClose }) => {
     const loadHistory = async () => {
       try {
         const history = await getChatMessages(matchId);
-        setMessages(history);
+        // Conserva los mensajes del socket que llegaron antes que el historial o que aún no se han guardado
+        setMessages(prev => {
+          const saved = new Set(history.map(msg => msg.uuid));
+          return [...history, ...prev.filter(msg => !saved.has(msg.uuid))];
+        });
       } catch (err) {
         console.error('Error cargando historial de chat:', err);
         setError('No se pudo cargar el historial.');
@@ -44,13 +48,18 @@ const MatchChat = ({ matchId, onClose }) => {
     if (data.type === 'chat_message') {
       const isOwn = data.username === user?.username;
       
-      setMessages(prev => [...prev, {
-        id: data.id,
-        message: data.message,
-        username: data.username,
-        user_id: data.user_id,
-        created_at: data.created_at
-      }]);
+      setMessages(prev => {
+        // El historial y el socket pueden traer el mismo mensaje: se identifica por uuid
+        if (data.uuid && prev.some(msg => msg.uuid === data.uuid)) return prev;
+        return [...prev, {
+          id: data.id,
+          uuid: data.uuid,
+          message: data.message,
+          username: data.username,
+          user_id: data.user_id,
+          created_at: data.created_at
+        }];
+      });
 
       // Si recibimos un mensaje, dejamos de mostrar que está escribiendo
       setTypingUsers(prev => {
@@ -133,7 +142,7 @@ const MatchChat = ({ matchId, onClose }) => {
           messages.map((msg, index) => {
             const isOwn = msg.username === user?.username;
             return (
-              <div key={msg.id || index} className={`flex flex-col ${isOwn ? 'items-end' : 'items-start'}`}>
+              <div key={msg.uuid || msg.id || index} className={`flex flex-col ${isOwn ? 'items-end' : 'items-start'}`}>
                 <div className="flex items-center gap-2 mb-1">
                   {!isOwn && (
                     <span className="text-[10px] text-slate-500 dark:text-slate-400 font-medium ml-1">
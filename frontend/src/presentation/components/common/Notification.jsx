@@ -39,6 +39,7 @@ const Notification = ({ message: propMessage, fetchAllBookings, fetchBookingStat
     }
 
     if (
+      event.type === 'booking_bulk_created' ||
       event.type === 'booking_updated' ||
       event.type === 'booking_cancelled'
     ) {
@@ -1,14 +1,30 @@
-import { useEffect, useCallback } from 'react';
+import { useEffect } from 'react';
 import { bookingsWebSocket } from '../../../infrastructure/websocket/bookingsWebSocket';
 
 /**
  * Hook para manejar actualizaciones de reservas en tiempo real vía WebSocket.
+ *
+ * Los clientes solo reciben los eventos de sus propias reservas. Para enterarse de las
+ * reservas de otros usuarios en una cancha hay que suscribirse a ella con courtIds y
+ * atender los eventos 'court_availability_changed'.
+ *
  * @param {Function} onUpdate - Callback que se ejecuta cuando llega un mensaje del servidor.
+ * @param {Array<number|string>} [courtIds] - Canchas cuya disponibilidad se quiere recibir.
  */
-export const useBookingsRealtime = (onUpdate) => {
+export const useBookingsRealtime = (onUpdate, courtIds = []) => {
+  // Clave estable para no reabrir el socket en cada render con un array nuevo
+  const courtsKey = [...new Set(courtIds.filter(Boolean).map(String))].sort().join(',');
+
+  useEffect(() => {
+    if (!courtsKey) return;
+    // Se registra antes de connect() para que la primera conexión ya incluya ?courts=
+    const unsubscribeCourts = courtsKey.split(',').map((courtId) => bookingsWebSocket.subscribeCourt(courtId));
+    return () => unsubscribeCourts.forEach((unsubscribe) => unsubscribe());
+  }, [courtsKey]);
+
   useEffect(() => {
     const token = localStorage.getItem('accessToken') || localStorage.getItem('token') || localStorage.getItem('access_token');
-    
+
     if (!token) {
     //  console.warn('No token found for Bookings WebSocket');
       return;
@@ -29,4 +45,3 @@ export const useBookingsRealtime = (onUpdate) => {
 
   return {};
 };
-
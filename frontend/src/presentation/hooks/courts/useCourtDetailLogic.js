@@ -117,12 +117,13 @@ export const useCourtDetailLogic = () => {
     }
   }, [court, fetchWeeklyAvailability]);
 
-  // Actualización en tiempo real vía WebSocket para la disponibilidad
+  // Actualización en tiempo real vía WebSocket para la disponibilidad: el socket se
+  // suscribe a esta cancha (?courts=) y recibe las reservas de cualquier usuario en ella
   useBookingsRealtime(useCallback((event) => {
-    console.log('Real-time booking update for court detail:', event);
-    // Si hay un cambio en las reservas, refrescamos la disponibilidad del calendario
+    if (event.type !== 'court_availability_changed' || String(event.court_id) !== String(courtId)) return;
+    // Si hay un cambio en las reservas de la cancha, refrescamos la disponibilidad del calendario
     fetchWeeklyAvailability();
-  }, [fetchWeeklyAvailability]));
+  }, [courtId, fetchWeeklyAvailability]), [courtId]);
 
   const closeModal = useCallback(() => {
     setSelectedImage(null);
@@ -1,4 +1,4 @@
-import { useState, useEffect, useCallback } from "react";
+import { useState, useEffect, useCallback, useMemo } from "react";
 import { useMatchesRealtime } from "./useMatchesRealtime";
 import { useBookingsRealtime } from "../bookings/useBookingsRealtime";
 import { toast } from 'react-toastify';
@@ -94,11 +94,18 @@ export const useMatches = () => {
     }, [fetchAllData])
   );
 
-  // ✅ WS ACTUALIZA CUANDO HAY CAMBIOS EN RESERVAS
+  // ✅ WS ACTUALIZA CUANDO HAY CAMBIOS EN RESERVAS de las canchas de los partidos mostrados
+  // (además de las reservas propias, que siempre llegan)
+  const matchCourtIds = useMemo(() => [
+    ...Object.values(matches).flat(),
+    ...upcomingMatches,
+  ].map((match) => match.court_id_read), [matches, upcomingMatches]);
+
   useBookingsRealtime(
     useCallback((event) => {
       fetchAllData();
-    }, [fetchAllData])
+    }, [fetchAllData]),
+    matchCourtIds
   );
 
   const clearNewMessage = useCallback((matchId) => {